@@ -0,0 +1,12 @@
+"""Micro benchmarks for dogpile_cachetool.
+
+Run all of them, optionally saving the results to compare a later run
+against::
+
+    python -m benchmarks --json before.json
+    python -m benchmarks --compare before.json
+
+or a single benchmark module directly, e.g.::
+
+    python -m benchmarks.serializers
+"""
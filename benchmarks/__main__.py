@@ -0,0 +1,57 @@
+"""Run all benchmarks.
+
+Usage::
+
+    python -m benchmarks [--number N] [--json PATH] [--compare PATH]
+
+``--json`` writes the results, together with the commit and interpreter
+they were measured on, so that another run can be compared against them
+with ``--compare``.
+"""
+import argparse
+
+from benchmarks import _util
+from benchmarks import region
+from benchmarks import serializers
+
+
+def _serializer_results(number):
+    for res in serializers.run(number):
+        params = dict(payload=res['payload'], serializer=res['serializer'])
+        yield _util.result('serializer.encode', res['encode_us'], **params)
+        yield _util.result('serializer.decode', res['decode_us'], **params)
+
+
+SUITES = {
+    'region': region.run,
+    'serializers': _serializer_results,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=1000,
+                        help='iterations per measurement')
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES),
+                        help='suite to run, may be repeated (default: all)')
+    parser.add_argument('--json', metavar='PATH',
+                        help='write the results to PATH')
+    parser.add_argument('--compare', metavar='PATH',
+                        help='show the change against the results in PATH')
+    args = parser.parse_args()
+
+    results = []
+    for name in args.suite or sorted(SUITES):
+        results.extend(SUITES[name](args.number))
+
+    baseline = None
+    if args.compare:
+        baseline = _util.read_json(args.compare)['results']
+    _util.print_results(results, baseline)
+
+    if args.json:
+        _util.write_json(args.json, _util.report(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Measurement and reporting helpers shared by the benchmarks."""
+import json
+import platform
+import subprocess
+import time
+import timeit
+
+
+def measure(fn, number, repeat=3):
+    """Return the best time per call of ``fn``, in microseconds."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def result(name, us_per_op, **params):
+    return {
+        'name': name,
+        'params': params,
+        'us_per_op': us_per_op,
+        'ops_per_sec': 1e6 / us_per_op if us_per_op else None,
+    }
+
+
+def result_id(res):
+    return (res['name'],) + tuple(sorted(res['params'].items()))
+
+
+def _git_commit():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                      stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.decode('ascii').strip()
+
+
+def report(results):
+    """Wrap results with what is needed to compare them across runs."""
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'timestamp': time.time(),
+        'results': list(results),
+    }
+
+
+def write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_results(results, baseline=None):
+    """Print results as a table, with the change relative to the
+    ``baseline`` results if given.
+    """
+    base = {}
+    for res in baseline or []:
+        base[result_id(res)] = res['us_per_op']
+
+    fmt = '%-36s %-40s %12s %9s'
+    print(fmt % ('benchmark', 'params', 'us/op', 'change'))
+    for res in results:
+        params = ' '.join('%s=%s' % item
+                          for item in sorted(res['params'].items()))
+        change = ''
+        before = base.get(result_id(res))
+        if before:
+            change = '%+.1f%%' % ((res['us_per_op'] / before - 1) * 100)
+        print(fmt % (res['name'], params, '%.2f' % res['us_per_op'], change))
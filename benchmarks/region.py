@@ -0,0 +1,233 @@
+"""Benchmark the hot paths of SharedExpirationCacheRegion.
+
+Covers single and multi key reads and writes on the memory backend and
+on the Redis cluster backend talking to an in-process stand-in (so the
+codec and backend code are measured without a network), key generation,
+key mangling, and ``get_or_create`` with several threads on one key.
+
+Usage::
+
+    python -m benchmarks.region [--number N]
+"""
+import argparse
+import threading
+import time
+
+import dogpile.cache
+
+from benchmarks import _util
+from dogpile_cachetool import core as cache
+from dogpile_cachetool import mangling
+from dogpile_cachetool.backends.rediscluster import RedisClusterBackend
+from dogpile_cachetool.utils import cached_property
+
+
+class StandInNodes(object):
+    """A cluster of a single node."""
+
+    node = {'name': 'standin:7000', 'host': 'standin', 'port': 7000}
+
+    def __init__(self):
+        self.slots = [[self.node]] * 16384
+
+
+class StandInConnectionPool(object):
+
+    def __init__(self):
+        self.nodes = StandInNodes()
+
+
+class StandInRedisClient(object):
+    """Dictionary based stand-in for a Redis client."""
+
+    def __init__(self):
+        self.data = {}
+        self.connection_pool = StandInConnectionPool()
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def mset(self, mapping):
+        self.data.update(mapping)
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return StandInPipeline(self)
+
+
+class StandInPipeline(object):
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def _command(name):
+        def command(self, *args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return command
+
+    set = _command('set')
+    mget = _command('mget')
+    mset = _command('mset')
+    delete = _command('delete')
+
+    def execute(self, raise_on_error=True):
+        return [getattr(self.client, name)(*args, **kwargs)
+                for name, args, kwargs in self.commands]
+
+
+class StandInRedisBackend(RedisClusterBackend):
+
+    @cached_property
+    def _client(self):
+        return StandInRedisClient()
+
+    def _node_client(self, node):
+        return self.client
+
+
+dogpile.cache.register_backend(
+    'benchmarks.standin_redis', 'benchmarks.region', 'StandInRedisBackend')
+
+BACKENDS = [
+    ('memory', 'dogpile.cache.memory'),
+    ('redis-standin', 'benchmarks.standin_redis'),
+]
+
+MULTI_KEYS = 100
+
+
+def _region(backend, expiration_time=3600):
+    region = cache.create_region(name='bench')
+    cache.configure_cache_region(region, {
+        'backend': backend,
+        'expiration_time': expiration_time,
+    })
+    return region
+
+
+def _sample_function(user_id, name):
+    return user_id
+
+
+def _creator(*keys):
+    return list(keys)
+
+
+def _run_backend(label, backend, number):
+    region = _region(backend)
+    keys = ['key%d' % i for i in range(MULTI_KEYS)]
+    mapping = dict((key, key) for key in keys)
+    region.set('key', 'value')
+    region.set_multi(mapping)
+    multi_number = max(number // 10, 1)
+
+    yield _util.result(
+        'region.get',
+        _util.measure(lambda: region.get('key'), number),
+        backend=label)
+    yield _util.result(
+        'region.get_or_create',
+        _util.measure(lambda: region.get_or_create('key', _creator), number),
+        backend=label)
+    yield _util.result(
+        'region.set',
+        _util.measure(lambda: region.set('key', 'value'), number),
+        backend=label)
+    yield _util.result(
+        'region.get_multi',
+        _util.measure(lambda: region.get_multi(keys), multi_number),
+        backend=label, keys=MULTI_KEYS)
+    yield _util.result(
+        'region.get_or_create_multi',
+        _util.measure(lambda: region.get_or_create_multi(keys, _creator),
+                      multi_number),
+        backend=label, keys=MULTI_KEYS)
+    yield _util.result(
+        'region.set_multi',
+        _util.measure(lambda: region.set_multi(mapping), multi_number),
+        backend=label, keys=MULTI_KEYS)
+
+
+def _contended(region, threads, number):
+    """Time per ``get_or_create`` call with ``threads`` threads calling it
+    on the same key at once.
+    """
+    start = threading.Event()
+
+    def work():
+        start.wait()
+        for _ in range(number):
+            region.get_or_create('hot', lambda: 'value')
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    began = time.time()
+    start.set()
+    for worker in workers:
+        worker.join()
+    return (time.time() - began) / (threads * number) * 1e6
+
+
+def run(number):
+    for label, backend in BACKENDS:
+        for res in _run_backend(label, backend, number):
+            yield res
+
+    generate = cache.function_key_generator('bench', _sample_function)
+    yield _util.result(
+        'function_key_generator',
+        _util.measure(lambda: generate(12345, 'user'), number),
+        args=2)
+
+    mangle_keys = [
+        ('short', 'user:12345'),
+        ('non-ascii', u'\u7528\u6237:12345'),
+        ('long', 'x' * 1000),
+    ]
+    manglers = [
+        ('sha1-memo', cache._mangle_key),
+        ('sha1', mangling.KeyMangler(memo_size=0)),
+        ('blake2b', mangling.KeyMangler(hash='blake2b', memo_size=0)),
+    ]
+    for kind, key in mangle_keys:
+        for mangler_kind, mangler in manglers:
+            yield _util.result(
+                '_mangle_key',
+                _util.measure(lambda: mangler(key), number),
+                key=kind, mangler=mangler_kind)
+
+    for mode, expiration_time in (('hit', 3600), ('expiring', 0.001)):
+        region = _region('dogpile.cache.memory', expiration_time)
+        for threads in (1, 4, 16):
+            yield _util.result(
+                'region.get_or_create.contended',
+                _contended(region, threads, max(number // threads, 1)),
+                mode=mode, threads=threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=2000,
+                        help='iterations per measurement')
+    args = parser.parse_args()
+    _util.print_results(run(args.number))
+
+
+if __name__ == '__main__':
+    main()
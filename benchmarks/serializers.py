@@ -0,0 +1,80 @@
+"""Compare encode/decode throughput of the value serializers.
+
+Usage::
+
+    python -m benchmarks.serializers [--number N]
+"""
+import argparse
+import time
+import timeit
+
+from dogpile.cache.api import CachedValue
+
+from dogpile_cachetool import serializers
+
+
+def _record(i):
+    return {
+        'id': i,
+        'name': u'user-%d' % i,
+        'email': u'user-%d@example.com' % i,
+        'active': i % 3 != 0,
+        'score': i * 1.5,
+        'tags': [u'a', u'b', u'c'],
+    }
+
+
+def payloads():
+    metadata = {'ct': time.time(), 'v': 1}
+    return [
+        ('small', CachedValue(_record(1), metadata)),
+        ('list-100', CachedValue([_record(i) for i in range(100)], metadata)),
+        ('list-2000',
+         CachedValue([_record(i) for i in range(2000)], metadata)),
+    ]
+
+
+def available_serializers():
+    names = ['pickle', 'json']
+    try:
+        import msgpack  # noqa
+        names.append('msgpack')
+    except ImportError:
+        pass
+    return names
+
+
+def run(number):
+    for payload_name, value in payloads():
+        for name in available_serializers():
+            codec = serializers.ValueCodec(name)
+            data = codec.dumps(value)
+            encode = min(timeit.repeat(
+                lambda: codec.dumps(value), number=number, repeat=3))
+            decode = min(timeit.repeat(
+                lambda: codec.loads(data), number=number, repeat=3))
+            yield {
+                'payload': payload_name,
+                'serializer': name,
+                'bytes': len(data),
+                'encode_us': encode / number * 1e6,
+                'decode_us': decode / number * 1e6,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=200,
+                        help='iterations per measurement')
+    args = parser.parse_args()
+
+    fmt = '%-10s %-8s %10s %12s %12s'
+    print(fmt % ('payload', 'format', 'bytes', 'encode us', 'decode us'))
+    for result in run(args.number):
+        print(fmt % (result['payload'], result['serializer'],
+                     result['bytes'], '%.1f' % result['encode_us'],
+                     '%.1f' % result['decode_us']))
+
+
+if __name__ == '__main__':
+    main()
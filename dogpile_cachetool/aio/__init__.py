@@ -0,0 +1,4 @@
+"""asyncio support (Python 3.5+), see :mod:`.aio.region`."""
+from dogpile_cachetool.aio.region import AsyncCacheRegion  # noqa
+from dogpile_cachetool.aio.region import configure_cache_region  # noqa
+from dogpile_cachetool.aio.region import create_region  # noqa
@@ -0,0 +1,75 @@
+"""Ketama consistent hashing, compatible with ``rc``.
+
+``rc`` only runs on Python 2, but the async rc backend has to place keys
+on the same hosts as :class:`.RedisRCBackend` so both can share a cache.
+This is a port of ``rc.ketama.HashRing`` as used by
+``rc.RedisConsistentHashRouter``, which hashes the ``repr()`` of its
+``HostConfig`` objects.
+"""
+from bisect import bisect
+import hashlib
+import struct
+
+import six
+
+
+_WORD = struct.Struct('<I')
+
+
+def _md5_bytes(data):
+    return bytearray(hashlib.md5(data).digest())
+
+
+def _point(digest, i):
+    # the i-th little-endian 32-bit word of the digest
+    return _WORD.unpack_from(digest, i * 4)[0]
+
+
+def host_identity(host_config):
+    """Return what ``repr(rc.redis_cluster.HostConfig(...))`` would."""
+    identity = {
+        'host': host_config.get('host', 'localhost'),
+        'port': host_config.get('port', 6379),
+        'unix_socket_path': host_config.get('unix_socket_path'),
+        'db': host_config.get('db', 0),
+    }
+    return '<HostConfig %s>' % (
+        ' '.join('%s=%s' % x for x in sorted(identity.items())),
+    )
+
+
+class HashRing(object):
+    """Map keys to host names.
+
+    :param hosts: the ``hosts`` dict of the rc backends, mapping host
+     names to connection arguments.
+    """
+
+    def __init__(self, hosts):
+        self._hashring = {}
+        self._sorted_keys = []
+
+        for host_name, host_config in hosts.items():
+            identity = host_identity(host_config)
+            for i in range(40):
+                digest = _md5_bytes(
+                    ('%s-%s-salt' % (identity, i)).encode('utf-8'))
+                for j in range(4):
+                    point = _point(digest, j)
+                    self._hashring[point] = host_name
+                    self._sorted_keys.append(point)
+
+        self._sorted_keys.sort()
+
+    def get_node(self, key):
+        if not self._hashring:
+            raise RuntimeError('Can not find a host using consistent hash')
+
+        if isinstance(key, six.text_type):
+            key = key.encode('utf-8')
+        point = _point(_md5_bytes(key), 0)
+
+        pos = bisect(self._sorted_keys, point)
+        if pos == len(self._sorted_keys):
+            pos = 0
+        return self._hashring[self._sorted_keys[pos]]
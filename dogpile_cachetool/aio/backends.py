@@ -0,0 +1,274 @@
+"""Async cache backends.
+
+They store values exactly like their synchronous counterparts (same key
+placement, same :mod:`.serializers` format), so async and threaded
+services can share a cache.
+"""
+import asyncio
+
+from dogpile.cache.api import NO_VALUE
+
+from dogpile_cachetool import serializers
+from dogpile_cachetool.aio._ketama import HashRing
+
+
+class AsyncCacheBackend(object):
+    """Base class for async backends, the coroutine counterpart of
+    :class:`dogpile.cache.api.CacheBackend`.
+    """
+
+    def __init__(self, arguments):
+        pass
+
+    async def get(self, key):
+        raise NotImplementedError()
+
+    async def get_multi(self, keys):
+        raise NotImplementedError()
+
+    async def set(self, key, value):
+        raise NotImplementedError()
+
+    async def set_multi(self, mapping):
+        raise NotImplementedError()
+
+    async def delete(self, key):
+        raise NotImplementedError()
+
+    async def delete_multi(self, keys):
+        raise NotImplementedError()
+
+    async def close(self):
+        pass
+
+
+class AsyncMemoryBackend(AsyncCacheBackend):
+    """A dictionary backend, mainly useful for tests.
+
+    :param cache_dict: dictionary to use, defaults to a new one.
+    """
+
+    def __init__(self, arguments):
+        self._cache = arguments.get('cache_dict', {})
+
+    async def get(self, key):
+        return self._cache.get(key, NO_VALUE)
+
+    async def get_multi(self, keys):
+        return [self._cache.get(key, NO_VALUE) for key in keys]
+
+    async def set(self, key, value):
+        self._cache[key] = value
+
+    async def set_multi(self, mapping):
+        self._cache.update(mapping)
+
+    async def delete(self, key):
+        self._cache.pop(key, None)
+
+    async def delete_multi(self, keys):
+        for key in keys:
+            self._cache.pop(key, None)
+
+
+class _AsyncRedisBase(AsyncCacheBackend):
+
+    def __init__(self, arguments):
+        self.redis_expiration_time = arguments.pop('redis_expiration_time', 0)
+        self.codec = serializers.ValueCodec(
+            arguments.pop('serializer', None),
+            compressor=arguments.pop('compression', None),
+            compress_threshold=arguments.pop('compression_threshold', 1024))
+
+    def _loads(self, data):
+        if data is None:
+            return NO_VALUE
+        return self.codec.loads(data)
+
+
+class AsyncRedisRCBackend(_AsyncRedisBase):
+    """Async version of :class:`.RedisRCBackend`.
+
+    Keys are spread over the hosts with the same consistent hashing as
+    ``rc``; multi-key operations run one request per host, concurrently.
+    Connections are made with ``redis.asyncio`` (``redis>=4.3``).
+
+    :param hosts: same as for :class:`.RedisRCBackend`.
+
+    :param redis_expiration_time: integer, number of seconds after setting
+     a value that Redis should expire it.
+
+    :param connection_pool_options: extra keyword arguments for the
+     ``redis.asyncio.StrictRedis`` client of each host, e.g.
+     ``max_connections``.
+
+    :param client_factory: callable building the client of a host from
+     its name and configuration dict, replacing ``redis.asyncio``.
+
+    ``serializer``, ``compression`` and ``compression_threshold`` are the
+    same as for :class:`.RedisRCBackend`.
+    """
+
+    def __init__(self, arguments):
+        arguments = arguments.copy()
+        super(AsyncRedisRCBackend, self).__init__(arguments)
+        self.hosts = arguments.pop('hosts')
+        self.connection_pool_options = arguments.pop(
+            'connection_pool_options', None) or {}
+        self.client_factory = arguments.pop(
+            'client_factory', self._default_client_factory)
+        self._ring = HashRing(self.hosts)
+        self._clients = {}
+
+    def _default_client_factory(self, host_name, host_config):
+        import redis.asyncio
+
+        options = dict(self.connection_pool_options)
+        options.update(host_config)
+        return redis.asyncio.StrictRedis(**options)
+
+    def client_for_host(self, host_name):
+        client = self._clients.get(host_name)
+        if client is None:
+            client = self._clients[host_name] = self.client_factory(
+                host_name, self.hosts[host_name])
+        return client
+
+    def client_for_key(self, key):
+        return self.client_for_host(self._ring.get_node(key))
+
+    def _group_by_host(self, keys):
+        groups = {}
+        for key in keys:
+            groups.setdefault(self._ring.get_node(key), []).append(key)
+        return groups
+
+    async def get(self, key):
+        return self._loads(await self.client_for_key(key).get(key))
+
+    async def get_multi(self, keys):
+        if not keys:
+            return []
+        groups = list(self._group_by_host(keys).items())
+        replies = await asyncio.gather(*[
+            self.client_for_host(host_name).mget(host_keys)
+            for host_name, host_keys in groups])
+
+        values = {}
+        for (_host_name, host_keys), host_values in zip(groups, replies):
+            values.update(zip(host_keys, host_values))
+        return [self._loads(values[key]) for key in keys]
+
+    async def set(self, key, value):
+        await self.client_for_key(key).set(
+            key, self.codec.dumps(value),
+            ex=self.redis_expiration_time or None)
+
+    async def set_multi(self, mapping):
+        if not mapping:
+            return
+        dumps = self.codec.dumps
+        pipes = []
+        for host_name, host_keys in self._group_by_host(mapping).items():
+            pipe = self.client_for_host(host_name).pipeline(
+                transaction=False)
+            for key in host_keys:
+                pipe.set(key, dumps(mapping[key]),
+                         ex=self.redis_expiration_time or None)
+            pipes.append(pipe.execute())
+        await asyncio.gather(*pipes)
+
+    async def delete(self, key):
+        await self.client_for_key(key).delete(key)
+
+    async def delete_multi(self, keys):
+        await asyncio.gather(*[
+            self.client_for_host(host_name).delete(*host_keys)
+            for host_name, host_keys in self._group_by_host(keys).items()])
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.close()
+
+
+class AsyncRedisClusterBackend(_AsyncRedisBase):
+    """Async version of :class:`.RedisClusterBackend`, using
+    ``redis.asyncio.cluster.RedisCluster`` (``redis>=4.3``).
+
+    :param url: string. If provided, will override separate host/port
+     params.
+
+    :param host: string, default is ``localhost``.
+
+    :param password: string, default is no password.
+
+    :param port: integer, default is ``6379``.
+
+    :param max_connections: maximum number of connections per node.
+
+    :param client: an already configured async cluster client, which
+     supersedes all of the connection arguments above.
+
+    ``redis_expiration_time``, ``serializer``, ``compression`` and
+    ``compression_threshold`` are the same as for
+    :class:`.RedisClusterBackend`.
+    """
+
+    def __init__(self, arguments):
+        arguments = arguments.copy()
+        super(AsyncRedisClusterBackend, self).__init__(arguments)
+        self.url = arguments.pop('url', None)
+        self.host = arguments.pop('host', 'localhost')
+        self.password = arguments.pop('password', None)
+        self.port = arguments.pop('port', 6379)
+        self.max_connections = arguments.pop('max_connections', 32)
+        self.client = arguments.pop('client', None)
+        if self.client is None:
+            self.client = self._create_client()
+
+    def _create_client(self):
+        from redis.asyncio.cluster import RedisCluster
+
+        if self.url is not None:
+            return RedisCluster.from_url(
+                self.url, max_connections=self.max_connections)
+        return RedisCluster(host=self.host, port=self.port,
+                            password=self.password,
+                            max_connections=self.max_connections)
+
+    async def get(self, key):
+        return self._loads(await self.client.get(key))
+
+    async def get_multi(self, keys):
+        if not keys:
+            return []
+        values = await self.client.mget_nonatomic(keys)
+        return [self._loads(v) for v in values]
+
+    async def set(self, key, value):
+        await self.client.set(key, self.codec.dumps(value),
+                              ex=self.redis_expiration_time or None)
+
+    async def set_multi(self, mapping):
+        if not mapping:
+            return
+        dumps = self.codec.dumps
+        if not self.redis_expiration_time:
+            await self.client.mset_nonatomic(
+                dict((k, dumps(v)) for k, v in mapping.items()))
+        else:
+            pipe = self.client.pipeline()
+            for key, value in mapping.items():
+                pipe.set(key, dumps(value), ex=self.redis_expiration_time)
+            await pipe.execute()
+
+    async def delete(self, key):
+        await self.client.delete(key)
+
+    async def delete_multi(self, keys):
+        if keys:
+            await self.client.delete(*keys)
+
+    async def close(self):
+        await self.client.close()
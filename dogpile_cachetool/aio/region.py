@@ -0,0 +1,482 @@
+"""Cache region for asyncio applications.
+
+:class:`.AsyncCacheRegion` mirrors :class:`.SharedExpirationCacheRegion`
+with coroutines::
+
+    from dogpile_cachetool import aio
+
+    region = aio.create_region(name='users')
+    aio.configure_cache_region(region, {
+        'backend': 'dogpile_cachetool.aio.redis_rc',
+        'expiration_time': 300,
+        'arguments': {'hosts': {0: {'port': 6379}, 1: {'port': 6479}}},
+    })
+
+    user = await region.get_or_create(user_id, fetch_user)
+
+Values, keys and the shared invalidation timestamps are stored exactly
+as the synchronous region stores them, so both can use the same cache.
+"""
+import asyncio
+import datetime
+import functools
+import time
+
+from dogpile.cache import exception
+from dogpile.cache.api import CachedValue
+from dogpile.cache.api import NO_VALUE
+from dogpile.cache.region import value_version
+import six
+
+from dogpile_cachetool import core
+from dogpile_cachetool import mangling
+
+
+_BACKENDS = {
+    'dogpile_cachetool.aio.memory':
+        'dogpile_cachetool.aio.backends.AsyncMemoryBackend',
+    'dogpile_cachetool.aio.redis_rc':
+        'dogpile_cachetool.aio.backends.AsyncRedisRCBackend',
+    'dogpile_cachetool.aio.rediscluster':
+        'dogpile_cachetool.aio.backends.AsyncRedisClusterBackend',
+}
+
+
+def create_region(*args, **kwargs):
+    """Instantiate a new :class:`.AsyncCacheRegion`."""
+    kwargs.setdefault('function_key_generator', core.function_key_generator)
+    return AsyncCacheRegion(*args, **kwargs)
+
+
+def configure_cache_region(region, conf):
+    """Configure an async cache region, see
+    :func:`dogpile_cachetool.core.configure_cache_region`.
+
+    Proxy backends are synchronous and therefore not supported.
+    """
+    if not isinstance(region, AsyncCacheRegion):
+        raise TypeError('region not type AsyncCacheRegion')
+
+    if not region.is_configured:
+        region.configure(conf['backend'],
+                         expiration_time=conf.get('expiration_time'),
+                         arguments=conf.get('arguments'))
+
+        if conf.get('invalidation_staleness') is not None:
+            region.invalidation_staleness = conf['invalidation_staleness']
+
+        if region.key_mangler is None:
+            region.key_mangler = core._mangle_key
+
+    return region
+
+
+class AsyncCacheRegion(object):
+    """A cache region whose operations are coroutines.
+
+    Concurrent ``get_or_create()`` calls for the same key within the
+    event loop share a single creator call: the first coroutine creates
+    the value, the others wait for it, or return the previous value if
+    there is one (the dogpile lock, made for coroutines).
+
+    Invalidation is shared through the backend like in
+    :class:`.SharedExpirationCacheRegion`; the timestamps are fetched in
+    the same ``get_multi`` call as the values.
+
+    :param invalidation_staleness: number of seconds the shared
+     invalidation timestamps may be cached in-process, see
+     :class:`.SharedExpirationCacheRegion`.
+    """
+
+    def __init__(self, name=None,
+                 function_key_generator=core.function_key_generator,
+                 key_mangler=None, invalidation_staleness=0):
+        self.name = name
+        self.function_key_generator = function_key_generator
+        self.key_mangler = key_mangler
+        self.invalidation_staleness = invalidation_staleness
+        self.backend = None
+        self.expiration_time = None
+
+        # mangled key -> future of the value being created
+        self._creating = {}
+        self._invalidation = None
+        self._invalidation_loaded_at = 0
+        self._invalidation_loading = None
+
+    @property
+    def is_configured(self):
+        return self.backend is not None
+
+    def configure(self, backend, expiration_time=None, arguments=None):
+        """Configure the region with an async backend.
+
+        :param backend: one of the registered names
+         (``dogpile_cachetool.aio.memory``,
+         ``dogpile_cachetool.aio.redis_rc`` or
+         ``dogpile_cachetool.aio.rediscluster``), the dotted path of an
+         :class:`.AsyncCacheBackend` subclass, or the class itself.
+        """
+        if self.is_configured:
+            raise exception.RegionAlreadyConfigured(
+                'This region is already configured with backend: %s' %
+                self.backend)
+
+        if isinstance(backend, six.string_types):
+            backend = core.import_class(_BACKENDS.get(backend, backend))
+        self.backend = backend(arguments or {})
+
+        if isinstance(expiration_time, datetime.timedelta):
+            expiration_time = int(expiration_time.total_seconds())
+        self.expiration_time = expiration_time
+        return self
+
+    def _mangle(self, key):
+        if self.key_mangler:
+            return self.key_mangler(key)
+        return key
+
+    def _value(self, value):
+        return CachedValue(value, {'ct': time.time(), 'v': value_version})
+
+    # -- invalidation
+
+    def _invalidation_keys(self):
+        return [
+            self._mangle(core._Invalidated._REGION_KEY % {
+                'type': typ,
+                'region_name': self.name,
+            })
+            for typ in core._INVALIDATION_TYPES
+        ]
+
+    @staticmethod
+    def _invalidation_from(values):
+        return dict(
+            (typ, core._Invalidated._payload(value))
+            for typ, value in zip(core._INVALIDATION_TYPES, values))
+
+    async def invalidate(self, hard=True):
+        """Invalidate the region for every process sharing the backend,
+        see :meth:`dogpile.cache.CacheRegion.invalidate`.
+        """
+        now = time.time()
+        invalidation = {
+            'hard': now if hard else None,
+            'soft': None if hard else now,
+        }
+        await self.backend.set_multi(dict(
+            (key, self._value(invalidation[typ]))
+            for typ, key in zip(core._INVALIDATION_TYPES,
+                                self._invalidation_keys())))
+        if self._invalidation is not None:
+            self._invalidation = invalidation
+
+    async def refresh_invalidation(self):
+        """Reload the shared invalidation state right away, see
+        :meth:`.SharedExpirationCacheRegion.refresh_invalidation`.
+        """
+        values = await self.backend.get_multi(self._invalidation_keys())
+        self._invalidation = self._invalidation_from(values)
+        self._invalidation_loaded_at = time.time()
+        return self._invalidation
+
+    async def _reload_invalidation(self):
+        try:
+            return await self.refresh_invalidation()
+        finally:
+            self._invalidation_loading = None
+
+    async def _get_invalidation(self):
+        invalidation = self._invalidation
+        if invalidation is not None and \
+                time.time() - self._invalidation_loaded_at <= \
+                self.invalidation_staleness:
+            return invalidation
+
+        if self._invalidation_loading is None:
+            self._invalidation_loading = asyncio.ensure_future(
+                self._reload_invalidation())
+        elif invalidation is not None:
+            # another coroutine is reloading it already
+            return invalidation
+        return await asyncio.shield(self._invalidation_loading)
+
+    async def _fetch(self, mangled_keys):
+        """Return the values of ``mangled_keys`` as a dict, and the
+        invalidation state.
+        """
+        if self.invalidation_staleness:
+            invalidation = await self._get_invalidation()
+            values = await self.backend.get_multi(mangled_keys)
+            return dict(zip(mangled_keys, values)), invalidation
+
+        invalidation_keys = self._invalidation_keys()
+        fetched = await self.backend.get_multi(
+            invalidation_keys + mangled_keys)
+        n = len(invalidation_keys)
+        return (dict(zip(mangled_keys, fetched[n:])),
+                self._invalidation_from(fetched[:n]))
+
+    def _unexpired(self, value, expiration_time, invalidation):
+        if value is NO_VALUE:
+            return value
+        if expiration_time is None:
+            expiration_time = self.expiration_time
+        ct = value.metadata['ct']
+        invalidated = invalidation['hard'] or invalidation['soft']
+        if expiration_time is not None and expiration_time != -1 and \
+                time.time() - ct > expiration_time:
+            return NO_VALUE
+        if invalidated and ct < invalidated:
+            return NO_VALUE
+        return value
+
+    # -- plain access
+
+    async def get(self, key, expiration_time=None, ignore_expiration=False):
+        """Return a value from the cache, or ``NO_VALUE``.
+
+        See :meth:`dogpile.cache.CacheRegion.get`.
+        """
+        key = self._mangle(key)
+        if ignore_expiration:
+            return (await self.backend.get(key)).payload
+        values, invalidation = await self._fetch([key])
+        return self._unexpired(
+            values[key], expiration_time, invalidation).payload
+
+    async def get_multi(self, keys, expiration_time=None,
+                        ignore_expiration=False):
+        """Return multiple values from the cache, see :meth:`get`."""
+        if not keys:
+            return []
+        mangled_keys = mangling.mangle_keys(self.key_mangler, keys)
+        if ignore_expiration:
+            return [value.payload for value in
+                    await self.backend.get_multi(mangled_keys)]
+        values, invalidation = await self._fetch(mangled_keys)
+        return [
+            self._unexpired(values[key], expiration_time,
+                            invalidation).payload
+            for key in mangled_keys
+        ]
+
+    async def set(self, key, value):
+        await self.backend.set(self._mangle(key), self._value(value))
+
+    async def set_multi(self, mapping):
+        if not mapping:
+            return
+        await self.backend.set_multi(dict(
+            (self._mangle(key), self._value(value))
+            for key, value in mapping.items()))
+
+    async def delete(self, key):
+        await self.backend.delete(self._mangle(key))
+
+    async def delete_multi(self, keys):
+        if keys:
+            await self.backend.delete_multi(
+                mangling.mangle_keys(self.key_mangler, keys))
+
+    # -- get or create
+
+    async def get_or_create(self, key, creator, expiration_time=None,
+                            should_cache_fn=None):
+        """Return a cached value, creating it with ``creator`` if needed.
+
+        :param creator: coroutine function called without arguments.
+
+        See :meth:`dogpile.cache.CacheRegion.get_or_create`.
+        """
+        async def create(key):
+            return [await creator()]
+
+        values = await self._get_or_create(
+            [key], create, expiration_time, should_cache_fn)
+        return values[key]
+
+    async def get_or_create_multi(self, keys, creator, expiration_time=None,
+                                  should_cache_fn=None):
+        """Return a sequence of cached values based on a sequence of keys.
+
+        :param creator: coroutine function called with the keys which need
+         a value, returning a sequence of values in the same order.
+
+        See :meth:`dogpile.cache.CacheRegion.get_or_create_multi`.
+        """
+        if not keys:
+            return []
+        values = await self._get_or_create(
+            sorted(set(keys)), creator, expiration_time, should_cache_fn)
+        return [values[key] for key in keys]
+
+    def _value_state(self, value, invalidation, expiration_time, now):
+        """Return ``(payload, fresh)`` for a fetched value; the payload is
+        ``NO_VALUE`` if the value cannot be used at all.
+        """
+        if value is NO_VALUE or value.metadata['v'] != value_version:
+            return NO_VALUE, False
+        ct = value.metadata['ct']
+        if invalidation['hard'] and ct < invalidation['hard']:
+            return NO_VALUE, False
+        if invalidation['soft'] and ct < invalidation['soft']:
+            return value.payload, False
+        fresh = expiration_time is None or now - ct <= expiration_time
+        return value.payload, fresh
+
+    async def _get_or_create(self, keys, creator, expiration_time,
+                             should_cache_fn):
+        orig_expiration_time = expiration_time
+        if expiration_time is None:
+            expiration_time = self.expiration_time
+
+        mangled = dict((key, self._mangle(key)) for key in keys)
+        values, invalidation = await self._fetch(
+            [mangled[key] for key in keys])
+
+        if expiration_time is None and invalidation['soft']:
+            raise exception.DogpileCacheException(
+                "Non-None expiration time required "
+                "for soft invalidation")
+
+        if expiration_time == -1:
+            expiration_time = None
+
+        results = {}
+        waiting = {}
+        to_create = []
+        now = time.time()
+        for key in keys:
+            payload, fresh = self._value_state(
+                values[mangled[key]], invalidation, expiration_time, now)
+            if fresh:
+                results[key] = payload
+                continue
+
+            future = self._creating.get(mangled[key])
+            if future is None:
+                to_create.append(key)
+            elif payload is not NO_VALUE:
+                # being regenerated, keep serving the old value meanwhile
+                results[key] = payload
+            else:
+                waiting[key] = future
+
+        if to_create:
+            results.update(await self._create(
+                to_create, mangled, creator, invalidation, expiration_time,
+                should_cache_fn))
+
+        for key, future in waiting.items():
+            try:
+                results[key] = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # the creating coroutine was cancelled, take over
+                results.update(await self._get_or_create(
+                    [key], creator, orig_expiration_time, should_cache_fn))
+        return results
+
+    async def _create(self, keys, mangled, creator, invalidation,
+                      expiration_time, should_cache_fn):
+        loop = asyncio.get_event_loop()
+        futures = {}
+        for key in keys:
+            futures[key] = self._creating[mangled[key]] = \
+                loop.create_future()
+
+        try:
+            # Like dogpile does once it holds the lock: the value may have
+            # been stored while we were fetching it.
+            mangled_keys = [mangled[key] for key in keys]
+            current = await self.backend.get_multi(mangled_keys)
+            created = {}
+            now = time.time()
+            for key, value in zip(keys, current):
+                payload, fresh = self._value_state(
+                    value, invalidation, expiration_time, now)
+                if fresh:
+                    created[key] = payload
+
+            missing = [key for key in keys if key not in created]
+            if missing:
+                new_values = dict(zip(missing, await creator(*missing)))
+                created.update(new_values)
+
+                mapping = dict(
+                    (mangled[key], self._value(value))
+                    for key, value in new_values.items()
+                    if not should_cache_fn or should_cache_fn(value))
+                if mapping:
+                    await self.backend.set_multi(mapping)
+        except BaseException as e:
+            for future in futures.values():
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    # do not complain if nobody was waiting for it
+                    future.exception()
+            raise
+        else:
+            for key, future in futures.items():
+                future.set_result(created[key])
+        finally:
+            for key, future in futures.items():
+                if self._creating.get(mangled[key]) is future:
+                    del self._creating[mangled[key]]
+        return created
+
+    def cache_on_arguments(self, namespace=None, expiration_time=None,
+                           should_cache_fn=None,
+                           function_key_generator=None):
+        """Decorate a coroutine function so its results are cached.
+
+        The decorated function gets ``invalidate()``, ``set()``, ``get()``
+        and ``refresh()`` coroutines and an ``original`` attribute, see
+        :meth:`dogpile.cache.CacheRegion.cache_on_arguments`.
+        """
+        expiration_time_is_callable = callable(expiration_time)
+
+        if function_key_generator is None:
+            function_key_generator = self.function_key_generator
+
+        def decorator(fn):
+            key_generator = function_key_generator(namespace, fn)
+
+            @functools.wraps(fn)
+            async def decorate(*arg, **kw):
+                key = key_generator(*arg, **kw)
+
+                async def creator():
+                    return await fn(*arg, **kw)
+                timeout = expiration_time() if expiration_time_is_callable \
+                    else expiration_time
+                return await self.get_or_create(key, creator, timeout,
+                                                should_cache_fn)
+
+            async def invalidate(*arg, **kw):
+                await self.delete(key_generator(*arg, **kw))
+
+            async def set_(value, *arg, **kw):
+                await self.set(key_generator(*arg, **kw), value)
+
+            async def get(*arg, **kw):
+                return await self.get(key_generator(*arg, **kw))
+
+            async def refresh(*arg, **kw):
+                value = await fn(*arg, **kw)
+                await self.set(key_generator(*arg, **kw), value)
+                return value
+
+            decorate.set = set_
+            decorate.invalidate = invalidate
+            decorate.refresh = refresh
+            decorate.get = get
+            decorate.original = fn
+
+            return decorate
+        return decorator
@@ -0,0 +1,169 @@
+"""Helpers shared by the Redis based backends."""
+from binascii import crc_hqx
+import collections
+import itertools
+import logging
+
+import six
+
+
+_LOG = logging.getLogger(__name__)
+
+CLUSTER_SLOTS = 16384
+
+
+def key_slot(key):
+    """Return the Redis Cluster hash slot of ``key``.
+
+    Only the part between the first ``{`` and the following ``}`` is
+    hashed when it is not empty (a hash tag), so that related keys can
+    be kept in the same slot.
+    """
+    if isinstance(key, six.text_type):
+        key = key.encode('utf-8')
+    start = key.find(b'{')
+    if start > -1:
+        end = key.find(b'}', start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+    return crc_hqx(key, 0) % CLUSTER_SLOTS
+
+
+def expiration_for(key, ttl, default):
+    """Return the number of seconds ``key`` should live for, ``0`` for no
+    expiration.
+
+    ``ttl`` is either a number of seconds for all keys, or a dict of
+    them per key, keys missing from it getting ``default``.
+    """
+    if ttl is None:
+        return default
+    if isinstance(ttl, dict):
+        return ttl.get(key, default)
+    return ttl
+
+
+def was_stored(result):
+    """Whether the reply to a ``SET`` command means the value was
+    stored: ``NX`` yields a nil reply when the key exists, and pipelines
+    may return errors in place of replies.
+    """
+    return bool(result) and not isinstance(result, Exception)
+
+
+def map_bounded(fn, items, pool, concurrency):
+    """Yield ``fn(item)`` for each of ``items``, in order, running up to
+    ``concurrency`` of them at once on a thread pool, returned by the
+    ``pool`` function when first needed.
+
+    Unlike ``pool.imap``, ``items`` is not consumed further ahead than
+    that, which bounds the memory used by batches in flight.  A single
+    item is handled in the calling thread, which is much cheaper than a
+    round trip through the pool.
+    """
+    if concurrency > 1:
+        items = iter(items)
+        head = list(itertools.islice(items, 2))
+        items = itertools.chain(head, items)
+    if concurrency <= 1 or len(head) < 2:
+        for item in items:
+            yield fn(item)
+        return
+
+    pending = collections.deque()
+    for item in items:
+        pending.append(pool().apply_async(fn, (item,)))
+        if len(pending) >= concurrency:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+class RedisSnapshotMixin(object):
+    """Raw (already serialized) access to a key namespace.
+
+    Used by :mod:`dogpile_cachetool.snapshot` to dump and restore the
+    contents of a region without decoding every value.  Subclasses
+    provide :meth:`_scan_clients` and :meth:`restore_serialized`.
+    """
+
+    def _scan_clients(self):
+        """Return the clients whose keyspaces make up the whole cache."""
+        raise NotImplementedError()
+
+    def dump_serialized(self, match=None, batch_size=1000):
+        """Yield ``(key, data, ttl_ms)`` for keys matching ``match``.
+
+        ``ttl_ms`` is the remaining time to live in milliseconds, or
+        ``None`` if the key does not expire.
+        """
+        for client in self._scan_clients():
+            keys = []
+            for key in client.scan_iter(match=match, count=batch_size):
+                keys.append(key)
+                if len(keys) >= batch_size:
+                    for record in self._fetch_serialized(client, keys):
+                        yield record
+                    keys = []
+            if keys:
+                for record in self._fetch_serialized(client, keys):
+                    yield record
+
+    @staticmethod
+    def _fetch_serialized(client, keys):
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+            pipe.pttl(key)
+        results = pipe.execute()
+        for i, key in enumerate(keys):
+            data, ttl_ms = results[i * 2], results[i * 2 + 1]
+            if data is None:
+                # expired or deleted in between
+                continue
+            yield key, data, ttl_ms if ttl_ms and ttl_ms > 0 else None
+
+    def restore_serialized(self, records):
+        """Store ``(key, data, ttl_ms)`` records as they are."""
+        raise NotImplementedError()
+
+
+def _lock_not_owned(error):
+    """Whether a ``LockError`` raised by ``Lock.release()`` means the
+    token no longer matches, i.e. the lock expired (and may have been
+    taken by someone else) before being released.
+    """
+    try:
+        from redis.exceptions import LockNotOwnedError
+    except ImportError:  # redis < 3.0
+        return 'no longer owned' in str(error)
+    return isinstance(error, LockNotOwnedError)
+
+
+class RedisMutex(object):
+    """dogpile mutex on top of a ``redis-py`` lock.
+
+    The lock is token based, so only its holder can release it; it must
+    not be thread local (``thread_local=False``), as values may be created
+    and the lock released by another thread (see
+    :class:`.ThreadPoolCreationRunner`).  If it expired (``lock_timeout``)
+    before being released, another process may hold it by now; that is
+    logged instead of failing the cache call.  Other errors are raised.
+    """
+
+    def __init__(self, lock):
+        self.lock = lock
+
+    def acquire(self, wait=True):
+        return self.lock.acquire(blocking=wait)
+
+    def release(self):
+        from redis.exceptions import LockError
+
+        try:
+            self.lock.release()
+        except LockError as e:
+            if not _lock_not_owned(e):
+                raise
+            _LOG.warning('Lock %r expired before it was released, consider '
+                         'raising lock_timeout.', self.lock.name)
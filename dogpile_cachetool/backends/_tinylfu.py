@@ -0,0 +1,244 @@
+"""W-TinyLFU store used by the local backends with ``policy='tinylfu'``.
+
+Einziger, Friedman and Manes, *TinyLFU: A Highly Efficient Cache
+Admission Policy*: new entries go to a small LRU window; an entry leaving
+the window only replaces the least recently used entry of the main area
+if it has been accessed more often, as estimated by a count-min sketch
+which is halved periodically to forget old accesses.  One-off keys, such
+as those of a batch scan, thus never push out the hot set.  The main
+area is a segmented LRU: entries accessed again are protected from
+newcomers.
+"""
+import collections
+import threading
+import time
+
+from dogpile.cache import api
+
+
+NO_VALUE = api.NO_VALUE
+
+# 4-bit counters, as in the paper
+_MAX_COUNT = 15
+_HALVE = bytes(bytearray(i >> 1 for i in range(256)))
+
+
+class _CountMinSketch(object):
+    """Approximate access counts of ``width`` keys or so."""
+
+    def __init__(self, width, depth=4):
+        width = 1 << max((int(width) - 1).bit_length(), 4)
+        self.mask = width - 1
+        self.depth = depth
+        self.table = [bytearray(width) for _ in range(depth)]
+        self.sample_size = 10 * width
+        self.additions = 0
+
+    def _indexes(self, key):
+        h = hash(key)
+        step = (h >> 17) | 1
+        mask = self.mask
+        return [(h + i * step) & mask for i in range(self.depth)]
+
+    def increment(self, key):
+        added = False
+        for row, i in zip(self.table, self._indexes(key)):
+            if row[i] < _MAX_COUNT:
+                row[i] += 1
+                added = True
+        if added:
+            self.additions += 1
+            if self.additions >= self.sample_size:
+                self._reset()
+
+    def estimate(self, key):
+        return min(row[i] for row, i in zip(self.table, self._indexes(key)))
+
+    def _reset(self):
+        self.table = [row.translate(_HALVE) for row in self.table]
+        self.additions //= 2
+
+
+class _Segment(object):
+    """An LRU list of ``key: (value, weight, deadline)``."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.weight = 0
+        self.entries = collections.OrderedDict()
+
+    def push(self, key, entry):
+        self.entries[key] = entry
+        self.weight += entry[1]
+
+    def pop(self, key):
+        entry = self.entries.pop(key)
+        self.weight -= entry[1]
+        return entry
+
+    def pop_lru(self):
+        key, entry = self.entries.popitem(last=False)
+        self.weight -= entry[1]
+        return key, entry
+
+    def lru(self):
+        return next(iter(self.entries))
+
+    def over(self):
+        return self.weight > self.capacity
+
+
+class _TinyLFUStore(object):
+    """A thread-safe, bounded mapping with per-entry deadlines and the
+    W-TinyLFU policy, with the interface of :class:`._LRUStore`.
+
+    The capacity is ``max_bytes`` of values when given, else
+    ``max_entries`` entries.
+
+    :param window_ratio: fraction of the capacity taken by the window.
+
+    :param protected_ratio: fraction of the main area taken by entries
+     accessed more than once.
+
+    :param sketch_width: number of counters per row of the sketch,
+     default is four times ``max_entries``: a narrower sketch overrates
+     rare keys.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None,
+                 sizeof=None, window_ratio=.01, protected_ratio=.8,
+                 sketch_width=None):
+        if not max_entries and not max_bytes:
+            raise ValueError('TinyLFU requires max_entries or max_bytes')
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        capacity = max_bytes or max_entries
+        window = max(int(capacity * window_ratio), 1)
+        main = max(capacity - window, 1)
+        self._window = _Segment(window)
+        self._probation = _Segment(main)
+        self._protected = _Segment(int(main * protected_ratio))
+        self._main_capacity = main
+        self._where = {}
+        self.sketch = _CountMinSketch(
+            sketch_width or 4 * (max_entries or 10000))
+        self._lock = threading.Lock()
+
+        # entries leaving the window for the main area, or dropped
+        self.admitted = 0
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self._where)
+
+    @property
+    def total_bytes(self):
+        if not self.max_bytes:
+            return 0
+        return self._window.weight + self._probation.weight + \
+            self._protected.weight
+
+    def admission_rate(self):
+        """Fraction of the entries leaving the window which were kept."""
+        total = self.admitted + self.rejected
+        return float(self.admitted) / total if total else None
+
+    def get(self, key, now=None):
+        with self._lock:
+            self.sketch.increment(key)
+            segment = self._where.get(key)
+            if segment is None:
+                return NO_VALUE
+            entry = segment.pop(key)
+            value, _weight, deadline = entry
+            if deadline is not None and (now or time.time()) >= deadline:
+                del self._where[key]
+                return NO_VALUE
+            if segment is self._probation:
+                segment = self._protected
+                self._where[key] = segment
+            segment.push(key, entry)
+            self._demote()
+            return value
+
+    def set(self, key, value, now=None):
+        weight = self.sizeof(value) if self.max_bytes else 1
+        if self.max_bytes and weight > self.max_bytes:
+            # never going to fit, make sure a stale copy does not linger
+            self.delete(key)
+            return
+        deadline = None
+        if self.ttl is not None:
+            deadline = (now or time.time()) + self.ttl
+        entry = (value, weight, deadline)
+        with self._lock:
+            segment = self._where.get(key)
+            if segment is None:
+                segment = self._where[key] = self._window
+            else:
+                segment.pop(key)
+            segment.push(key, entry)
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            segment = self._where.pop(key, None)
+            if segment is not None:
+                segment.pop(key)
+
+    def clear(self):
+        with self._lock:
+            for segment in (self._window, self._probation, self._protected):
+                segment.entries.clear()
+                segment.weight = 0
+            self._where.clear()
+
+    def _main_weight(self):
+        return self._probation.weight + self._protected.weight
+
+    def _demote(self):
+        protected = self._protected
+        while protected.over():
+            key, entry = protected.pop_lru()
+            self._probation.push(key, entry)
+            self._where[key] = self._probation
+
+    def _evict(self):
+        self._demote()
+        window = self._window
+        while window.over():
+            key, entry = window.pop_lru()
+            if self._admit(key, entry):
+                self._probation.push(key, entry)
+                self._where[key] = self._probation
+                self.admitted += 1
+            else:
+                del self._where[key]
+                self.rejected += 1
+        # entries of the main area replaced by larger values
+        while self._main_weight() > self._main_capacity:
+            victim, _ = self._victim_segment().pop_lru()
+            del self._where[victim]
+
+    def _admit(self, key, entry):
+        """Make room in the main area for ``key`` if it is accessed more
+        often than the entries it would replace.
+        """
+        weight = entry[1]
+        if weight > self._main_capacity:
+            return False
+        if self._main_weight() + weight <= self._main_capacity:
+            return True
+        frequency = self.sketch.estimate(key)
+        victim = self._victim_segment().lru()
+        if frequency <= self.sketch.estimate(victim):
+            return False
+        while self._main_weight() + weight > self._main_capacity:
+            victim, _ = self._victim_segment().pop_lru()
+            del self._where[victim]
+        return True
+
+    def _victim_segment(self):
+        return self._probation if self._probation.entries else \
+            self._protected
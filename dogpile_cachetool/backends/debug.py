@@ -1,44 +1,131 @@
 import logging
+import random
 
+from dogpile.cache import api
 from dogpile.cache import proxy
+from six.moves import reprlib
 
 
 _LOG = logging.getLogger(__name__)
 
 
+class _Repr(object):
+    """Format an object with ``repr`` only if and when the log record is
+    actually emitted, cutting the result to ``budget`` characters.
+    """
+
+    __slots__ = ('obj', 'budget')
+
+    def __init__(self, obj, budget):
+        self.obj = obj
+        self.budget = budget
+
+    def __str__(self):
+        obj = self.obj
+        if self.budget is None:
+            return repr(obj)
+
+        short = reprlib.Repr()
+        short.maxstring = short.maxother = self.budget
+        short.maxlist = short.maxtuple = short.maxdict = \
+            short.maxset = short.maxfrozenset = max(self.budget // 4, 1)
+        if isinstance(obj, api.CachedValue):
+            text = 'CachedValue(%s, %r)' % (short.repr(obj.payload),
+                                            obj.metadata)
+        else:
+            text = short.repr(obj)
+        if len(text) > self.budget:
+            text = text[:self.budget] + '...'
+        return text
+
+
 class _DebugProxy(proxy.ProxyBackend):
-    """Extra Logging ProxyBackend."""
+    """Extra Logging ProxyBackend.
+
+    Enabled with the ``debug`` option of :func:`.configure_cache_region`,
+    which is either ``True`` or a dictionary of the arguments below, so
+    that it can stay on where latency matters.
+
+    :param sample_rate: fraction of the operations logged, default is
+     ``1``.
+
+    :param max_repr: maximum number of characters of the representation
+     of each key list and value, default is no limit.
+
+    :param keys_only: log keys but not values, default is ``False``.
+
+    Nothing is formatted unless the logger is enabled for ``DEBUG``.
+    """
     # NOTE(morganfainberg): Pass all key/values through repr to ensure we have
     # a clean description of the information.  Without use of repr, it might
     # be possible to run into encode/decode error(s). For logging/debugging
     # purposes encode/decode is irrelevant and we should be looking at the
     # data exactly as it stands.
 
+    def __init__(self, arguments=None):
+        super(_DebugProxy, self).__init__()
+        arguments = arguments or {}
+        self.sample_rate = arguments.get('sample_rate', 1)
+        self.max_repr = arguments.get('max_repr')
+        self.keys_only = arguments.get('keys_only', False)
+
+    def _enabled(self):
+        if not _LOG.isEnabledFor(logging.DEBUG):
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def _repr(self, obj):
+        return _Repr(obj, self.max_repr)
+
     def get(self, key):
         value = self.proxied.get(key)
-        _LOG.debug('CACHE_GET: Key: "%(key)r" Value: "%(value)r"',
-                   {'key': key, 'value': value})
+        if self._enabled():
+            if not self.keys_only:
+                value_repr = self._repr(value)
+            elif value is api.NO_VALUE:
+                value_repr = '<miss>'
+            else:
+                value_repr = '<hit>'
+            _LOG.debug('CACHE_GET: Key: "%(key)s" Value: "%(value)s"',
+                       {'key': self._repr(key), 'value': value_repr})
         return value
 
     def get_multi(self, keys):
         values = self.proxied.get_multi(keys)
-        _LOG.debug('CACHE_GET_MULTI: "%(keys)r" Values: "%(values)r"',
-                   {'keys': keys, 'values': values})
+        if self._enabled():
+            if self.keys_only:
+                hits = sum(1 for v in values if v is not api.NO_VALUE)
+                values_repr = '<%d hits>' % hits
+            else:
+                values_repr = self._repr(values)
+            _LOG.debug('CACHE_GET_MULTI: "%(keys)s" Values: "%(values)s"',
+                       {'keys': self._repr(keys), 'values': values_repr})
         return values
 
     def set(self, key, value):
-        _LOG.debug('CACHE_SET: Key: "%(key)r" Value: "%(value)r"',
-                   {'key': key, 'value': value})
+        if self._enabled():
+            if self.keys_only:
+                _LOG.debug('CACHE_SET: Key: "%s"', self._repr(key))
+            else:
+                _LOG.debug('CACHE_SET: Key: "%(key)s" Value: "%(value)s"',
+                           {'key': self._repr(key),
+                            'value': self._repr(value)})
         return self.proxied.set(key, value)
 
     def set_multi(self, keys):
-        _LOG.debug('CACHE_SET_MULTI: "%r"', keys)
+        if self._enabled():
+            if self.keys_only:
+                _LOG.debug('CACHE_SET_MULTI: "%s"', self._repr(list(keys)))
+            else:
+                _LOG.debug('CACHE_SET_MULTI: "%s"', self._repr(keys))
         self.proxied.set_multi(keys)
 
     def delete(self, key):
         self.proxied.delete(key)
-        _LOG.debug('CACHE_DELETE: "%r"', key)
+        if self._enabled():
+            _LOG.debug('CACHE_DELETE: "%s"', self._repr(key))
 
     def delete_multi(self, keys):
-        _LOG.debug('CACHE_DELETE_MULTI: "%r"', keys)
+        if self._enabled():
+            _LOG.debug('CACHE_DELETE_MULTI: "%s"', self._repr(keys))
         self.proxied.delete_multi(keys)
@@ -0,0 +1,360 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from dogpile.cache import api
+import six
+
+from dogpile_cachetool import serializers
+from dogpile_cachetool.backends._redis import expiration_for
+
+
+_LOG = logging.getLogger(__name__)
+
+NO_VALUE = api.NO_VALUE
+
+_LOG_NAME = 'cache.log'
+
+# crc32 of the rest of the record, kind, key length, value length,
+# expiration timestamp (0 for none)
+_RECORD = struct.Struct('<IBIId')
+_SET, _DELETE = 1, 2
+
+
+def _pack(kind, key, value, expires):
+    body = _RECORD.pack(0, kind, len(key), len(value), expires)[4:] + \
+        key + value
+    return struct.pack('<I', zlib.crc32(body) & 0xffffffff) + body
+
+
+def _records(buf, start, end):
+    """Yield ``(offset, kind, key, value_offset, value_length, expires,
+    record_length)`` for the records of ``buf`` between ``start`` and
+    ``end``, stopping at the first incomplete or corrupt one.
+    """
+    offset = start
+    while offset + _RECORD.size <= end:
+        crc, kind, key_len, value_len, expires = \
+            _RECORD.unpack_from(buf, offset)
+        record_len = _RECORD.size + key_len + value_len
+        if offset + record_len > end or kind not in (_SET, _DELETE) or \
+                zlib.crc32(buf[offset + 4:offset + record_len]) & \
+                0xffffffff != crc:
+            return
+        key_offset = offset + _RECORD.size
+        yield (offset, kind, buf[key_offset:key_offset + key_len],
+               key_offset + key_len, value_len, expires, record_len)
+        offset += record_len
+
+
+class DiskBackend(api.CacheBackend):
+    """A cache persisted in a local directory, for large values that are
+    slow to recompute but too big to keep in memory or in Redis.
+
+    Example configuration::
+
+        configure_cache_region(region, {
+            'backend': 'dogpile_cachetool.disk',
+            'expiration_time': 86400,
+            'arguments': {
+                'path': '/var/cache/myapp',
+            },
+        })
+
+    Entries are appended to a log file, and an in-memory index maps keys
+    to their latest value.  Values are read through a memory map of the
+    log and handed to the deserializer without being copied.  Overwritten,
+    deleted and expired entries are reclaimed by rewriting the log in a
+    background thread once they make up enough of it.  On startup the log
+    is replayed to rebuild the index, and a record left incomplete by a
+    crash is cut off.
+
+    The directory is locked: a single process at a time may use it.
+
+    Arguments accepted in the arguments dictionary:
+
+    :param path: directory holding the log, created if needed.  Required.
+
+    :param ttl: number of seconds entries live for, default is no limit.
+     Entries are dropped once expired, independently of the region's
+     ``expiration_time``.
+
+    :param sync: ``fsync`` every write, default is ``False``: a write is
+     only durable once the operating system flushed it.
+
+    :param compact_ratio: fraction of the log that must be reclaimable
+     for a compaction to start, default is ``0.5``.
+
+    :param compact_min_bytes: size that must be reclaimable for a
+     compaction to start, default is 1 MiB.
+
+    :param serializer: see :class:`.RedisRCBackend`.
+
+    :param compression: see :class:`.RedisRCBackend`.
+
+    :param compression_threshold: see :class:`.RedisRCBackend`.
+    """
+
+    def __init__(self, arguments):
+        self.path = arguments.get('path')
+        if not self.path:
+            raise ValueError('DiskBackend requires a path')
+        self.ttl = arguments.get('ttl')
+        self.sync = arguments.get('sync', False)
+        self.compact_ratio = arguments.get('compact_ratio', .5)
+        self.compact_min_bytes = arguments.get('compact_min_bytes', 1 << 20)
+        self.codec = serializers.ValueCodec(
+            arguments.get('serializer'),
+            compressor=arguments.get('compression'),
+            compress_threshold=arguments.get('compression_threshold', 1024))
+
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compactor = None
+        self._map = None
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self._filename = os.path.join(self.path, _LOG_NAME)
+        self._file = self._open(self._filename, 'a+b')
+        self._recover()
+
+    @staticmethod
+    def _open(filename, mode):
+        f = open(filename, mode)
+        try:
+            import fcntl
+        except ImportError:  # pragma: no cover
+            return f
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            f.close()
+            raise ValueError('%s is used by another process' % filename)
+        return f
+
+    def _recover(self):
+        """Rebuild the index from the log."""
+        self._index = {}
+        self._size = 0
+        self._dead = 0
+        end = os.fstat(self._file.fileno()).st_size
+        if not end:
+            return
+        buf = self._buffer(end)
+        now = time.time()
+        for record in _records(buf, 0, end):
+            self._apply(record, now)
+            self._size = record[0] + record[6]
+        if self._size < end:
+            _LOG.warning('Truncating %s: %d bytes after offset %d are '
+                         'incomplete or corrupt', self._filename,
+                         end - self._size, self._size)
+            self._map = None
+            self._file.truncate(self._size)
+
+    def _apply(self, record, now, shift=0):
+        """Update the index with a record, located ``shift`` bytes
+        further in the log than in the buffer it was read from.
+        """
+        _, kind, key, value_offset, value_len, expires, record_len = record
+        old = self._index.pop(key, None)
+        if old is not None:
+            self._dead += old[3]
+        if kind == _DELETE or (expires and expires <= now):
+            self._dead += record_len
+        else:
+            self._index[key] = (value_offset + shift, value_len, expires,
+                                record_len)
+
+    def _buffer(self, end):
+        """Return a memory map of the log covering at least ``end``
+        bytes.
+        """
+        if self._map is None or len(self._map) < end:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        return self._map
+
+    def close(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            self._map = None
+            self._file.close()
+
+    # -- writes
+
+    def _append(self, records):
+        """Append ``(kind, key, value, expires)`` records to the log."""
+        now = time.time()
+        with self._lock:
+            data = []
+            applied = []
+            offset = self._size
+            for kind, key, value, expires in records:
+                record = _pack(kind, key, value, expires)
+                data.append(record)
+                applied.append((offset, kind, key,
+                                offset + _RECORD.size + len(key), len(value),
+                                expires, len(record)))
+                offset += len(record)
+            self._file.write(b''.join(data))
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+            self._size = offset
+            for record in applied:
+                self._apply(record, now)
+            if self._should_compact():
+                self._compactor = threading.Thread(target=self.compact)
+                self._compactor.daemon = True
+                self._compactor.start()
+
+    def _should_compact(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return False
+        return self._dead >= self.compact_min_bytes and \
+            self._dead >= self._size * self.compact_ratio
+
+    def compact(self):
+        """Rewrite the log with live entries only.
+
+        Writes go on meanwhile: live entries are copied without holding
+        the lock, then whatever was appended in the meantime is copied
+        under the lock, and the new log replaces the old one.
+        """
+        with self._compact_lock:
+            with self._lock:
+                index = dict(self._index)
+                end = self._size
+                buf = self._buffer(end) if end else b''
+
+            tmp_filename = self._filename + '.compact'
+            out = self._open(tmp_filename, 'w+b')
+            try:
+                now = time.time()
+                new_index = {}
+                offset = 0
+                for key, (value_offset, value_len, expires, _) in \
+                        index.items():
+                    if expires and expires <= now:
+                        continue
+                    record = _pack(_SET, key, buf[value_offset:
+                                                  value_offset + value_len],
+                                   expires)
+                    out.write(record)
+                    new_index[key] = (offset + _RECORD.size + len(key),
+                                      value_len, expires, len(record))
+                    offset += len(record)
+            except BaseException:
+                out.close()
+                os.unlink(tmp_filename)
+                raise
+
+            with self._lock:
+                try:
+                    old_index, self._index = self._index, new_index
+                    self._dead = 0
+                    if self._size > end:
+                        tail_buf = self._buffer(self._size)
+                        for record in _records(tail_buf, end, self._size):
+                            self._apply(record, now, offset - end)
+                        out.write(tail_buf[end:self._size])
+                        offset += self._size - end
+                    out.flush()
+                    os.fsync(out.fileno())
+                    os.rename(tmp_filename, self._filename)
+                except BaseException:
+                    self._index = old_index
+                    out.close()
+                    os.unlink(tmp_filename)
+                    raise
+                # readers may still use the old map, it is released with
+                # them
+                self._map = None
+                self._file.close()
+                self._file = out
+                self._size = offset
+
+    # -- CacheBackend
+
+    @staticmethod
+    def _encode_key(key):
+        if not isinstance(key, bytes):
+            key = key.encode('utf-8')
+        return key
+
+    def _view(self, key):
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            value_offset, value_len, expires, record_len = entry
+            if expires and expires <= time.time():
+                del self._index[key]
+                self._dead += record_len
+                return None
+            buf = self._buffer(value_offset + value_len)
+        if six.PY2:
+            # mmap does not support the buffer protocol there
+            return buf[value_offset:value_offset + value_len]
+        return memoryview(buf)[value_offset:value_offset + value_len]
+
+    def get(self, key):
+        view = self._view(self._encode_key(key))
+        if view is None:
+            return NO_VALUE
+        return self.codec.loads(view)
+
+    def get_multi(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value):
+        self.bulk_set({key: value})
+
+    def set_multi(self, mapping):
+        self.bulk_set(mapping)
+
+    def bulk_set(self, mapping, ttl=None, nx=False):
+        """Store the values of ``mapping`` with a single write.
+
+        :param ttl: number of seconds the values should live for, or a
+         dict of them per key.  Defaults to the ``ttl`` argument.
+        :param nx: only store values whose key does not exist yet.
+        :return: dict telling for every key whether its value was stored.
+        """
+        now = time.time()
+        records = []
+        for key, value in mapping.items():
+            seconds = expiration_for(key, ttl, self.ttl)
+            records.append((key, (_SET, self._encode_key(key),
+                                  self.codec.dumps(value),
+                                  now + seconds if seconds else 0)))
+        with self._lock:
+            stored = {}
+            if nx:
+                for key, record in records:
+                    stored[key] = self._view(record[1]) is None
+                records = [item for item in records if stored[item[0]]]
+            else:
+                stored = dict.fromkeys(mapping, True)
+            if records:
+                self._append([record for _, record in records])
+        return stored
+
+    def delete(self, key):
+        self.delete_multi([key])
+
+    def delete_multi(self, keys):
+        records = []
+        for key in keys:
+            key = self._encode_key(key)
+            if key in self._index:
+                records.append((_DELETE, key, b'', 0))
+        if records:
+            self._append(records)
@@ -0,0 +1,310 @@
+import collections
+import threading
+import time
+
+from dogpile.cache import api
+from dogpile.cache import proxy
+from six.moves import cPickle as pickle
+
+from dogpile_cachetool.backends._tinylfu import _TinyLFUStore
+
+
+NO_VALUE = api.NO_VALUE
+
+
+def _pickled_size(value):
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+class _LRUStore(object):
+    """A thread-safe, bounded LRU mapping with per-entry deadlines.
+
+    Entries are evicted in least-recently-used order once either
+    ``max_entries`` or ``max_bytes`` would be exceeded.  Entries whose
+    deadline has passed are dropped lazily on access.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None,
+                 sizeof=_pickled_size):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, now=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return NO_VALUE
+            value, size, deadline = entry
+            if deadline is not None and (now or time.time()) >= deadline:
+                self.total_bytes -= size
+                return NO_VALUE
+            # re-insert to mark as most recently used
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value, now=None):
+        size = self.sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            # never going to fit, make sure a stale copy does not linger
+            self.delete(key)
+            return
+        deadline = None
+        if self.ttl is not None:
+            deadline = (now or time.time()) + self.ttl
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._entries[key] = (value, size, deadline)
+            self.total_bytes += size
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _over_entries(self):
+        return self.max_entries and len(self._entries) > self.max_entries
+
+    def _over_bytes(self):
+        return self.max_bytes and self.total_bytes > self.max_bytes
+
+    def _evict(self):
+        entries = self._entries
+        while entries and (self._over_entries() or self._over_bytes()):
+            _key, (_value, size, _deadline) = entries.popitem(last=False)
+            self.total_bytes -= size
+
+
+def _create_store(arguments, ttl):
+    policy = arguments.get('policy', 'lru')
+    if policy == 'lru':
+        return _LRUStore(
+            max_entries=arguments.get('max_entries', 10000),
+            max_bytes=arguments.get('max_bytes'),
+            ttl=ttl)
+    if policy == 'tinylfu':
+        return _TinyLFUStore(
+            max_entries=arguments.get('max_entries', 10000),
+            max_bytes=arguments.get('max_bytes'),
+            ttl=ttl,
+            sizeof=_pickled_size,
+            window_ratio=arguments.get('window_ratio', .01),
+            sketch_width=arguments.get('sketch_width'))
+    raise ValueError('Unknown policy: %r' % policy)
+
+
+def _store_stats(store):
+    stats = {
+        'entries': len(store),
+        'bytes': store.total_bytes,
+    }
+    if isinstance(store, _TinyLFUStore):
+        stats.update(admitted=store.admitted, rejected=store.rejected,
+                     admission_rate=store.admission_rate())
+    return stats
+
+
+class LocalCacheProxy(proxy.ProxyBackend):
+    """Process-local LRU/TTL tier in front of a (remote) backend.
+
+    Reads are served from an in-process dictionary when possible; misses
+    fall through to the proxied backend and populate the local tier.
+    Writes and deletes go to both tiers.
+
+    Example configuration::
+
+        configure_cache_region(region, {
+            'backend': 'dogpile_cachetool.redis_rc',
+            'expiration_time': 300,
+            'arguments': {...},
+            'proxies': [{
+                'class': 'dogpile_cachetool.backends.local.LocalCacheProxy',
+                'arguments': {
+                    'max_bytes': 64 * 1024 * 1024,
+                    'ttl': 5,
+                },
+            }],
+        })
+
+    Arguments accepted in the arguments dictionary:
+
+    :param max_entries: integer, maximum number of entries kept locally.
+     Default is ``10000``.
+
+    :param max_bytes: integer, maximum total size (as measured by pickling
+     the value) of the entries kept locally.  Default is no limit.
+
+    :param ttl: number of seconds an entry may be served locally before
+     going back to the proxied backend.  This is capped by
+     ``expiration_time``; one of them is required.
+
+    :param policy: ``'lru'`` (default) or ``'tinylfu'``.  With
+     ``'tinylfu'`` (W-TinyLFU), a new entry only replaces an older one if
+     its key is requested more often, so that one-off keys (e.g. of a
+     batch scan) do not flush the hot ones; the capacity is then
+     ``max_bytes`` when given, else ``max_entries``.  :meth:`stats`
+     also reports how many entries were ``admitted`` to the cache past
+     the admission window and how many were ``rejected``.
+
+    :param window_ratio: with ``'tinylfu'``, fraction of the capacity
+     where new entries are admitted unconditionally.  Default is
+     ``0.01``.
+
+    :param sketch_width: with ``'tinylfu'``, width of the frequency
+     sketch.  Default is four times ``max_entries``.
+
+    :param expiration_time: the expiration time of the region, filled in
+     by :func:`.configure_cache_region`.
+
+    Because the local tier is per process, values changed by other
+    processes (including region invalidation) become visible here only
+    after ``ttl`` seconds.
+    """
+
+    def __init__(self, arguments=None):
+        super(LocalCacheProxy, self).__init__()
+        arguments = arguments or {}
+
+        ttl = arguments.get('ttl')
+        expiration_time = arguments.get('expiration_time')
+        if expiration_time is not None and expiration_time > 0:
+            ttl = expiration_time if ttl is None else min(ttl,
+                                                          expiration_time)
+        if ttl is None:
+            # values would never be refreshed from the proxied backend
+            raise ValueError(
+                'LocalCacheProxy requires a ttl or an expiration_time')
+
+        self.store = _create_store(arguments, ttl)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def stats(self):
+        """Return a snapshot of the hit/miss counters."""
+        stats = _store_stats(self.store)
+        with self._stats_lock:
+            stats.update(hits=self.hits, misses=self.misses)
+        return stats
+
+    def _count(self, hits, misses):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get(self, key):
+        value = self.store.get(key)
+        if value is not NO_VALUE:
+            self._count(1, 0)
+            return value
+
+        self._count(0, 1)
+        value = self.proxied.get(key)
+        if value is not NO_VALUE:
+            self.store.set(key, value)
+        return value
+
+    def get_multi(self, keys):
+        keys = list(keys)
+        store = self.store
+        now = time.time()
+        values = [store.get(key, now) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is NO_VALUE]
+        self._count(len(values) - len(missing), len(missing))
+        if not missing:
+            return values
+
+        fetched = self.proxied.get_multi([keys[i] for i in missing])
+        for i, value in zip(missing, fetched):
+            values[i] = value
+            if value is not NO_VALUE:
+                store.set(keys[i], value, now)
+        return values
+
+    def set(self, key, value):
+        self.proxied.set(key, value)
+        self.store.set(key, value)
+
+    def set_multi(self, mapping):
+        self.proxied.set_multi(mapping)
+        now = time.time()
+        for key, value in mapping.items():
+            self.store.set(key, value, now)
+
+    def delete(self, key):
+        self.store.delete(key)
+        self.proxied.delete(key)
+
+    def delete_multi(self, keys):
+        keys = list(keys)
+        for key in keys:
+            self.store.delete(key)
+        self.proxied.delete_multi(keys)
+
+
+class LocalBackend(api.CacheBackend):
+    """Process-local LRU/TTL backend, bounded in entries and size.
+
+    Mostly useful as the first tier of a :class:`.TieredBackend`;
+    :class:`.LocalCacheProxy` is simpler in front of a single backend.
+
+    Arguments accepted in the arguments dictionary:
+
+    :param max_entries: see :class:`.LocalCacheProxy`.
+
+    :param max_bytes: see :class:`.LocalCacheProxy`.
+
+    :param ttl: number of seconds an entry is kept.  Default is no limit.
+
+    :param policy: see :class:`.LocalCacheProxy`.
+
+    :param window_ratio: see :class:`.LocalCacheProxy`.
+
+    :param sketch_width: see :class:`.LocalCacheProxy`.
+    """
+
+    def __init__(self, arguments):
+        self.store = _create_store(arguments, arguments.get('ttl'))
+
+    def stats(self):
+        """Return the size of the cache, and admission counters."""
+        return _store_stats(self.store)
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def get_multi(self, keys):
+        now = time.time()
+        return [self.store.get(key, now) for key in keys]
+
+    def set(self, key, value):
+        self.store.set(key, value)
+
+    def set_multi(self, mapping):
+        now = time.time()
+        for key, value in mapping.items():
+            self.store.set(key, value, now)
+
+    def delete(self, key):
+        self.store.delete(key)
+
+    def delete_multi(self, keys):
+        for key in keys:
+            self.store.delete(key)
@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+
+from dogpile.cache import api
+from dogpile.cache import proxy
+import six
+
+from dogpile_cachetool import metrics
+from dogpile_cachetool.utils import get_actual_backend
+
+
+_LOG = logging.getLogger(__name__)
+
+NO_VALUE = api.NO_VALUE
+
+# keys holding the invalidation state of regions are read along with the
+# values, they are kept out of the hit/miss counts.
+_INTERNAL_MARKER = '_RegionExpiration.'
+_INTERNAL_MARKER_BYTES = _INTERNAL_MARKER.encode('ascii')
+
+_bytes_seen = threading.local()
+
+
+def _count_bytes(nbytes):
+    _bytes_seen.total = getattr(_bytes_seen, 'total', 0) + nbytes
+
+
+def _is_internal(key):
+    if isinstance(key, six.binary_type):
+        return _INTERNAL_MARKER_BYTES in key
+    return isinstance(key, six.text_type) and _INTERNAL_MARKER in key
+
+
+class MetricsProxy(proxy.ProxyBackend):
+    """Measure the cache operations of a region.
+
+    Every ``get``, ``get_multi``, ``set``, ``set_multi``, ``delete`` and
+    ``delete_multi`` reaching the proxy is timed and reported to a sink
+    along with the number of keys, hits and misses, and the size of the
+    serialized values.  Creator calls made by
+    :class:`.SharedExpirationCacheRegion` are reported as ``create``.
+
+    Example configuration::
+
+        configure_cache_region(region, {
+            'backend': 'dogpile_cachetool.redis_rc',
+            'expiration_time': 300,
+            'arguments': {...},
+            'proxies': [{
+                'class': 'dogpile_cachetool.backends.metrics.MetricsProxy',
+                'arguments': {
+                    'sink': 'statsd',
+                    'sink_arguments': {'host': 'statsd.local'},
+                },
+            }],
+        })
+
+    Arguments accepted in the arguments dictionary:
+
+    :param sink: a :mod:`dogpile_cachetool.metrics` sink instance, one of
+     ``'memory'``, ``'statsd'`` and ``'prometheus'``, or the dotted path
+     of a sink class.  Default is a new :class:`.InMemorySink`.  Share an
+     instance among regions to aggregate them in one place.
+
+    :param sink_arguments: dict, keyword arguments of the sink class.
+
+    :param slow_threshold: number of seconds above which an operation is
+     logged as a warning, with its keys.  Default is never.
+
+    :param region_name: name the measurements are reported under, filled
+     in by :func:`.configure_cache_region`.
+
+    Sizes are only known for backends serializing values with a
+    :class:`.ValueCodec` (the Redis backends); they are reported as
+    ``0`` otherwise.  The proxy only sees what reaches it, so place it
+    after (outside of) a :class:`.LocalCacheProxy` to count local hits.
+    """
+
+    def __init__(self, arguments=None):
+        super(MetricsProxy, self).__init__()
+        arguments = arguments or {}
+        self.sink = metrics.get_sink(arguments.get('sink'),
+                                     arguments.get('sink_arguments'))
+        self.region_name = arguments.get('region_name') or 'default'
+        self.slow_threshold = arguments.get('slow_threshold')
+
+    def wrap(self, backend):
+        super(MetricsProxy, self).wrap(backend)
+        codec = getattr(get_actual_backend(backend), 'codec', None)
+        if codec is not None:
+            codec.size_hook = _count_bytes
+        return self
+
+    def _record(self, operation, start, keys, count=1, hits=0, misses=0):
+        duration = time.time() - start
+        nbytes = getattr(_bytes_seen, 'total', 0)
+        self.sink.record(self.region_name, operation, duration, count, hits,
+                         misses, nbytes)
+        if self.slow_threshold is not None and \
+                duration >= self.slow_threshold:
+            _LOG.warning('Slow cache %s on region %s took %.3fs: %r',
+                         operation, self.region_name, duration, keys)
+
+    def record_creation(self, duration, count):
+        """Report that a creator produced ``count`` values in
+        ``duration`` seconds.
+        """
+        self.sink.record(self.region_name, 'create', duration, count)
+
+    def get(self, key):
+        _bytes_seen.total = 0
+        start = time.time()
+        value = self.proxied.get(key)
+        if _is_internal(key):
+            self._record('get', start, key)
+        elif value is NO_VALUE:
+            self._record('get', start, key, misses=1)
+        else:
+            self._record('get', start, key, hits=1)
+        return value
+
+    def get_multi(self, keys):
+        _bytes_seen.total = 0
+        start = time.time()
+        values = self.proxied.get_multi(keys)
+        hits = misses = 0
+        for key, value in zip(keys, values):
+            if _is_internal(key):
+                continue
+            if value is NO_VALUE:
+                misses += 1
+            else:
+                hits += 1
+        self._record('get_multi', start, keys, len(values), hits, misses)
+        return values
+
+    def set(self, key, value):
+        _bytes_seen.total = 0
+        start = time.time()
+        self.proxied.set(key, value)
+        self._record('set', start, key)
+
+    def set_multi(self, mapping):
+        _bytes_seen.total = 0
+        start = time.time()
+        self.proxied.set_multi(mapping)
+        self._record('set_multi', start, mapping.keys(), len(mapping))
+
+    def delete(self, key):
+        _bytes_seen.total = 0
+        start = time.time()
+        self.proxied.delete(key)
+        self._record('delete', start, key)
+
+    def delete_multi(self, keys):
+        _bytes_seen.total = 0
+        start = time.time()
+        self.proxied.delete_multi(keys)
+        self._record('delete_multi', start, keys, len(keys))
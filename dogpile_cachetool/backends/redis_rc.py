@@ -1,11 +1,19 @@
-from dogpile.cache import api
-from six import u
-from six.moves import cPickle as pickle
+from multiprocessing.pool import ThreadPool
 
+from dogpile.cache import api
+import six
+
+from dogpile_cachetool import serializers
+from dogpile_cachetool.backends._redis import expiration_for
+from dogpile_cachetool.backends._redis import map_bounded
+from dogpile_cachetool.backends._redis import RedisMutex
+from dogpile_cachetool.backends._redis import RedisSnapshotMixin
+from dogpile_cachetool.backends._redis import was_stored
 from dogpile_cachetool.utils import cached_property
+from dogpile_cachetool.utils import chunked
 
 
-class RedisRCBackend(api.CacheBackend):
+class RedisRCBackend(RedisSnapshotMixin, api.CacheBackend):
     """"A `Redis <http://redis.io/>`_ backend, using the
     `rc <https://pypi.python.org/pypi/rc/>`_ backend.
 
@@ -26,9 +34,55 @@ class RedisRCBackend(api.CacheBackend):
                 'connection_pool_options': {
                     'max_connections': 128,
                 },
-                'distributed_lock': False,
+                'distributed_lock': True,
+                'lock_timeout': 30,
+                'serializer': 'pickle',
             }
         )
+
+    :param distributed_lock: boolean, when True, the dogpile lock of a key
+     is a Redis lock on the host the key belongs to, so only one process
+     of all those sharing the cache creates a given value at a time.
+     When left at False, dogpile coordinates on a regular threading mutex.
+
+    :param lock_timeout: integer, number of seconds after acquiring a lock
+     that Redis should expire it, so that the lock of a crashed process
+     is freed.  Should be larger than the time it takes to create a value.
+     Default is ``30``; ``None`` keeps locks until they are released.
+     Only valid when ``distributed_lock`` is ``True``.
+
+    :param lock_sleep: number of seconds to sleep between attempts to
+     acquire a lock held by someone else.  Default is ``0.1``.  Only valid
+     when ``distributed_lock`` is ``True``.
+
+    :param serializer: how values are serialized, one of ``'pickle'``
+     (default), ``'json'``, ``'msgpack'`` or the dotted path of a
+     :class:`.serializers.Serializer` subclass.  Values written with
+     another serializer remain readable.
+
+    :param compression: compress serialized values with ``'zlib'``,
+     ``'lz4'`` or ``'zstd'``.  Default is no compression.  Compressed
+     values are always readable, see :mod:`.compression`; the effect is
+     reported by ``backend.codec.compression_stats``.
+
+    :param compression_threshold: integer, values smaller than this many
+     bytes are stored uncompressed.  Default is ``1024``.
+
+    :param max_batch_keys: integer, multi key operations are split into
+     batches of at most this many keys, so that huge ones neither stall
+     Redis nor build huge buffers.  Default is ``1000``; ``0`` disables
+     it.
+
+    :param max_batch_bytes: integer, ``set_multi`` batches are also cut
+     when their serialized values exceed this many bytes.  Default is no
+     limit.
+
+    :param batch_concurrency: integer, number of batches of a multi key
+     operation in flight at once.  Default is ``4``.  Each of them is
+     spread over the hosts by rc, up to ``max_concurrency`` connections.
+     Values read are decoded batch by batch as they arrive, in the
+     calling thread.  An operation of a single batch does not use the
+     thread pool.
     """
 
     # noinspection PyMissingConstructor
@@ -37,11 +91,7 @@ class RedisRCBackend(api.CacheBackend):
 
         self.hosts = arguments['hosts']
         self.distributed_lock = arguments.get('distributed_lock', False)
-        if self.distributed_lock:
-            raise NotImplementedError(
-                "distributed_lock is not currently supported yet")
-
-        self.lock_timeout = arguments.get('lock_timeout', None)
+        self.lock_timeout = arguments.get('lock_timeout', 30)
         self.lock_sleep = arguments.get('lock_sleep', 0.1)
 
         self.redis_expiration_time = arguments.pop('redis_expiration_time', 0)
@@ -49,29 +99,19 @@ class RedisRCBackend(api.CacheBackend):
         self.poller_timeout = arguments.pop('poller_timeout', 1.0)
         self.connection_pool_options = arguments.pop(
             'connection_pool_options', None)
+        self.max_batch_keys = arguments.pop('max_batch_keys', 1000)
+        self.max_batch_bytes = arguments.pop('max_batch_bytes', None)
+        self.batch_concurrency = arguments.pop('batch_concurrency', 4)
+        self.codec = serializers.ValueCodec(
+            arguments.pop('serializer', None),
+            compressor=arguments.pop('compression', None),
+            compress_threshold=arguments.pop('compression_threshold', 1024))
 
     @cached_property
     def client(self):
         import rc
-        import rc.redis_clients as rc_clients
-        import rc.redis_cluster as rc_cluster
-
-        class _ClusterClient(rc_clients.RedisClusterClient):
-            def mset(self, mapping):
-                commands = []
-                for name, value in mapping.items():
-                    commands.append(('SET', name, value))
-                results = self._execute_multi_command_with_poller('SET',
-                                                                  commands)
-                return all(results.values())
-
-        class _Cluster(rc_cluster.RedisCluster):
-            def get_client(self, max_concurrency=64, poller_timeout=1.0):
-                return _ClusterClient(
-                    rc_cluster.RedisClusterPool(self), max_concurrency,
-                    poller_timeout)
-
-        cluster = _Cluster(
+
+        cluster = rc.RedisCluster(
             self.hosts,
             router_cls=rc.RedisConsistentHashRouter,
             router_options=None,  # Not used (deliberately)
@@ -81,47 +121,133 @@ class RedisRCBackend(api.CacheBackend):
         return cluster.get_client(max_concurrency=self.max_concurrency,
                                   poller_timeout=self.poller_timeout)
 
+    @cached_property
+    def _pool(self):
+        return ThreadPool(self.batch_concurrency)
+
+    def _map_batches(self, fn, batches):
+        return map_bounded(fn, batches, lambda: self._pool,
+                           self.batch_concurrency)
+
+    def _host_client(self, host_name):
+        import redis
+
+        cluster = self.client.connection_pool.cluster
+        return redis.StrictRedis(
+            connection_pool=cluster.get_pool_of_host(host_name))
+
+    def _scan_clients(self):
+        cluster = self.client.connection_pool.cluster
+        return [self._host_client(host_name)
+                for host_name in sorted(cluster.hosts)]
+
+    def restore_serialized(self, records):
+        commands = []
+        for key, data, ttl_ms in records:
+            if ttl_ms:
+                commands.append(('SET', key, data, 'PX', ttl_ms))
+            else:
+                commands.append(('SET', key, data))
+        if commands:
+            self.client._execute_multi_command_with_poller('SET', commands)
+
     def get_mutex(self, key):
-        if self.distributed_lock:
-            return self.client.lock(u('_lock{0}').format(key),
-                                    self.lock_timeout, self.lock_sleep)
-        else:
+        if not self.distributed_lock:
             return None
 
+        if isinstance(key, six.text_type):
+            key = key.encode('utf-8')
+        # the lock lives on the host of the key it protects
+        router = self.client.connection_pool.cluster.router
+        host_name = router.get_host_for_key(key)
+        return RedisMutex(self._host_client(host_name).lock(
+            b'_lock' + key, timeout=self.lock_timeout, sleep=self.lock_sleep,
+            thread_local=False))
+
     def get(self, key):
         value = self.client.get(key)
         if value is None:
             return api.NO_VALUE
-        return pickle.loads(value)
+        return self.codec.loads(value)
 
     def get_multi(self, keys):
         if not keys:
             return []
-        values = self.client.mget(keys)
-        return [
-            pickle.loads(v) if v is not None else api.NO_VALUE
-            for v in values]
+        # decoded in the calling thread, where MetricsProxy counts bytes
+        loads = self.codec.loads
+        values = []
+        for batch in self._map_batches(self.client.mget,
+                                       chunked(keys, self.max_batch_keys)):
+            values.extend(loads(v) if v is not None else api.NO_VALUE
+                          for v in batch)
+        return values
+
+    def iter_multi(self, keys, chunk_size=None):
+        """Yield ``(key, value)`` for each of ``keys`` (any iterable), as
+        the batches of ``chunk_size`` keys (``max_batch_keys`` by
+        default) arrive; values are decoded as they are yielded.
+        """
+        def fetch(batch):
+            return batch, self.client.mget(batch)
+
+        loads = self.codec.loads
+        batches = chunked(keys, chunk_size or self.max_batch_keys or 1000)
+        for batch, values in self._map_batches(fetch, batches):
+            for key, value in zip(batch, values):
+                yield key, loads(value) if value is not None else api.NO_VALUE
 
     def set(self, key, value):
         if self.redis_expiration_time:
             self.client.setex(key, self.redis_expiration_time,
-                              pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+                              self.codec.dumps(value))
         else:
-            self.client.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            self.client.set(key, self.codec.dumps(value))
 
     def set_multi(self, mapping):
-        mapping = dict(
-            (k, pickle.dumps(v, pickle.HIGHEST_PROTOCOL))
-            for k, v in mapping.items()
-        )
-
-        if not self.redis_expiration_time:
-            self.client.mset(mapping)
-        else:
-            self.client.msetex(mapping, self.redis_expiration_time)
+        self.bulk_set(mapping)
+
+    def bulk_set(self, mapping, ttl=None, nx=False):
+        """Store the values of ``mapping``, sending one pipelined batch of
+        ``SET`` commands to every host involved, in parallel.
+
+        :param ttl: number of seconds the values should live for, or a
+         dict of them per key.  Defaults to ``redis_expiration_time``.
+        :param nx: only store values whose key does not exist yet.
+        :return: dict telling for every key whether its value was stored.
+        """
+        if not mapping:
+            return {}
+        dumps = self.codec.dumps
+
+        def commands():
+            # serialized lazily, batch by batch
+            for key, value in mapping.items():
+                command = ('SET', key, dumps(value))
+                seconds = expiration_for(key, ttl, self.redis_expiration_time)
+                if seconds:
+                    command += ('EX', seconds)
+                if nx:
+                    command += ('NX',)
+                yield command
+
+        def execute(batch):
+            results = self.client._execute_multi_command_with_poller(
+                'SET', batch)
+            return [(command[1], was_stored(results.get(command[1])))
+                    for command in batch]
+
+        batches = chunked(commands(), self.max_batch_keys,
+                          self.max_batch_bytes,
+                          sizeof=lambda command: len(command[2]))
+        stored = {}
+        for batch in self._map_batches(execute, batches):
+            stored.update(batch)
+        return stored
 
     def delete(self, key):
         self.client.delete(key)
 
     def delete_multi(self, keys):
-        self.client.mdelete(*keys)
+        for _ in self._map_batches(lambda batch: self.client.mdelete(*batch),
+                                   chunked(keys, self.max_batch_keys)):
+            pass
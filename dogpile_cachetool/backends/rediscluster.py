@@ -1,11 +1,40 @@
 from __future__ import absolute_import
 
+from multiprocessing.pool import ThreadPool
+
+from dogpile.cache.api import NO_VALUE
 from dogpile.cache.backends.redis import RedisBackend
 
+from dogpile_cachetool import serializers
+from dogpile_cachetool.backends._redis import expiration_for
+from dogpile_cachetool.backends._redis import key_slot
+from dogpile_cachetool.backends._redis import RedisSnapshotMixin
+from dogpile_cachetool.backends._redis import was_stored
 from dogpile_cachetool.utils import cached_property
+from dogpile_cachetool.utils import chunked
+
+
+class _NodeConnectionPool(object):
+    """``redis-py`` connection pool handing out the connections the
+    cluster client keeps for one node, so that clients talking to the
+    node directly share them and their settings (password, SSL, ...).
+    """
+
+    def __init__(self, cluster_pool, node):
+        self.cluster_pool = cluster_pool
+        self.node = node
 
+    def get_connection(self, command_name, *keys, **options):
+        return self.cluster_pool.get_connection_by_node(self.node)
 
-class RedisClusterBackend(RedisBackend):
+    def release(self, connection):
+        self.cluster_pool.release(connection)
+
+    def __getattr__(self, name):
+        return getattr(self.cluster_pool, name)
+
+
+class RedisClusterBackend(RedisSnapshotMixin, RedisBackend):
     """A `RedisCluster <http://redis.io/>`_ backend, using the
     `redis-py-cluster <http://pypi.python.org/pypi/redis-py-cluster/>`_
     backend.
@@ -74,6 +103,27 @@ class RedisClusterBackend(RedisBackend):
         cluster-require-full-coverage config, useful for clusters without
         the CONFIG command (like aws)
 
+    :param serializer: how values are serialized, one of ``'pickle'``
+     (default), ``'json'``, ``'msgpack'`` or the dotted path of a
+     :class:`.serializers.Serializer` subclass.  Values written with
+     another serializer remain readable.
+
+    :param compression: compress serialized values with ``'zlib'``,
+     ``'lz4'`` or ``'zstd'``.  Default is no compression.  Compressed
+     values are always readable, see :mod:`.compression`; the effect is
+     reported by ``backend.codec.compression_stats``.
+
+    :param compression_threshold: integer, values smaller than this many
+     bytes are stored uncompressed.  Default is ``1024``.
+
+    :param parallel_nodes: integer, number of cluster nodes talked to at
+     once by multi key operations.  Default is ``4``; ``1`` talks to them
+     one after the other.
+
+    Multi key operations group the keys by hash slot and by node, and
+    send a single pipeline (one ``MGET``, ``MSET`` or ``DEL`` per slot)
+    to every node involved.  Use hash tags (see
+    :class:`.mangling.KeyMangler`) to keep related keys in few slots.
     """
 
     # noinspection PyMissingConstructor
@@ -95,6 +145,12 @@ class RedisClusterBackend(RedisBackend):
         self.skip_full_coverage_check = arguments.pop(
             'skip_full_coverage_check', False)
         self.connection_pool = arguments.get('connection_pool', None)
+        self.parallel_nodes = arguments.pop('parallel_nodes', 4)
+        self._node_clients = {}
+        self.codec = serializers.ValueCodec(
+            arguments.pop('serializer', None),
+            compressor=arguments.pop('compression', None),
+            compress_threshold=arguments.pop('compression_threshold', 1024))
         self.client = self._client
 
     @cached_property
@@ -123,3 +179,201 @@ class RedisClusterBackend(RedisBackend):
                 port=self.port,
             )
         return rediscluster.RedisCluster(**args)
+
+    def get(self, key):
+        value = self.client.get(key)
+        if value is None:
+            return NO_VALUE
+        return self.codec.loads(value)
+
+    def _node_client(self, node):
+        client = self._node_clients.get(node['name'])
+        if client is None:
+            import redis
+
+            client = redis.StrictRedis(connection_pool=_NodeConnectionPool(
+                self.client.connection_pool, node))
+            client = self._node_clients.setdefault(node['name'], client)
+        return client
+
+    @cached_property
+    def _redirect_errors(self):
+        """Errors after which the keys of a node are asked again through
+        the cluster client.
+        """
+        from redis.exceptions import ConnectionError
+        # MovedError is a subclass
+        from rediscluster.exceptions import AskError
+        return AskError, ConnectionError
+
+    @cached_property
+    def _pool(self):
+        return ThreadPool(self.parallel_nodes)
+
+    def _group_by_node(self, keys):
+        """Return ``[(node, [[index, ...], ...])]``, the indexes of
+        ``keys`` grouped by slot, for every node holding some of them.
+        """
+        slots = self.client.connection_pool.nodes.slots
+        nodes = {}
+        for i, key in enumerate(keys):
+            slot = key_slot(key)
+            node = slots[slot][0]
+            entry = nodes.get(node['name'])
+            if entry is None:
+                entry = nodes[node['name']] = (node, {})
+            entry[1].setdefault(slot, []).append(i)
+        return [(node, list(groups.values()))
+                for node, groups in nodes.values()]
+
+    def _on_nodes(self, fn, keys):
+        """Call ``fn(node, groups)`` for the nodes holding ``keys``, in
+        parallel.
+
+        ``fn`` talks to the node directly.  Should the node redirect it
+        (slots moving while resharding) or the connection fail, it is
+        called again with ``node`` set to ``None``, and then must go
+        through the cluster client, which follows redirections.  Other
+        errors are raised.
+        """
+        def call(batch):
+            node, groups = batch
+            try:
+                fn(node, groups)
+            except self._redirect_errors:
+                fn(None, groups)
+
+        batches = self._group_by_node(keys)
+        if len(batches) == 1 or self.parallel_nodes <= 1:
+            for batch in batches:
+                call(batch)
+        else:
+            self._pool.map(call, batches)
+
+    def _mget(self, keys):
+        """Return the raw values of ``keys``."""
+        values = [None] * len(keys)
+
+        def fetch(node, groups):
+            if node is None:
+                results = [self.client.mget([keys[i] for i in group])
+                           for group in groups]
+            else:
+                pipe = self._node_client(node).pipeline(transaction=False)
+                for group in groups:
+                    pipe.mget([keys[i] for i in group])
+                results = pipe.execute()
+            for group, result in zip(groups, results):
+                for i, value in zip(group, result):
+                    values[i] = value
+
+        self._on_nodes(fetch, keys)
+        return values
+
+    def get_multi(self, keys):
+        if not keys:
+            return []
+        loads = self.codec.loads
+        return [
+            loads(v) if v is not None else NO_VALUE
+            for v in self._mget(keys)]
+
+    def iter_multi(self, keys, chunk_size=1000):
+        """Yield ``(key, value)`` for each of ``keys`` (any iterable),
+        fetching ``chunk_size`` keys at a time; values are decoded as
+        they are yielded.
+        """
+        loads = self.codec.loads
+        for batch in chunked(keys, chunk_size):
+            for key, value in zip(batch, self._mget(batch)):
+                yield key, loads(value) if value is not None else NO_VALUE
+
+    def set(self, key, value):
+        self.client.set(key, self.codec.dumps(value),
+                        ex=self.redis_expiration_time or None)
+
+    def set_multi(self, mapping):
+        self.bulk_set(mapping)
+
+    def bulk_set(self, mapping, ttl=None, nx=False):
+        """Store the values of ``mapping``, sending one pipeline to every
+        node involved.
+
+        :param ttl: number of seconds the values should live for, or a
+         dict of them per key.  Defaults to ``redis_expiration_time``.
+        :param nx: only store values whose key does not exist yet.
+        :return: dict telling for every key whether its value was stored.
+        """
+        if not mapping:
+            return {}
+        dumps = self.codec.dumps
+        keys = list(mapping)
+        values = [dumps(mapping[key]) for key in keys]
+        ttls = [expiration_for(key, ttl, self.redis_expiration_time)
+                for key in keys]
+        use_mset = not nx and not any(ttls)
+        stored = [False] * len(keys)
+        answered = [False] * len(keys)
+
+        def store(node, groups):
+            if node is None:
+                # only the keys the node did not answer for, with nx the
+                # others would now be reported as not stored
+                groups = [[i for i in group if not answered[i]]
+                          for group in groups]
+                pipe = self.client.pipeline(transaction=False)
+            else:
+                pipe = self._node_client(node).pipeline(transaction=False)
+            # the key indexes each reply is about
+            replies = []
+            for group in groups:
+                if use_mset and node is not None:
+                    pipe.mset(dict((keys[i], values[i]) for i in group))
+                    replies.append(group)
+                    continue
+                for i in group:
+                    pipe.set(keys[i], values[i], ex=ttls[i] or None, nx=nx)
+                    replies.append((i,))
+            results = pipe.execute(raise_on_error=False)
+            error = None
+            for indexes, result in zip(replies, results):
+                if node is not None and isinstance(result, Exception):
+                    # raised once the other replies are recorded
+                    error = error or result
+                    continue
+                for i in indexes:
+                    stored[i] = was_stored(result)
+                    answered[i] = True
+            if error is not None:
+                raise error
+
+        self._on_nodes(store, keys)
+        return dict(zip(keys, stored))
+
+    def delete_multi(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+
+        def delete(node, groups):
+            if node is None:
+                pipe = self.client.pipeline(transaction=False)
+                for i in (i for group in groups for i in group):
+                    pipe.delete(keys[i])
+            else:
+                pipe = self._node_client(node).pipeline(transaction=False)
+                for group in groups:
+                    pipe.delete(*[keys[i] for i in group])
+            pipe.execute()
+
+        self._on_nodes(delete, keys)
+
+    def _scan_clients(self):
+        # scan_iter of the cluster client already walks every master
+        return [self.client]
+
+    def restore_serialized(self, records):
+        pipe = self.client.pipeline(transaction=False)
+        for key, data, ttl_ms in records:
+            pipe.set(key, data, px=ttl_ms or None)
+        pipe.execute()
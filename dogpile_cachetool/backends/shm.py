@@ -0,0 +1,351 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from dogpile.cache import api
+
+from dogpile_cachetool import serializers
+
+
+NO_VALUE = api.NO_VALUE
+
+_MAGIC = b'DPSHM001'
+# magic, slots, slot_size, stripes
+_HEADER = struct.Struct('<8sQQQ')
+_HEADER_SIZE = 64
+# seq, state, referenced, key length, value length, key hash
+_SLOT = struct.Struct('<QBBHII')
+_SEQ = struct.Struct('<Q')
+
+_EMPTY, _USED, _DELETED = 0, 1, 2
+
+# a reader gives up (reports a miss) after seeing a slot being written
+# that many times in a row
+_READ_RETRIES = 100
+
+
+def _key_hash(key):
+    return zlib.crc32(key) & 0xffffffff
+
+
+class _SharedFile(object):
+    """The descriptor and thread locks of a cache file, shared by the
+    backends of the process using it.
+
+    ``fcntl`` locks belong to the process: they do not exclude the
+    threads of the process from each other, which the stripe locks do
+    for all the backends of a file, and closing any descriptor of the
+    file releases them all, so a single descriptor is kept open until
+    the last backend is closed.
+    """
+
+    _files = {}
+    _files_lock = threading.Lock()
+
+    def __init__(self, path, stripes):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.header_lock = threading.Lock()
+        self.locks = [threading.Lock() for _ in range(stripes)]
+        self.users = 0
+
+    @classmethod
+    def acquire(cls, path, stripes):
+        path = os.path.realpath(path)
+        with cls._files_lock:
+            shared = cls._files.get(path)
+            if shared is None:
+                shared = cls._files[path] = cls(path, stripes)
+            shared.users += 1
+            return shared
+
+    def release(self):
+        with self._files_lock:
+            self.users -= 1
+            if not self.users:
+                del self._files[self.path]
+                os.close(self.fd)
+
+
+class SharedMemoryBackend(api.CacheBackend):
+    """A cache shared by the processes of a host, kept in a memory mapped
+    file (put it on a ``tmpfs`` such as ``/dev/shm``).
+
+    Example configuration::
+
+        configure_cache_region(region, {
+            'backend': 'dogpile_cachetool.shm',
+            'expiration_time': 300,
+            'arguments': {
+                'path': '/dev/shm/myapp-cache',
+                'slots': 65536,
+                'slot_size': 2048,
+            },
+        })
+
+    The file holds a fixed number of fixed size slots, each storing a
+    single serialized entry, indexed by open addressing.  The slots are
+    split into ``stripes``; a key only ever lives in the stripe its hash
+    designates, within ``max_probe`` slots of its home slot.  Writers
+    take the lock of the stripe (a thread lock plus an ``fcntl`` lock on
+    the file, both shared by the backends of a process using the same
+    file), readers take no lock: every slot carries a sequence number
+    that writers make odd while they change the slot, and readers retry
+    when they see it odd or changed (a seqlock).  When no slot is free
+    within reach, one is evicted with the clock algorithm: reads mark
+    entries as referenced, and the first unreferenced one is replaced,
+    clearing the marks of those passed over.
+
+    Arguments accepted in the arguments dictionary:
+
+    :param path: path of the file, created if it does not exist.
+     Required.  Processes opening the same file share the cache.
+
+    :param slots: integer, number of entries the cache can hold.
+     Default is ``16384``.  Rounded up to a multiple of ``stripes``.
+
+    :param slot_size: integer, bytes per slot, including a 20 bytes
+     header and the key.  Default is ``1024``.  Larger entries are not
+     cached.
+
+    :param stripes: integer, number of independently locked groups of
+     slots.  Default is ``256``.
+
+    :param max_probe: integer, number of slots looked at for a key.
+     Default is ``16``.
+
+    :param serializer: see :class:`.RedisRCBackend`.
+
+    :param compression: see :class:`.RedisRCBackend`.
+
+    :param compression_threshold: see :class:`.RedisRCBackend`.
+
+    An existing file must have been created with the same ``slots``,
+    ``slot_size`` and ``stripes``.  Only Unix is supported.
+    """
+
+    def __init__(self, arguments):
+        import fcntl
+
+        self._fcntl = fcntl
+        self.path = arguments.get('path')
+        if not self.path:
+            raise ValueError('SharedMemoryBackend requires a path')
+        self.stripes = arguments.get('stripes', 256)
+        slots = arguments.get('slots', 16384)
+        self.slots_per_stripe = max(-(-slots // self.stripes), 1)
+        self.slots = self.slots_per_stripe * self.stripes
+        self.slot_size = arguments.get('slot_size', 1024)
+        if self.slot_size <= _SLOT.size:
+            raise ValueError('slot_size must be larger than %d' % _SLOT.size)
+        self.max_probe = min(arguments.get('max_probe', 16),
+                             self.slots_per_stripe)
+        self.codec = serializers.ValueCodec(
+            arguments.get('serializer'),
+            compressor=arguments.get('compression'),
+            compress_threshold=arguments.get('compression_threshold', 1024))
+        # entries that did not fit in a slot
+        self.oversized = 0
+
+        self._shared = _SharedFile.acquire(self.path, self.stripes)
+        self._fd = self._shared.fd
+        self._locks = self._shared.locks
+        size = _HEADER_SIZE + self.slots * self.slot_size
+        try:
+            with self._shared.header_lock:
+                self._lock_file(0)
+                try:
+                    self._init_file(size)
+                finally:
+                    self._unlock_file(0)
+            self._map = mmap.mmap(self._fd, size)
+        except BaseException:
+            self._shared.release()
+            raise
+
+    def _lock_file(self, offset):
+        self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX, 1, offset)
+
+    def _unlock_file(self, offset):
+        self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, 1, offset)
+
+    def _init_file(self, size):
+        header = _HEADER.pack(_MAGIC, self.slots, self.slot_size,
+                              self.stripes)
+        # the descriptor, and its offset, may be shared
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        existing = os.read(self._fd, _HEADER.size)
+        if existing == header:
+            return
+        if existing:
+            if existing.startswith(_MAGIC):
+                raise ValueError(
+                    '%s was created with other slots, slot_size or stripes'
+                    % self.path)
+            raise ValueError('%s is not a cache file' % self.path)
+        # new file: zero filled slots are empty
+        os.ftruncate(self._fd, size)
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, header)
+
+    def close(self):
+        shared, self._shared = self._shared, None
+        if shared is not None:
+            self._map.close()
+            shared.release()
+
+    # -- slots
+
+    def _probe(self, key_hash):
+        """Offsets of the slots a key may be in, home slot first."""
+        stripe = key_hash % self.stripes
+        home = (key_hash // self.stripes) % self.slots_per_stripe
+        base = _HEADER_SIZE + stripe * self.slots_per_stripe * self.slot_size
+        return stripe, [
+            base + ((home + i) % self.slots_per_stripe) * self.slot_size
+            for i in range(self.max_probe)]
+
+    def _read(self, key):
+        """Return the serialized value of ``key``, or ``None``."""
+        key_hash = _key_hash(key)
+        mm = self._map
+        unpack_from = _SLOT.unpack_from
+        for offset in self._probe(key_hash)[1]:
+            for _ in range(_READ_RETRIES):
+                seq, state, referenced, key_len, value_len, slot_hash = \
+                    unpack_from(mm, offset)
+                if seq & 1:
+                    continue
+                if state == _EMPTY:
+                    return None
+                if state != _USED or slot_hash != key_hash or \
+                        key_len != len(key):
+                    break
+                start = offset + _SLOT.size
+                data = mm[start:start + key_len + value_len]
+                if _SEQ.unpack_from(mm, offset)[0] != seq:
+                    continue
+                if data[:key_len] != key:
+                    break
+                if not referenced:
+                    # benign race: at worst the mark is lost
+                    mm[offset + 9:offset + 10] = b'\x01'
+                return data[key_len:]
+            else:
+                return None
+        return None
+
+    def _begin_write(self, offset):
+        """Make the sequence number of a slot odd, returning it."""
+        seq = _SEQ.unpack_from(self._map, offset)[0] + 1
+        _SEQ.pack_into(self._map, offset, seq)
+        return seq
+
+    def _end_write(self, offset, seq):
+        """Publish the slot, once all of it is written."""
+        _SEQ.pack_into(self._map, offset, seq + 1)
+
+    def _find_slot(self, offsets, key, key_hash):
+        """Return the offset of the slot holding ``key``, else of a free
+        one, else of the one to evict.  The stripe must be locked.
+        """
+        mm = self._map
+        free = None
+        for offset in offsets:
+            _, state, _, key_len, _, slot_hash = _SLOT.unpack_from(mm, offset)
+            if state == _USED:
+                if slot_hash == key_hash and key_len == len(key):
+                    start = offset + _SLOT.size
+                    if mm[start:start + key_len] == key:
+                        return offset
+                continue
+            if free is None:
+                free = offset
+            if state == _EMPTY:
+                break
+        if free is not None:
+            return free
+
+        # clock: the first entry not referenced since last passed over
+        for offset in offsets:
+            if not mm[offset + 9:offset + 10] == b'\x01':
+                return offset
+            mm[offset + 9:offset + 10] = b'\x00'
+        return offsets[0]
+
+    def _write(self, key, data):
+        key_hash = _key_hash(key)
+        stripe, offsets = self._probe(key_hash)
+        fits = _SLOT.size + len(key) + len(data) <= self.slot_size
+        if not fits:
+            self.oversized += 1
+
+        with self._locks[stripe]:
+            self._lock_file(_HEADER.size + stripe)
+            try:
+                offset = self._find_slot(offsets, key, key_hash)
+                if not fits:
+                    self._remove(offset, key, key_hash)
+                    return
+                seq = self._begin_write(offset)
+                start = offset + _SLOT.size
+                self._map[start:start + len(key) + len(data)] = key + data
+                _SLOT.pack_into(self._map, offset, seq, _USED, 0, len(key),
+                                len(data), key_hash)
+                self._end_write(offset, seq)
+            finally:
+                self._unlock_file(_HEADER.size + stripe)
+
+    def _remove(self, offset, key, key_hash):
+        mm = self._map
+        _, state, _, key_len, _, slot_hash = _SLOT.unpack_from(mm, offset)
+        start = offset + _SLOT.size
+        if state == _USED and slot_hash == key_hash and \
+                mm[start:start + key_len] == key:
+            seq = self._begin_write(offset)
+            _SLOT.pack_into(mm, offset, seq, _DELETED, 0, 0, 0, 0)
+            self._end_write(offset, seq)
+
+    def _delete(self, key):
+        key_hash = _key_hash(key)
+        stripe, offsets = self._probe(key_hash)
+        with self._locks[stripe]:
+            self._lock_file(_HEADER.size + stripe)
+            try:
+                self._remove(self._find_slot(offsets, key, key_hash), key,
+                             key_hash)
+            finally:
+                self._unlock_file(_HEADER.size + stripe)
+
+    @staticmethod
+    def _encode_key(key):
+        if not isinstance(key, bytes):
+            key = key.encode('utf-8')
+        return key
+
+    # -- CacheBackend
+
+    def get(self, key):
+        data = self._read(self._encode_key(key))
+        if data is None:
+            return NO_VALUE
+        return self.codec.loads(data)
+
+    def get_multi(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value):
+        self._write(self._encode_key(key), self.codec.dumps(value))
+
+    def set_multi(self, mapping):
+        for key, value in mapping.items():
+            self.set(key, value)
+
+    def delete(self, key):
+        self._delete(self._encode_key(key))
+
+    def delete_multi(self, keys):
+        for key in keys:
+            self.delete(key)
@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+
+from dogpile.cache import api
+from dogpile.cache.region import _backend_loader
+
+
+_LOG = logging.getLogger(__name__)
+
+NO_VALUE = api.NO_VALUE
+
+WRITE_THROUGH = 'through'
+WRITE_BACK = 'back'
+
+
+class _Tier(object):
+    """A child backend and its write policy.
+
+    Values written back are kept in ``pending`` until the flusher thread
+    stores them, and served from there meanwhile.
+    """
+
+    def __init__(self, spec):
+        self.name = spec['backend']
+        self.backend = _backend_loader.load(self.name)(
+            spec.get('arguments') or {})
+        self.write_policy = spec.get('write_policy', WRITE_THROUGH)
+        if self.write_policy not in (WRITE_THROUGH, WRITE_BACK):
+            raise ValueError('Unknown write policy: %r' % self.write_policy)
+        self.pending = {}
+        # values being written back, and keys deleted meanwhile
+        self.flushing = {}
+        self.deleted = set()
+        self.hits = 0
+
+    def _unwritten(self, key):
+        value = self.pending.get(key, NO_VALUE)
+        if value is NO_VALUE and key not in self.deleted:
+            value = self.flushing.get(key, NO_VALUE)
+        return value
+
+    def get_multi(self, keys):
+        if not self.pending and not self.flushing:
+            return self.backend.get_multi(keys)
+        values = [self._unwritten(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is NO_VALUE]
+        if missing:
+            fetched = self.backend.get_multi([keys[i] for i in missing])
+            for i, value in zip(missing, fetched):
+                values[i] = value
+        return values
+
+
+class TieredBackend(api.CacheBackend):
+    """Chain of backends, from the fastest to the slowest, e.g. process
+    memory, local disk, then Redis.
+
+    Example configuration::
+
+        configure_cache_region(region, {
+            'backend': 'dogpile_cachetool.tiered',
+            'expiration_time': 300,
+            'arguments': {
+                'tiers': [{
+                    'backend': 'dogpile_cachetool.local',
+                    'arguments': {'max_entries': 1000, 'ttl': 10},
+                }, {
+                    'backend': 'dogpile_cachetool.disk',
+                    'arguments': {'path': '/var/cache/myapp', 'ttl': 3600},
+                }, {
+                    'backend': 'dogpile_cachetool.redis_rc',
+                    'arguments': {...},
+                    'write_policy': 'back',
+                }],
+            },
+        })
+
+    Reads try the tiers in order; the keys missed by a tier are asked
+    from the next one in a single ``get_multi``, and values found are
+    copied to the tiers above it.  Deletes go to every tier.  Writes go
+    to every tier according to its ``write_policy``:
+
+    * ``'through'`` (default): the value is stored before ``set``
+      returns.
+    * ``'back'``: the value is stored by a background thread, which
+      batches writes in ``set_multi`` calls every ``flush_interval``
+      seconds.  Values not stored yet are lost if the process exits
+      without calling :meth:`flush`.  Errors are logged and the values
+      are written again at the next flush.
+
+    Each tier keeps its own size and TTL limits, set in its arguments
+    (``dogpile_cachetool.local`` bounds the entries of a memory tier).
+    Locking is delegated to the last tier which provides mutexes, so
+    that a shared backend such as Redis keeps one creator per key
+    across processes.
+
+    Arguments accepted in the arguments dictionary:
+
+    :param tiers: list of dictionaries with the ``backend`` name, its
+     ``arguments`` and ``write_policy``.  Required.
+
+    :param flush_interval: seconds between write-back flushes, default is
+     ``0.1``.
+    """
+
+    def __init__(self, arguments):
+        specs = arguments.get('tiers')
+        if not specs:
+            raise ValueError('TieredBackend requires tiers')
+        self.tiers = [_Tier(spec) for spec in specs]
+        self.flush_interval = arguments.get('flush_interval', .1)
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._flusher = None
+
+    def stats(self):
+        """Return the number of hits per tier and of misses."""
+        with self._stats_lock:
+            return {
+                'hits': [(tier.name, tier.hits) for tier in self.tiers],
+                'misses': self.misses,
+            }
+
+    def _count(self, hits, misses):
+        with self._stats_lock:
+            for tier, count in hits:
+                tier.hits += count
+            self.misses += misses
+
+    # -- reads
+
+    def get(self, key):
+        return self.get_multi([key])[0]
+
+    def get_multi(self, keys):
+        keys = list(keys)
+        values = [NO_VALUE] * len(keys)
+        missing = list(range(len(keys)))
+        hits = []
+        for depth, tier in enumerate(self.tiers):
+            fetched = tier.get_multi([keys[i] for i in missing])
+            found = {}
+            still_missing = []
+            for i, value in zip(missing, fetched):
+                if value is NO_VALUE:
+                    still_missing.append(i)
+                else:
+                    values[i] = found[keys[i]] = value
+            if found:
+                hits.append((tier, len(found)))
+                self._promote(depth, found)
+            missing = still_missing
+            if not missing:
+                break
+        self._count(hits, len(missing))
+        return values
+
+    def _promote(self, depth, mapping):
+        """Copy values found at ``depth`` to the tiers above."""
+        for tier in self.tiers[:depth]:
+            try:
+                tier.backend.set_multi(mapping)
+            except Exception:
+                _LOG.exception('Failed to promote values to %s', tier.name)
+
+    # -- writes
+
+    def set(self, key, value):
+        self.set_multi({key: value})
+
+    def set_multi(self, mapping):
+        write_back = False
+        for tier in self.tiers:
+            if tier.write_policy == WRITE_THROUGH:
+                tier.backend.set_multi(mapping)
+            else:
+                with self._lock:
+                    tier.pending.update(mapping)
+                write_back = True
+        if write_back:
+            self._start_flusher()
+
+    def delete(self, key):
+        self.delete_multi([key])
+
+    def delete_multi(self, keys):
+        keys = list(keys)
+        for tier in self.tiers:
+            if tier.write_policy == WRITE_BACK:
+                with self._lock:
+                    for key in keys:
+                        tier.pending.pop(key, None)
+                        if key in tier.flushing:
+                            tier.deleted.add(key)
+            tier.backend.delete_multi(keys)
+
+    def get_mutex(self, key):
+        for tier in reversed(self.tiers):
+            get_mutex = getattr(tier.backend, 'get_mutex', None)
+            if get_mutex is not None:
+                mutex = get_mutex(key)
+                if mutex is not None:
+                    return mutex
+        return None
+
+    # -- write-back
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop)
+                self._flusher.daemon = True
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+            with self._lock:
+                if not any(tier.pending for tier in self.tiers):
+                    # restarted by the next write
+                    self._flusher = None
+                    return
+
+    def flush(self):
+        """Store the values waiting to be written back."""
+        with self._flush_lock:
+            for tier in self.tiers:
+                self._flush_tier(tier)
+
+    def _flush_tier(self, tier):
+        if not tier.pending:
+            return
+        with self._lock:
+            mapping = tier.flushing = tier.pending
+            tier.pending = {}
+        try:
+            tier.backend.set_multi(mapping)
+        except Exception:
+            _LOG.exception('Failed to write back %d values to %s',
+                           len(mapping), tier.name)
+            failed = mapping
+        else:
+            failed = None
+        with self._lock:
+            if failed:
+                # retried at the next flush, unless set or deleted since
+                for key, value in failed.items():
+                    if key not in tier.pending and key not in tier.deleted:
+                        tier.pending[key] = value
+            deleted = tier.deleted
+            tier.flushing = {}
+            tier.deleted = set()
+        if deleted:
+            # do not bring back what was deleted while being written
+            tier.backend.delete_multi(list(deleted))
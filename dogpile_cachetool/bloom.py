@@ -0,0 +1,192 @@
+"""Approximate sets of the keys a region holds, for negative caching.
+
+A :class:`PresenceFilter` given to a region (``presence_filter``) records
+the keys this process stored or found in the backend, and those the
+backend did not have when last asked.  :meth:`.get_or_create` and the
+decorators skip the first backend lookup of a key which was missing and
+has not been seen stored since: they go straight to taking the creation
+lock, after which the backend is asked again (so that a value created
+meanwhile, by any process, is used instead of being created again).  A
+miss of a key known to be missing thus costs one backend lookup instead
+of two.
+
+Keys the filter knows nothing about, such as those stored by other
+processes, are always looked up.  A false positive only costs taking
+the lock for a key which is stored.  It pays off when many lookups are
+for keys which are never cached, such as unknown identifiers whose
+``None`` is not cached (see ``negative_ttl`` for storing those).
+:meth:`.get_or_create_multi` fetches all keys in a single call anyway;
+it only updates the filter.
+"""
+import hashlib
+import math
+import struct
+import threading
+import time
+
+import six
+
+
+_DIGEST = struct.Struct('<QQ')
+
+
+class CountingBloomFilter(object):
+    """A Bloom filter with 8-bit counters, so that keys can be removed.
+
+    :param capacity: number of keys the filter is sized for.
+
+    :param error_rate: false positive rate once ``capacity`` keys are in
+     the filter.
+
+    Counters stop at 255, and are never decremented from there.
+    Removing a key which was not added may remove other keys.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        size = -capacity * math.log(error_rate) / math.log(2) ** 2
+        self.size = max(int(math.ceil(size)), 1)
+        self.hashes = max(int(round(self.size * math.log(2) / capacity)), 1)
+        self.counters = bytearray(self.size)
+
+    def _indexes(self, key):
+        if isinstance(key, six.text_type):
+            key = key.encode('utf-8')
+        # double hashing (Kirsch and Mitzenmacher)
+        h1, h2 = _DIGEST.unpack(hashlib.md5(key).digest())
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        counters = self.counters
+        for i in self._indexes(key):
+            if not counters[i]:
+                return False
+        return True
+
+    def add(self, key):
+        counters = self.counters
+        for i in self._indexes(key):
+            if counters[i] < 255:
+                counters[i] += 1
+
+    def discard(self, key):
+        indexes = self._indexes(key)
+        counters = self.counters
+        if not all(counters[i] for i in indexes):
+            return
+        for i in indexes:
+            if counters[i] < 255:
+                counters[i] -= 1
+
+
+class PresenceFilter(object):
+    """Keys known to be stored in a region, or to be missing from it, see
+    the module documentation.
+
+    :param capacity: number of keys, see :class:`CountingBloomFilter`.
+
+    :param error_rate: see :class:`CountingBloomFilter`.
+
+    :param rebuild_interval: number of seconds after which the filter is
+     rebuilt, default is never.  Rebuilding forgets the keys not used
+     (stored, found or missed) during the last two intervals, so that
+     expired and evicted keys stop filling the filter up.
+
+    Configured with :func:`.configure_cache_region`::
+
+        configure_cache_region(region, {
+            ...
+            'presence_filter': {'capacity': 1000000,
+                                'rebuild_interval': 3600},
+        })
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.01,
+                 rebuild_interval=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self.current = self._new_filter()
+        self.previous = None
+        # keys the backend did not have
+        self.missing = self._new_filter()
+        self.previously_missing = None
+        self.rebuilt_at = time.time()
+
+    def _new_filter(self):
+        return CountingBloomFilter(self.capacity, self.error_rate)
+
+    def _expired(self):
+        return self.rebuild_interval is not None and \
+            time.time() - self.rebuilt_at >= self.rebuild_interval
+
+    def _check_rebuild(self):
+        if self._expired():
+            with self._lock:
+                # unless another thread just did
+                if self._expired():
+                    self._rotate()
+
+    def _rotate(self):
+        self.previous = self.current
+        self.current = self._new_filter()
+        self.previously_missing = self.missing
+        self.missing = self._new_filter()
+        self.rebuilt_at = time.time()
+
+    def rebuild(self):
+        """Start a new generation: the keys used from now on are added
+        to it, and the keys of the previous generation are forgotten.
+        """
+        with self._lock:
+            self._rotate()
+
+    def clear(self):
+        with self._lock:
+            self.previous = self.previously_missing = None
+            self.current = self._new_filter()
+            self.missing = self._new_filter()
+            self.rebuilt_at = time.time()
+
+    @staticmethod
+    def _in(key, current, previous):
+        if key in current:
+            return True
+        return previous is not None and key in previous
+
+    def __contains__(self, key):
+        self._check_rebuild()
+        return self._in(key, self.current, self.previous)
+
+    def known_missing(self, key):
+        """Whether the backend did not have ``key`` when last asked, and
+        it was not stored since.
+        """
+        self._check_rebuild()
+        return self._in(key, self.missing, self.previously_missing) and \
+            not self._in(key, self.current, self.previous)
+
+    def _add(self, generation, key):
+        if key in generation:
+            return
+        with self._lock:
+            if key not in generation:
+                generation.add(key)
+
+    def add(self, key):
+        """Record that ``key`` is stored (or was found) in the region."""
+        self._check_rebuild()
+        self._add(self.current, key)
+
+    def add_missing(self, key):
+        """Record that the backend did not have ``key``."""
+        self._check_rebuild()
+        self._add(self.missing, key)
+
+    def discard(self, key):
+        """Record that ``key`` was deleted."""
+        with self._lock:
+            self.current.discard(key)
+            if self.previous is not None:
+                self.previous.discard(key)
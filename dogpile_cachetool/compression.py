@@ -0,0 +1,141 @@
+"""Value compression for the Redis backends.
+
+Compressed values are wrapped by :class:`.serializers.ValueCodec` in a
+one byte header (``0x40 | compressor id``) followed by the compressed,
+serialized value, so uncompressed values, including those written before
+compression was enabled, stay readable.
+
+``compression`` accepts ``'zlib'``, ``'lz4'`` (needs the ``lz4``
+package) or ``'zstd'`` (needs the ``zstandard`` package).
+"""
+import zlib
+
+
+class Compressor(object):
+    """Base class for compressors.
+
+    ``id`` must be between 1 and 63 and identifies the compressor in the
+    value header.
+    """
+
+    id = None
+
+    def compress(self, data):
+        raise NotImplementedError()
+
+    def decompress(self, data):
+        raise NotImplementedError()
+
+
+class ZlibCompressor(Compressor):
+    id = 1
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class LZ4Compressor(Compressor):
+    """`lz4 <https://pypi.python.org/pypi/lz4>`_ frame compression."""
+
+    id = 2
+
+    def __init__(self, level=0):
+        import lz4.frame
+        self._lz4 = lz4.frame
+        self.level = level
+
+    def compress(self, data):
+        return self._lz4.compress(data, compression_level=self.level)
+
+    def decompress(self, data):
+        return self._lz4.decompress(data)
+
+
+class ZstdCompressor(Compressor):
+    """`Zstandard <https://pypi.python.org/pypi/zstandard>`_ compression."""
+
+    id = 3
+
+    def __init__(self, level=3):
+        import zstandard
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def decompress(self, data):
+        return self._decompressor.decompress(data)
+
+
+_BUILTIN_COMPRESSORS = {
+    'zlib': ZlibCompressor,
+    'lz4': LZ4Compressor,
+    'zstd': ZstdCompressor,
+}
+
+
+def get_compressor(spec):
+    """Return a :class:`.Compressor` instance from a name or instance.
+
+    Returns ``None`` if ``spec`` is ``None``.
+    """
+    if spec is None or isinstance(spec, Compressor):
+        return spec
+    try:
+        return _BUILTIN_COMPRESSORS[spec]()
+    except KeyError:
+        raise ValueError('Unknown compression: %r' % (spec,))
+
+
+def compressor_for_id(compressor_id):
+    for compressor_cls in _BUILTIN_COMPRESSORS.values():
+        if compressor_cls.id == compressor_id:
+            return compressor_cls()
+    raise ValueError('Unknown compression id: %d' % compressor_id)
+
+
+class CompressionStats(object):
+    """Counters describing how well compression pays off.
+
+    Updates are not synchronized, the numbers are meant for monitoring.
+    ``compress_time`` and ``decompress_time`` are the processor time, in
+    seconds, spent by the process while (de)compressing, so waiting for
+    the GIL or the scheduler is not counted.
+    """
+
+    def __init__(self):
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.compress_time = 0.0
+        self.decompressed = 0
+        self.decompress_time = 0.0
+
+    @property
+    def ratio(self):
+        """Compressed size relative to the original size of the values
+        that were compressed.
+        """
+        if not self.bytes_in:
+            return 1.0
+        return float(self.bytes_out) / self.bytes_in
+
+    def as_dict(self):
+        return {
+            'compressed': self.compressed,
+            'skipped': self.skipped,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'ratio': self.ratio,
+            'compress_time': self.compress_time,
+            'decompressed': self.decompressed,
+            'decompress_time': self.decompress_time,
+        }
@@ -2,25 +2,36 @@
 
 Ideas taken from OpenStack's keystone.common.cache.core.
 """
+import collections
 import functools
-from hashlib import sha1
+import inspect
 import logging
+import math
+import random
 import sys
 import threading
+import time
 import traceback
 
 import dogpile
 import dogpile.cache
 from dogpile.cache import api
-from dogpile.cache import util
+from dogpile.cache import exception
+from dogpile.cache.region import value_version
+from dogpile.util import compat
 import six
 
+from dogpile_cachetool import bloom
+from dogpile_cachetool import mangling
+from dogpile_cachetool import runners
 from dogpile_cachetool.backends.debug import _DebugProxy
+from dogpile_cachetool.utils import chunked
 
 
 NO_VALUE = api.NO_VALUE
 _MAX_KEY_SIZE = 512
 _INVALIDATED_CACHE_KEY = '_cached_invalidated'
+_INVALIDATION_TYPES = ('hard', 'soft')
 _LOG = logging.getLogger(__name__)
 
 
@@ -45,18 +56,27 @@ def register_backend():
         'dogpile_cachetool.rediscluster',
         'dogpile_cachetool.backends.rediscluster',
         'RedisClusterBackend')
+    dogpile.cache.register_backend(
+        'dogpile_cachetool.shm',
+        'dogpile_cachetool.backends.shm',
+        'SharedMemoryBackend')
+    dogpile.cache.register_backend(
+        'dogpile_cachetool.disk',
+        'dogpile_cachetool.backends.disk',
+        'DiskBackend')
+    dogpile.cache.register_backend(
+        'dogpile_cachetool.local',
+        'dogpile_cachetool.backends.local',
+        'LocalBackend')
+    dogpile.cache.register_backend(
+        'dogpile_cachetool.tiered',
+        'dogpile_cachetool.backends.tiered',
+        'TieredBackend')
 
 
 def create_key_mangler(region_name=None):
-    if not region_name:
-        region_name = '_'
-
-    def _real_key_manger(key):
-        if isinstance(key, six.text_type):
-            key = key.encode('utf-8', errors='xmlcharrefreplace')
-
-        return b'%s.%s' % (region_name, key)
-    return _real_key_manger
+    """Return a key mangler prefixing keys with ``region_name``."""
+    return mangling.KeyMangler(prefix=region_name or '_', max_key_size=None)
 
 
 def create_region(*args, **kwargs):
@@ -74,6 +94,25 @@ def create_region(*args, **kwargs):
     return cache_region_cls(*args, **kwargs)
 
 
+def _create_proxy(region, spec):
+    """Build a proxy backend from a ``proxies`` entry.
+
+    An entry is either the dotted path of a proxy class, which is
+    instantiated without arguments, or a dict with a ``class`` path and
+    an optional ``arguments`` dict, in which case the proxy is built with
+    those arguments plus the region's ``expiration_time`` and ``name``
+    (as ``region_name``).
+    """
+    if isinstance(spec, six.string_types):
+        return import_class(spec)
+
+    proxy_class = import_class(spec['class'])
+    arguments = dict(spec.get('arguments') or {})
+    arguments.setdefault('expiration_time', region.expiration_time)
+    arguments.setdefault('region_name', region.name)
+    return proxy_class(arguments)
+
+
 def configure_cache_region(region, conf):
     """Configure a cache region."""
     if not isinstance(region, dogpile.cache.CacheRegion):
@@ -84,32 +123,50 @@ def configure_cache_region(region, conf):
                          expiration_time=conf.get('expiration_time'),
                          arguments=conf.get('arguments'))
 
-        if conf.get('debug'):
-            region.wrap(_DebugProxy)
+        if conf.get('invalidation_staleness') is not None:
+            region.invalidation_staleness = conf['invalidation_staleness']
 
-        if region.key_mangler is None:
-            region.key_mangler = _mangle_key
+        if conf.get('early_recompute_beta') is not None:
+            region.early_recompute_beta = conf['early_recompute_beta']
 
-        for class_path in conf.get('proxies') or []:
-            proxy_class = import_class(class_path)
-            _LOG.debug("Adding proxy backend to cache region: %s.", class_path)
-            region.wrap(proxy_class)
+        if conf.get('negative_ttl') is not None:
+            region.negative_ttl = conf['negative_ttl']
 
-    return region
+        presence_filter = conf.get('presence_filter')
+        if isinstance(presence_filter, dict):
+            presence_filter = bloom.PresenceFilter(**presence_filter)
+        if presence_filter is not None:
+            region.presence_filter = presence_filter
 
+        runner = conf.get('async_creation_runner')
+        if isinstance(runner, dict):
+            runner = runners.ThreadPoolCreationRunner(**runner)
+        if runner is not None:
+            region.async_creation_runner = runner
 
-def _mangle_key(key):
-    try:
-        key = key.encode('utf-8', errors='xmlcharrefreplace')
-    except (UnicodeError, AttributeError):
-        pass
+        debug = conf.get('debug')
+        if debug:
+            region.wrap(_DebugProxy(debug if isinstance(debug, dict)
+                                    else None))
+
+        key_mangler = conf.get('key_mangler')
+        if isinstance(key_mangler, dict):
+            key_mangler = mangling.KeyMangler(**key_mangler)
+        if key_mangler is not None:
+            region.key_mangler = key_mangler
+        elif region.key_mangler is None:
+            region.key_mangler = _mangle_key
+
+        for spec in conf.get('proxies') or []:
+            _LOG.debug("Adding proxy backend to cache region: %s.", spec)
+            region.wrap(_create_proxy(region, spec))
+
+    return region
 
-    if len(key) > _MAX_KEY_SIZE:
-        hashed = sha1(key).hexdigest().encode('utf-8')
-        klen = _MAX_KEY_SIZE - len(hashed) - 1
-        key = b'%s-%s' % (key[:klen], hashed)
 
-    return key
+# the default key mangler: encodes keys to UTF-8 and hashes the tail of
+# keys longer than _MAX_KEY_SIZE.
+_mangle_key = mangling.KeyMangler(max_key_size=_MAX_KEY_SIZE)
 
 
 def _key_generate_to_str(s):
@@ -124,11 +181,19 @@ def dont_cache_none(value):
 
 
 def get_memoization_decorator(region, namespace=None, expiration_time=None,
-                              should_cache_fn=None):
-    """Build a function based on the `cache_on_arguments` decorator."""
+                              should_cache_fn=None, early_recompute_beta=None):
+    """Build a function based on the `cache_on_arguments` decorator.
+
+    :param early_recompute_beta: enable probabilistic early recomputation
+     for this function, see :class:`.SharedExpirationCacheRegion`.
+    """
+    kwargs = {}
+    if early_recompute_beta is not None:
+        kwargs['early_recompute_beta'] = early_recompute_beta
     memoize = region.cache_on_arguments(namespace=namespace,
                                         should_cache_fn=should_cache_fn,
-                                        expiration_time=expiration_time)
+                                        expiration_time=expiration_time,
+                                        **kwargs)
 
     # Make sure the actual "should_cache" and "expiration_time" methods are
     # available. This is potentially interesting/useful to pre-seed cache
@@ -139,16 +204,110 @@ def get_memoization_decorator(region, namespace=None, expiration_time=None,
     return memoize
 
 
+# argument types whose str() is cheap and never raises
+if six.PY2:
+    _PLAIN_TYPES = frozenset([str, int, long, float, bool])  # noqa: F821
+else:
+    _PLAIN_TYPES = frozenset([str, int, float, bool, bytes])
+
+
+def _args_to_str(args):
+    for arg in args:
+        if type(arg) not in _PLAIN_TYPES:
+            return map(_key_generate_to_str, args)
+    return map(str, args)
+
+
+def _key_namespace(namespace, fn):
+    # NOTE: a namespace of None becomes 'None', as it always did
+    return '%s:%s|%s' % (fn.__module__, fn.__name__,
+                         _key_generate_to_str(namespace))
+
+
+def _getargspec(fn):
+    if six.PY2:
+        spec = inspect.getargspec(fn)
+    else:
+        spec = inspect.getfullargspec(fn)
+    return spec[0], spec[3] or ()
+
+
+def _keyword_binder(fn):
+    """Return a function placing keyword arguments of ``fn`` at their
+    position, so that ``f(1, b=2)`` has the key of ``f(1, 2)``.
+
+    Defaults fill the positions skipped in between; trailing omitted
+    arguments stay omitted, so keys of positional calls are unchanged.
+    """
+    arg_names, defaults = _getargspec(fn)
+    index = dict((name, i) for i, name in enumerate(arg_names))
+    first_default = len(arg_names) - len(defaults)
+
+    def bind(args, kw):
+        for name in kw:
+            i = index.get(name)
+            if i is None:
+                raise ValueError(
+                    "Key generation for %s does not accept the keyword "
+                    "argument %r." % (fn.__name__, name))
+            if i < len(args):
+                raise TypeError("%s() got multiple values for argument %r" %
+                                (fn.__name__, name))
+
+        args = list(args)
+        for i in range(len(args), max(index[name] for name in kw) + 1):
+            name = arg_names[i]
+            if name in kw:
+                args.append(kw[name])
+            elif i >= first_default:
+                args.append(defaults[i - first_default])
+            else:
+                raise TypeError("%s() missing argument %r" %
+                                (fn.__name__, name))
+        return args
+
+    has_self = bool(arg_names) and arg_names[0] in ('self', 'cls')
+    return bind, has_self
+
+
 def function_key_generator(namespace, fn, **kwargs):
-    namespace = _key_generate_to_str(namespace)
-    return util.function_key_generator(namespace, fn,
-                                       to_str=_key_generate_to_str)
+    """Return a function generating the cache key of a call of ``fn``.
+
+    Keys are the same as the ones of :func:`dogpile.cache.util.\
+function_key_generator`, but the signature of ``fn`` is inspected once,
+    keyword arguments are accepted and calls whose arguments are all of
+    simple types (strings, numbers) skip the per-argument error
+    handling.
+    """
+    prefix = _key_namespace(namespace, fn) + '|'
+    bind, has_self = _keyword_binder(fn)
+
+    def generate_key(*args, **kw):
+        if kw:
+            args = bind(args, kw)
+        if has_self:
+            args = args[1:]
+        return prefix + ' '.join(_args_to_str(args))
+    return generate_key
 
 
 def function_multi_key_generator(namespace, fn, **kwargs):
-    namespace = _key_generate_to_str(namespace)
-    return util.function_multi_key_generator(namespace, fn,
-                                             to_str=_key_generate_to_str)
+    """Return a function generating the cache keys of a call of ``fn``
+    decorated with ``cache_multi_on_arguments``, see
+    :func:`function_key_generator`.
+    """
+    prefix = _key_namespace(namespace, fn) + '|'
+    has_self = _keyword_binder(fn)[1]
+
+    def generate_keys(*args, **kw):
+        if kw:
+            raise ValueError(
+                "dogpile.cache's default key creation "
+                "function does not accept keyword arguments.")
+        if has_self:
+            args = args[1:]
+        return [prefix + arg for arg in _args_to_str(args)]
+    return generate_keys
 
 
 def _with_invalidation_cache(f):
@@ -184,24 +343,35 @@ class _Invalidated(object):
         }
         return region_key
 
-    def _getter_func(self, region):
+    def _get_backend_key(self, region):
         # it is required to call backend directly, because region.get
         # checks _soft/_hard_invalidated and it causes a recursion.
         # since region.get is bypassed, keys need to be hashed here.
         key = self._get_region_key(region)
         if region.key_mangler:
             key = region.key_mangler(key)
-        invalidated = region.backend.get(key)
+        return key
+
+    @staticmethod
+    def _payload(invalidated):
         if invalidated is not api.NO_VALUE:
             return invalidated.payload
         return None
 
+    def _getter_func(self, region):
+        return self._payload(
+            region.backend.get(self._get_backend_key(region)))
+
     def __get__(self, region, objtype=None):
         if not region:
             return self
         if not region.is_configured:
             return None
 
+        if region.invalidation_staleness:
+            return region._invalidation_snapshot.get(
+                region, self.invalidate_type)
+
         # Make some efforts to reduce actual calls to the backend when fetching
         # the "invalidated" state (both "soft" and "hard").
         state = getattr(region._thread_local, _INVALIDATED_CACHE_KEY, None)
@@ -218,16 +388,119 @@ class _Invalidated(object):
             return
         key = self._get_region_key(region)
         region.set(key, value)
+        region._invalidation_snapshot.update(self.invalidate_type, value)
 
     def __delete__(self, region):
         if not region.is_configured:
             return
         key = self._get_region_key(region)
         region.delete(key)
+        region._invalidation_snapshot.update(self.invalidate_type, None)
+
+
+def _invalidation_keys(region):
+    """Backend keys holding the hard and soft invalidation timestamps."""
+    return [
+        getattr(type(region), '_%s_invalidated' % typ)._get_backend_key(region)
+        for typ in _INVALIDATION_TYPES
+    ]
+
+
+class _InvalidationSnapshot(object):
+    """Invalidation timestamps of a region, shared by all threads.
+
+    The snapshot is reloaded (both timestamps in a single ``get_multi``)
+    once it is older than the region's ``invalidation_staleness``.  Only
+    one thread reloads it at a time; the others keep using the previous
+    snapshot in the meantime, so a stale read is bounded by the staleness
+    plus one backend round trip.
+    """
+
+    def __init__(self):
+        self.values = None
+        self.loaded_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, region, typ):
+        values = self.values
+        if values is None or \
+                time.time() - self.loaded_at > region.invalidation_staleness:
+            values = self.refresh(region, wait=values is None)
+        return values[typ]
+
+    def refresh(self, region, wait=True):
+        """Reload the timestamps from the backend.
+
+        If another thread is already reloading, either wait for it or,
+        when ``wait`` is False, return the current snapshot right away.
+        """
+        loaded_at = self.loaded_at
+        if not self._lock.acquire(wait):
+            return self.values
+        try:
+            if self.loaded_at != loaded_at and self.values is not None:
+                # reloaded by another thread while we were waiting
+                return self.values
+            values = region.backend.get_multi(_invalidation_keys(region))
+            self.values = dict(
+                (typ, _Invalidated._payload(value))
+                for typ, value in zip(_INVALIDATION_TYPES, values))
+            self.loaded_at = time.time()
+            return self.values
+        finally:
+            self._lock.release()
+
+    def update(self, typ, value):
+        # Make our own invalidations visible to this process right away.
+        values = self.values
+        if values is not None:
+            values = dict(values)
+            values[typ] = value
+            self.values = values
+
+
+class _Flight(object):
+    """A value being created by one of the threads of the process."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.payload = NO_VALUE
+        self.failed = False
 
 
 class SharedExpirationCacheRegion(dogpile.cache.CacheRegion):
-    """Patch the region interfaces to ensure we share the expiration time."""
+    """Patch the region interfaces to ensure we share the expiration time.
+
+    :param invalidation_staleness: number of seconds the shared
+     invalidation timestamps may be cached in-process.  When non-zero,
+     normal reads do not hit the backend for the invalidation state at
+     all, and invalidations made by other processes take effect after at
+     most this delay.  Defaults to ``0`` (always ask the backend).
+
+    :param early_recompute_beta: enable probabilistic early recomputation
+     ("XFetch", Vattani et al., *Optimal Probabilistic Cache Stampede
+     Prevention*).  Values created by :meth:`get_or_create` and friends
+     record how long their creation took; a read then treats a value as
+     expired ahead of time with a probability growing as the expiration
+     approaches, and faster for values which are slow to create.  The
+     early refresh goes through the dogpile lock like a regular
+     expiration, so expirations spread out instead of arriving at once.
+     Larger values recompute earlier; ``1.0`` is the usual choice.
+     Defaults to ``None`` (disabled).
+
+    :param negative_ttl: when a creator returns ``None`` and
+     ``should_cache_fn`` (e.g. :func:`dont_cache_none`) refuses to cache
+     it, store a tombstone for that many seconds instead of nothing, so
+     that lookups of missing objects do not call the creator every time.
+     Values ``None`` created by an ``async_creation_runner`` are stored
+     as tombstones too.  :meth:`get` reports tombstones as missing.
+     Defaults to ``None`` (disabled).
+
+    :param presence_filter: a :class:`.bloom.PresenceFilter` of the keys
+     stored in the region and of those missing from it, letting
+     :meth:`get_or_create` skip the first of its two backend lookups for
+     keys known to be missing.  Defaults to ``None``.
+    """
 
     _hard_invalidated = _Invalidated('hard')
     _soft_invalidated = _Invalidated('soft')
@@ -235,16 +508,555 @@ class SharedExpirationCacheRegion(dogpile.cache.CacheRegion):
     def __init__(self, *args, **kwargs):
         """Construct a new :class:`.SharedExpirationCacheRegion`."""
         self._thread_local = threading.local()
+        self._invalidation_snapshot = _InvalidationSnapshot()
+        self.invalidation_staleness = kwargs.pop('invalidation_staleness', 0)
+        self.early_recompute_beta = kwargs.pop('early_recompute_beta', None)
+        self.negative_ttl = kwargs.pop('negative_ttl', None)
+        self.presence_filter = kwargs.pop('presence_filter', None)
+        # mangled key -> _Flight of the values being created
+        self._flights = {}
+        self._flights_lock = threading.Lock()
         super(SharedExpirationCacheRegion, self).__init__(*args, **kwargs)
 
     __init__.__doc__ = dogpile.cache.CacheRegion.__init__.__doc__
 
+    def refresh_invalidation(self):
+        """Reload the shared invalidation state right away.
+
+        Hook this up to a notification channel (e.g. a Redis pub/sub
+        subscriber) to push invalidations made by other processes instead
+        of waiting for ``invalidation_staleness`` to elapse.
+        """
+        if self.is_configured:
+            self._invalidation_snapshot.refresh(self)
+
+    def _value(self, value, duration=None):
+        value = super(SharedExpirationCacheRegion, self)._value(value)
+        if duration is not None:
+            # creation time, for early recomputation
+            value.metadata['d'] = duration
+        return value
+
+    def _set_created(self, key, value, duration):
+        """Store a value created by an ``async_creation_runner`` that took
+        ``duration`` seconds.
+        """
+        if self.key_mangler:
+            key = self.key_mangler(key)
+        if value is None and self.negative_ttl:
+            # should_cache_fn is not known here, a tombstone is the
+            # closest to what get_or_create() stores
+            self.backend.set(key, self._tombstone(duration))
+        else:
+            self.backend.set(key, self._value(value, duration))
+        self._stored(key)
+        self._report_creation(duration, 1)
+
+    def _tombstone(self, duration):
+        """Return the value stored in place of a ``None`` not cached."""
+        value = self._value(None, duration)
+        # how long the tombstone lasts
+        value.metadata['n'] = self.negative_ttl
+        return value
+
+    @staticmethod
+    def _expired_tombstone(value):
+        negative_ttl = value.metadata.get('n')
+        return negative_ttl is not None and \
+            time.time() - value.metadata['ct'] > negative_ttl
+
+    def _stored(self, mangled_key):
+        if self.presence_filter is not None:
+            self.presence_filter.add(mangled_key)
+
+    def _unusable(self, value, hard_invalidated):
+        """Whether a value read from the backend must be created again.
+        """
+        if value is NO_VALUE or value.metadata['v'] != value_version:
+            return True
+        if hard_invalidated and value.metadata['ct'] < hard_invalidated:
+            return True
+        return self._expired_tombstone(value)
+
+    def _mangled(self, key):
+        return self.key_mangler(key) if self.key_mangler else key
+
+    def _unexpired_value_fn(self, expiration_time, ignore_expiration):
+        value_fn = super(SharedExpirationCacheRegion,
+                         self)._unexpired_value_fn(expiration_time,
+                                                   ignore_expiration)
+
+        def unexpired(value):
+            value = value_fn(value)
+            if value is not NO_VALUE and 'n' in value.metadata:
+                # a tombstone, live or not, is not a cached value
+                return NO_VALUE
+            return value
+
+        return unexpired
+
+    def set(self, key, value):
+        super(SharedExpirationCacheRegion, self).set(key, value)
+        self._stored(self._mangled(key))
+
+    def set_multi(self, mapping):
+        super(SharedExpirationCacheRegion, self).set_multi(mapping)
+        if self.presence_filter is not None and mapping:
+            for key in mangling.mangle_keys(self.key_mangler, mapping):
+                self.presence_filter.add(key)
+
+    def delete(self, key):
+        super(SharedExpirationCacheRegion, self).delete(key)
+        if self.presence_filter is not None:
+            self.presence_filter.discard(self._mangled(key))
+
+    def delete_multi(self, keys):
+        super(SharedExpirationCacheRegion, self).delete_multi(keys)
+        if self.presence_filter is not None:
+            for key in mangling.mangle_keys(self.key_mangler, keys):
+                self.presence_filter.discard(key)
+
+    def _report_creation(self, duration, count):
+        """Tell the proxies interested (such as :class:`.MetricsProxy`)
+        that a creator produced ``count`` values in ``duration`` seconds.
+        """
+        backend = self.backend
+        while backend is not None:
+            record_creation = getattr(backend, 'record_creation', None)
+            if record_creation is not None:
+                record_creation(duration, count)
+            backend = getattr(backend, 'proxied', None)
+
+    def _recompute_early(self, value, expiration_time, beta, rand):
+        """Whether ``value`` should be recreated ahead of its expiration.
+
+        ``rand`` is uniformly distributed in ``(0, 1]``.
+        """
+        delta = value.metadata.get('d')
+        if not beta or not delta or expiration_time is None:
+            return False
+        # log(rand) <= 0: the further ahead, the less likely
+        recompute_at = time.time() - delta * beta * math.log(rand)
+        return recompute_at >= value.metadata['ct'] + expiration_time
+
     @_with_invalidation_cache
-    def get_or_create(self, *args, **kwargs):
-        return super(SharedExpirationCacheRegion, self).get_or_create(
-            *args, **kwargs)
+    def get_or_create(self, key, creator, expiration_time=None,
+                      should_cache_fn=None, early_recompute_beta=None):
+        """Return a cached value based on the given key.
+
+        Behaves like :meth:`.CacheRegion.get_or_create`, recording the
+        time the creator took and recomputing values early as configured
+        with ``early_recompute_beta`` (which may be overridden here).
+        """
+        orig_key = key
+        if self.key_mangler:
+            key = self.key_mangler(key)
+
+        if early_recompute_beta is None:
+            early_recompute_beta = self.early_recompute_beta
+        # drawn once, so that the value is judged the same way before and
+        # after taking the lock
+        rand = 1.0 - random.random()
+
+        presence_filter = self.presence_filter
+        # Only the lookup made before taking the lock may be skipped: the
+        # one made with the lock held must see values created meanwhile.
+        skip_lookup = [False]
+        if presence_filter is not None:
+            skip_lookup[0] = presence_filter.known_missing(key)
+
+        def get_value():
+            if skip_lookup[0]:
+                skip_lookup[0] = False
+                raise dogpile.NeedRegenerationException()
+            value = self.backend.get(key)
+            if value is NO_VALUE:
+                if presence_filter is not None:
+                    presence_filter.add_missing(key)
+                raise dogpile.NeedRegenerationException()
+            if presence_filter is not None:
+                # keeps it through rebuilds
+                presence_filter.add(key)
+            if self._unusable(value, self._hard_invalidated):
+                raise dogpile.NeedRegenerationException()
+            ct = value.metadata["ct"]
+            if self._soft_invalidated:
+                if ct < self._soft_invalidated:
+                    ct = time.time() - expiration_time - .0001
+            if self._recompute_early(value, expiration_time,
+                                     early_recompute_beta, rand):
+                ct = time.time() - expiration_time - .0001
+
+            return value.payload, ct
+
+        def gen_value():
+            start = time.time()
+            created_value = creator()
+            duration = time.time() - start
+            value = self._value(created_value, duration)
+            self._report_creation(duration, 1)
+
+            if not should_cache_fn or \
+                    should_cache_fn(created_value):
+                self.backend.set(key, value)
+                self._stored(key)
+            elif created_value is None and self.negative_ttl:
+                self.backend.set(key, self._tombstone(duration))
+                self._stored(key)
+
+            return value.payload, value.metadata["ct"]
+
+        if expiration_time is None:
+            expiration_time = self.expiration_time
+
+        if expiration_time is None and self._soft_invalidated:
+            raise exception.DogpileCacheException(
+                "Non-None expiration time required "
+                "for soft invalidation")
+
+        if expiration_time == -1:
+            expiration_time = None
+
+        if self.async_creation_runner:
+            def async_creator(mutex):
+                return self.async_creation_runner(
+                    self, orig_key, creator, mutex)
+        else:
+            async_creator = None
+
+        with dogpile.Lock(
+                self._mutex(key),
+                gen_value,
+                get_value,
+                expiration_time,
+                async_creator) as value:
+            return value
 
     @_with_invalidation_cache
-    def get_or_create_multi(self, *args, **kwargs):
-        return super(SharedExpirationCacheRegion, self).get_or_create_multi(
-            *args, **kwargs)
+    def get_or_create_multi(
+            self, keys, creator, expiration_time=None, should_cache_fn=None,
+            early_recompute_beta=None):
+        """Return a sequence of cached values based on a sequence of keys.
+
+        Behaves like :meth:`.CacheRegion.get_or_create_multi`, except that
+        the shared invalidation state is fetched in the same
+        ``get_multi`` call as the values, so a lookup costs a single
+        backend round trip.
+
+        Creation is coalesced per key among the threads of the process:
+        a missing key is produced by a single creator call at a time, and
+        other threads needing it, even within different sets of keys,
+        wait for that result instead of creating it again.
+
+        The time a creator call took is recorded for each of the values it
+        returned, for early recomputation (see ``early_recompute_beta``).
+        """
+        if not keys:
+            return []
+
+        if early_recompute_beta is None:
+            early_recompute_beta = self.early_recompute_beta
+
+        if expiration_time is None:
+            expiration_time = self.expiration_time
+
+        if expiration_time == -1:
+            expiration_time = None
+
+        payloads = {}
+        pending = sorted(set(keys))
+        while pending:
+            # keys whose creation failed in another thread are retried
+            pending = self._get_or_create_multi(
+                pending, creator, expiration_time, should_cache_fn,
+                early_recompute_beta, payloads)
+        return [payloads[k] for k in keys]
+
+    def _get_or_create_multi(self, sorted_unique_keys, creator,
+                             expiration_time, should_cache_fn,
+                             early_recompute_beta, payloads):
+        def get_value(key):
+            value = values.get(key, NO_VALUE)
+
+            if self._unusable(value, hard_invalidated):
+                # dogpile.core understands a 0 here as
+                # "the value is not available", e.g.
+                # _has_value() will return False.
+                return value.payload, 0
+            else:
+                ct = value.metadata["ct"]
+                if soft_invalidated:
+                    if ct < soft_invalidated:
+                        ct = time.time() - expiration_time - .0001
+                if early_recompute_beta:
+                    if key not in rolls:
+                        rolls[key] = 1.0 - random.random()
+                    if self._recompute_early(value, expiration_time,
+                                             early_recompute_beta,
+                                             rolls[key]):
+                        ct = time.time() - expiration_time - .0001
+
+                return value.payload, ct
+
+        def is_expired(ct):
+            if not ct:
+                return True
+            return expiration_time is not None and \
+                time.time() - ct > expiration_time
+
+        def gen_value():
+            raise NotImplementedError()
+
+        def async_creator(key, mutex):
+            mutexes[key] = mutex
+
+        mutexes = {}
+        rolls = {}
+
+        mangled_keys = mangling.mangle_keys(self.key_mangler,
+                                            sorted_unique_keys)
+
+        orig_to_mangled = dict(zip(sorted_unique_keys, mangled_keys))
+
+        values = self._get_multi_with_invalidation(mangled_keys)
+        presence_filter = self.presence_filter
+        if presence_filter is not None:
+            # a single round trip anyway, the filter is only kept up to
+            # date for get_or_create()
+            for mangled_key in mangled_keys:
+                if values[mangled_key] is NO_VALUE:
+                    presence_filter.add_missing(mangled_key)
+                else:
+                    presence_filter.add(mangled_key)
+
+        # read before taking _flights_lock: with invalidation_staleness,
+        # this may reload the snapshot from the backend
+        hard_invalidated = self._hard_invalidated
+        soft_invalidated = self._soft_invalidated
+
+        if expiration_time is None and soft_invalidated:
+            raise exception.DogpileCacheException(
+                "Non-None expiration time required "
+                "for soft invalidation")
+
+        owned = []
+        waiting = {}
+        with self._flights_lock:
+            for orig_key in sorted_unique_keys:
+                mangled_key = orig_to_mangled[orig_key]
+                ct = get_value(mangled_key)[1]
+                if not is_expired(ct):
+                    continue
+                flight = self._flights.get(mangled_key)
+                if flight is None:
+                    self._flights[mangled_key] = _Flight()
+                    owned.append(orig_key)
+                elif not ct:
+                    waiting[orig_key] = flight
+                # else: being regenerated, the old value is used meanwhile
+
+        created = False
+        try:
+            # The dogpile lock is still taken for the keys this thread
+            # creates, so a distributed mutex keeps working across
+            # processes.
+            for orig_key in owned:
+                mangled_key = orig_to_mangled[orig_key]
+                with dogpile.Lock(
+                        self._mutex(mangled_key),
+                        gen_value,
+                        lambda: get_value(mangled_key),
+                        expiration_time,
+                        async_creator=lambda mutex: async_creator(orig_key,
+                                                                  mutex)
+                ):
+                    pass
+
+            if mutexes:
+                # sort the keys, the idea is to prevent deadlocks.
+                keys_to_get = sorted(mutexes)
+                start = time.time()
+                new_values = creator(*keys_to_get)
+                duration = time.time() - start
+                self._report_creation(duration, len(keys_to_get))
+
+                values_w_created = dict(
+                    (orig_to_mangled[k], self._value(v, duration))
+                    for k, v in zip(keys_to_get, new_values)
+                )
+
+                if not should_cache_fn:
+                    to_store = values_w_created
+                else:
+                    to_store = dict(
+                        (k, v)
+                        for k, v in values_w_created.items()
+                        if should_cache_fn(v[0])
+                    )
+                    if self.negative_ttl:
+                        for k, v in values_w_created.items():
+                            if k not in to_store and v.payload is None:
+                                to_store[k] = self._tombstone(duration)
+                self.backend.set_multi(to_store)
+                for k in to_store:
+                    self._stored(k)
+
+                values.update(values_w_created)
+            created = True
+        finally:
+            for mutex in mutexes.values():
+                mutex.release()
+            self._land_flights(
+                [orig_to_mangled[k] for k in owned], values, created)
+
+        for orig_key in sorted_unique_keys:
+            if orig_key not in waiting:
+                payloads[orig_key] = values[orig_to_mangled[orig_key]].payload
+
+        failed = []
+        for orig_key, flight in waiting.items():
+            flight.done.wait()
+            if flight.failed:
+                failed.append(orig_key)
+            else:
+                payloads[orig_key] = flight.payload
+        return sorted(failed)
+
+    def _land_flights(self, mangled_keys, values, created):
+        with self._flights_lock:
+            for mangled_key in mangled_keys:
+                flight = self._flights.pop(mangled_key)
+                if created:
+                    flight.payload = values[mangled_key].payload
+                else:
+                    flight.failed = True
+                flight.done.set()
+
+    def iter_multi(self, keys, chunk_size=1000, expiration_time=None,
+                   ignore_expiration=False):
+        """Yield ``(key, value)`` for each of ``keys``, like
+        :meth:`.CacheRegion.get_multi` but as the values arrive.
+
+        ``keys`` may be any iterable, it is consumed as the values are
+        fetched, ``chunk_size`` keys at a time, so that walking a huge
+        number of keys takes constant memory.  Backends providing
+        ``iter_multi`` (the Redis ones) fetch the next batches while the
+        current one is consumed and decode values one at a time; with
+        other backends, or proxies in front of them, ``get_multi`` is
+        called for every chunk.
+
+        Expiration and invalidation are checked again for every chunk.
+        """
+        # original keys, in the order the backend was given them
+        pending = collections.deque()
+
+        def mangled_keys():
+            key_mangler = self.key_mangler
+            for key in keys:
+                pending.append(key)
+                yield key_mangler(key) if key_mangler else key
+
+        backend_iter_multi = getattr(self.backend, 'iter_multi', None)
+        if backend_iter_multi is not None:
+            values = backend_iter_multi(mangled_keys(), chunk_size)
+        else:
+            values = self._iter_get_multi(mangled_keys(), chunk_size)
+
+        for i, (_, value) in enumerate(values):
+            if i % chunk_size == 0:
+                unexpired = self._unexpired_value_fn(expiration_time,
+                                                     ignore_expiration)
+            value = unexpired(value)
+            if value is not NO_VALUE:
+                value = value.payload
+            yield pending.popleft(), value
+
+    def _iter_get_multi(self, keys, chunk_size):
+        for chunk in chunked(keys, chunk_size):
+            for pair in zip(chunk, self.backend.get_multi(chunk)):
+                yield pair
+
+    def cache_on_arguments(self, namespace=None, expiration_time=None,
+                           should_cache_fn=None, to_str=compat.string_type,
+                           function_key_generator=None,
+                           early_recompute_beta=None):
+        """A function decorator that will cache the return value of the
+        function using a key derived from the function itself and its
+        arguments.
+
+        Same as :meth:`.CacheRegion.cache_on_arguments`, with an
+        ``early_recompute_beta`` overriding the region's setting.
+        """
+        expiration_time_is_callable = compat.callable(expiration_time)
+
+        if function_key_generator is None:
+            function_key_generator = self.function_key_generator
+
+        def decorator(fn):
+            if to_str is compat.string_type:
+                # backwards compatible
+                key_generator = function_key_generator(namespace, fn)
+            else:
+                key_generator = function_key_generator(
+                    namespace, fn,
+                    to_str=to_str)
+
+            @functools.wraps(fn)
+            def decorate(*arg, **kw):
+                key = key_generator(*arg, **kw)
+
+                @functools.wraps(fn)
+                def creator():
+                    return fn(*arg, **kw)
+                timeout = expiration_time() if expiration_time_is_callable \
+                    else expiration_time
+                return self.get_or_create(
+                    key, creator, timeout, should_cache_fn,
+                    early_recompute_beta=early_recompute_beta)
+
+            def invalidate(*arg, **kw):
+                key = key_generator(*arg, **kw)
+                self.delete(key)
+
+            def set_(value, *arg, **kw):
+                key = key_generator(*arg, **kw)
+                self.set(key, value)
+
+            def get(*arg, **kw):
+                key = key_generator(*arg, **kw)
+                return self.get(key)
+
+            def refresh(*arg, **kw):
+                key = key_generator(*arg, **kw)
+                value = fn(*arg, **kw)
+                self.set(key, value)
+                return value
+
+            decorate.set = set_
+            decorate.invalidate = invalidate
+            decorate.refresh = refresh
+            decorate.get = get
+            decorate.original = fn
+
+            return decorate
+        return decorator
+
+    def _get_multi_with_invalidation(self, mangled_keys):
+        """Fetch values, together with the invalidation state if needed.
+
+        Returns a dict of mangled key to backend value.  Unless the region
+        uses the shared invalidation snapshot, the two invalidation keys
+        are prepended to the ``get_multi`` call and their payloads stored
+        in the per-call invalidation cache.
+        """
+        state = getattr(self._thread_local, _INVALIDATED_CACHE_KEY, None)
+        if self.invalidation_staleness or state is None:
+            return dict(zip(mangled_keys,
+                            self.backend.get_multi(mangled_keys)))
+
+        invalidation_keys = _invalidation_keys(self)
+        fetched = self.backend.get_multi(invalidation_keys + mangled_keys)
+        n = len(invalidation_keys)
+        for typ, value in zip(_INVALIDATION_TYPES, fetched[:n]):
+            state[typ] = _Invalidated._payload(value)
+        return dict(zip(mangled_keys, fetched[n:]))
@@ -0,0 +1,160 @@
+"""Turn cache keys into backend keys.
+
+:class:`KeyMangler` encodes keys to UTF-8, optionally prefixes them, and
+replaces the tail of keys longer than ``max_key_size`` with a digest.
+Recently mangled keys are memoized, so a hot key is only encoded (and
+possibly hashed) once.
+
+The defaults produce the same keys as earlier releases: the ``sha1``
+hash and a ``max_key_size`` of 512 match the default key mangler of
+:func:`.configure_cache_region`, and a ``prefix`` without
+``max_key_size`` matches :func:`.create_key_mangler`.
+Other hashes give different keys for long keys only, so switching to
+them invalidates those entries.
+"""
+import hashlib
+
+import six
+
+
+def _sha1(digest_size):
+    if digest_size is not None:
+        raise ValueError('sha1 has a fixed digest size')
+    return lambda data: hashlib.sha1(data).hexdigest().encode('ascii')
+
+
+def _blake2b(digest_size):
+    blake2b = getattr(hashlib, 'blake2b', None)
+    if blake2b is None:
+        raise ImportError('blake2b requires Python 3.6 or later')
+    digest_size = digest_size or 16
+    return lambda data: blake2b(
+        data, digest_size=digest_size).hexdigest().encode('ascii')
+
+
+def _xxhash(digest_size):
+    import xxhash
+
+    digest_size = digest_size or 8
+    if digest_size == 8:
+        hasher = xxhash.xxh64
+    elif digest_size == 16:
+        hasher = xxhash.xxh128
+    else:
+        raise ValueError('xxhash digest size must be 8 or 16')
+    return lambda data: hasher(data).hexdigest().encode('ascii')
+
+
+_STRING_TYPES = (six.text_type, six.binary_type)
+
+_HASHES = {
+    'sha1': _sha1,
+    'blake2b': _blake2b,
+    'xxhash': _xxhash,
+}
+
+
+class KeyMangler(object):
+    """A key mangler for regions.
+
+    :param prefix: string prepended to every key, joined with a ``.``.
+
+    :param hash: ``'sha1'`` (default, compatible with existing keys),
+     ``'blake2b'``, ``'xxhash'`` (needs the ``xxhash`` package), or a
+     function returning the (byte string) digest of a byte string.
+
+    :param digest_size: digest size in bytes for ``blake2b`` (default
+     ``16``) and ``xxhash`` (``8``, the default, or ``16``).
+
+    :param max_key_size: keys longer than this are cut and suffixed
+     with their digest.  ``None`` disables it.
+
+    :param memo_size: number of mangled keys remembered.  The memo is
+     emptied when full, which is cheaper than tracking recency.  ``0``
+     disables it.
+
+    :param hash_tag: Redis Cluster hash tag added to the keys, so that
+     they are stored in the same slot (and node) and fetched together.
+     ``True`` wraps ``prefix`` in braces, placing the whole region in a
+     single slot; a function receives the key and returns its tag (or
+     ``None`` for no tag), which is inserted after the prefix:
+     ``prefix.{tag}key``.  Changing it changes the keys.
+    """
+
+    def __init__(self, prefix=None, hash='sha1', digest_size=None,
+                 max_key_size=512, memo_size=4096, hash_tag=None):
+        if isinstance(prefix, six.text_type):
+            prefix = prefix.encode('utf-8')
+        if hash_tag is True:
+            if prefix is None:
+                raise ValueError('hash_tag=True requires a prefix')
+            prefix = b'{' + prefix + b'}'
+            hash_tag = None
+        self.prefix = prefix + b'.' if prefix is not None else None
+        self.hash_tag = hash_tag
+        if callable(hash):
+            self.hash = hash
+        else:
+            self.hash = _HASHES[hash](digest_size)
+        self.max_key_size = max_key_size
+        self.memo_size = memo_size
+        self._memo = {}
+
+    def __call__(self, key):
+        memo = self._memo
+        mangled = memo.get(key)
+        if mangled is None:
+            mangled = self.mangle(key)
+            # e.g. 1, 1.0 and True are equal, but not mangled alike
+            if self.memo_size and isinstance(key, _STRING_TYPES):
+                if len(memo) >= self.memo_size:
+                    memo.clear()
+                memo[key] = mangled
+        return mangled
+
+    def mangle(self, key):
+        """Mangle ``key``, bypassing the memo."""
+        tag = self.hash_tag(key) if self.hash_tag is not None else None
+        if isinstance(key, six.text_type):
+            key = key.encode('utf-8', 'xmlcharrefreplace')
+        elif not isinstance(key, six.binary_type):
+            # such as integers, formatted like ``'%s.%s'`` used to
+            key = six.text_type(key).encode('utf-8', 'xmlcharrefreplace')
+        if tag is not None:
+            if isinstance(tag, six.text_type):
+                tag = tag.encode('utf-8')
+            key = b'{' + tag + b'}' + key
+        if self.prefix is not None:
+            key = self.prefix + key
+        max_key_size = self.max_key_size
+        if max_key_size is not None and len(key) > max_key_size:
+            hashed = self.hash(key)
+            key = key[:max_key_size - len(hashed) - 1] + b'-' + hashed
+        return key
+
+    def mangle_multi(self, keys):
+        """Mangle a sequence of keys, returning a list."""
+        if not isinstance(keys, (list, tuple)):
+            keys = list(keys)
+        memo = self._memo
+        get = memo.get
+        mangled_keys = [get(key) for key in keys]
+        if None not in mangled_keys:
+            return mangled_keys
+
+        for i, (key, mangled) in enumerate(zip(keys, mangled_keys)):
+            if mangled is None:
+                mangled_keys[i] = self(key)
+        return mangled_keys
+
+
+def mangle_keys(key_mangler, keys):
+    """Mangle ``keys`` with ``key_mangler`` (which may be ``None``), in a
+    single call if it supports it.
+    """
+    if key_mangler is None:
+        return list(keys)
+    mangle_multi = getattr(key_mangler, 'mangle_multi', None)
+    if mangle_multi is not None:
+        return mangle_multi(keys)
+    return [key_mangler(key) for key in keys]
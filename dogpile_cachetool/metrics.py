@@ -0,0 +1,251 @@
+"""Sinks receiving the measurements of :class:`.MetricsProxy`.
+
+A sink gets one :meth:`MetricsSink.record` call per cache operation.
+Three are provided:
+
+* :class:`InMemorySink` aggregates counters and latency histograms in
+  process, for tests, debugging, or exposing them yourself;
+* :class:`StatsdSink` sends StatsD counters and timers over UDP;
+* :class:`PrometheusSink` updates ``prometheus_client`` metrics.
+
+Anything implementing ``record()`` can be used instead.
+"""
+from bisect import bisect_left
+import re
+import socket
+import threading
+
+from dogpile_cachetool.core import import_class
+
+
+DEFAULT_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05,
+                   .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsSink(object):
+    """Base class for sinks."""
+
+    def record(self, region, operation, duration, keys=1, hits=0, misses=0,
+               nbytes=0):
+        """Record one operation.
+
+        :param region: name of the region.
+        :param operation: ``'get'``, ``'get_multi'``, ``'set'``,
+         ``'set_multi'``, ``'delete'``, ``'delete_multi'``, or
+         ``'create'`` for calls of a creator function.
+        :param duration: seconds the operation took.
+        :param keys: number of keys involved.
+        :param hits: number of keys found, for reads.
+        :param misses: number of keys not found, for reads.
+        :param nbytes: size of the serialized values read or written, if
+         the backend serializes values.
+        """
+        raise NotImplementedError()
+
+
+class Histogram(object):
+    """Counts of observations falling in fixed buckets.
+
+    ``counts[i]`` is the number of observations less than or equal to
+    ``buckets[i]`` (and above the previous bucket); the last count is for
+    observations beyond the last bucket.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile, or
+        ``None`` if it is beyond the last bucket or nothing was observed.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class OperationStats(object):
+    """Aggregated measurements of one operation of one region."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.calls = 0
+        self.keys = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self.latency = Histogram(buckets)
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        if not lookups:
+            return None
+        return float(self.hits) / lookups
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'keys': self.keys,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hit_ratio,
+            'bytes': self.bytes,
+            'seconds': self.latency.sum,
+            'p50': self.latency.quantile(.5),
+            'p99': self.latency.quantile(.99),
+        }
+
+
+class InMemorySink(MetricsSink):
+    """Aggregate measurements in process, per region and operation."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, region, operation, duration, keys=1, hits=0, misses=0,
+               nbytes=0):
+        with self._lock:
+            stats = self.stats.get((region, operation))
+            if stats is None:
+                stats = self.stats[(region, operation)] = \
+                    OperationStats(self.buckets)
+            stats.calls += 1
+            stats.keys += keys
+            stats.hits += hits
+            stats.misses += misses
+            stats.bytes += nbytes
+            stats.latency.observe(duration)
+
+    def get(self, region, operation):
+        """Return the :class:`OperationStats` of an operation, or
+        ``None``.
+        """
+        return self.stats.get((region, operation))
+
+    def snapshot(self):
+        """Return ``{(region, operation): stats dict}``."""
+        with self._lock:
+            return dict((k, v.as_dict()) for k, v in self.stats.items())
+
+    def clear(self):
+        with self._lock:
+            self.stats.clear()
+
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9_\-]')
+
+
+class StatsdSink(MetricsSink):
+    """Send measurements to a StatsD server.
+
+    Every operation becomes a single datagram with
+    ``<prefix>.<region>.<operation>.`` ``calls``, ``keys``, ``hits``,
+    ``misses`` and ``bytes`` counters and a ``time`` timer (in
+    milliseconds).  Sending errors are ignored.
+    """
+
+    def __init__(self, host='localhost', port=8125, prefix='dogpile_cache'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _name(self, region, operation):
+        return '%s.%s.%s' % (self.prefix, _UNSAFE.sub('_', str(region)),
+                             operation)
+
+    def record(self, region, operation, duration, keys=1, hits=0, misses=0,
+               nbytes=0):
+        name = self._name(region, operation)
+        lines = [
+            '%s.calls:1|c' % name,
+            '%s.time:%.3f|ms' % (name, duration * 1000),
+        ]
+        for suffix, value in (('keys', keys), ('hits', hits),
+                              ('misses', misses), ('bytes', nbytes)):
+            if value:
+                lines.append('%s.%s:%d|c' % (name, suffix, value))
+        try:
+            self._socket.sendto('\n'.join(lines).encode('ascii'),
+                                self.address)
+        except (socket.error, OSError):
+            pass
+
+
+class PrometheusSink(MetricsSink):
+    """Update `prometheus_client
+    <https://pypi.python.org/pypi/prometheus_client>`_ metrics, labelled
+    by region and operation:
+
+    * ``<namespace>_operation_seconds`` (histogram)
+    * ``<namespace>_keys_total``, ``<namespace>_hits_total``,
+      ``<namespace>_misses_total`` and ``<namespace>_bytes_total``
+      (counters)
+
+    :param registry: ``prometheus_client`` registry, defaults to the
+     global one.  Create a single sink per registry and share it among
+     the regions.
+    """
+
+    def __init__(self, registry=None, namespace='dogpile_cache',
+                 buckets=DEFAULT_BUCKETS):
+        import prometheus_client
+
+        kwargs = {}
+        if registry is not None:
+            kwargs['registry'] = registry
+        labels = ['region', 'operation']
+        self.latency = prometheus_client.Histogram(
+            'operation_seconds', 'Duration of cache operations.', labels,
+            namespace=namespace, buckets=buckets, **kwargs)
+        self.counters = {}
+        for name, doc in (('keys', 'Keys involved in cache operations.'),
+                          ('hits', 'Keys found by cache reads.'),
+                          ('misses', 'Keys not found by cache reads.'),
+                          ('bytes', 'Serialized bytes read or written.')):
+            self.counters[name] = prometheus_client.Counter(
+                name + '_total', doc, labels, namespace=namespace, **kwargs)
+
+    def record(self, region, operation, duration, keys=1, hits=0, misses=0,
+               nbytes=0):
+        region = str(region)
+        self.latency.labels(region, operation).observe(duration)
+        for name, value in (('keys', keys), ('hits', hits),
+                            ('misses', misses), ('bytes', nbytes)):
+            if value:
+                self.counters[name].labels(region, operation).inc(value)
+
+
+_BUILTIN_SINKS = {
+    'memory': InMemorySink,
+    'statsd': StatsdSink,
+    'prometheus': PrometheusSink,
+}
+
+
+def get_sink(spec=None, arguments=None):
+    """Return a sink from a name (``'memory'``, ``'statsd'``,
+    ``'prometheus'``), a dotted class path, or an instance.
+    """
+    if spec is None:
+        spec = 'memory'
+    if isinstance(spec, MetricsSink) or hasattr(spec, 'record'):
+        return spec
+    sink_cls = _BUILTIN_SINKS.get(spec)
+    if sink_cls is None:
+        sink_cls = import_class(spec)
+    return sink_cls(**(arguments or {}))
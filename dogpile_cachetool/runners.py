@@ -0,0 +1,149 @@
+"""Creation runners refreshing expired values in the background.
+
+With an ``async_creation_runner`` configured, a region returns the
+expired value right away and hands the regeneration to the runner, see
+:class:`dogpile.cache.CacheRegion`.  Keys without any value are still
+created by the caller.
+
+::
+
+    region = create_region(async_creation_runner=ThreadPoolCreationRunner())
+
+or with :func:`.configure_cache_region`::
+
+    configure_cache_region(region, {
+        'backend': 'dogpile_cachetool.redis_rc',
+        'async_creation_runner': {'max_workers': 4, 'max_queue_size': 100},
+        ...
+    })
+"""
+import logging
+import threading
+import time
+
+from six.moves import queue
+
+
+_LOG = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ThreadPoolCreationRunner(object):
+    """An ``async_creation_runner`` backed by a bounded pool of threads.
+
+    Refreshes are deduplicated per region and key.  When the queue is
+    full, or the runner is shut down, the refresh is dropped: the creation
+    lock is released and the stale value keeps being served until a later
+    request tries again, so a slow backend never makes requests wait.
+
+    Worker threads are started on first use.  Call :meth:`shutdown` to
+    stop them gracefully.
+
+    :param max_workers: number of worker threads.
+
+    :param max_queue_size: number of refreshes which may wait for a
+     worker.
+    """
+
+    def __init__(self, max_workers=4, max_queue_size=1000):
+        self.max_workers = max_workers
+        self._queue = queue.Queue(max_queue_size)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._shutdown = False
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def __call__(self, region, key, creator, mutex):
+        job_id = (id(region), key)
+        with self._lock:
+            if self._shutdown or job_id in self._pending:
+                accepted = False
+            else:
+                try:
+                    self._queue.put_nowait(
+                        (job_id, region, key, creator, mutex))
+                except queue.Full:
+                    accepted = False
+                else:
+                    accepted = True
+                    self._pending.add(job_id)
+                    self._start_workers()
+            if not accepted:
+                self.rejected += 1
+
+        if not accepted:
+            mutex.release()
+
+    def _start_workers(self):
+        if self._workers:
+            return
+        for i in range(self.max_workers):
+            worker = threading.Thread(
+                target=self._work, name='dogpile-refresh-%d' % i)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            job_id, region, key, creator, mutex = job
+            try:
+                self._run(region, key, creator)
+            finally:
+                mutex.release()
+                with self._lock:
+                    self._pending.discard(job_id)
+
+    def _run(self, region, key, creator):
+        try:
+            start = time.time()
+            value = creator()
+            set_created = getattr(region, '_set_created', None)
+            if set_created is not None:
+                set_created(key, value, time.time() - start)
+            else:
+                region.set(key, value)
+        except Exception:
+            self.failed += 1
+            _LOG.exception('Refreshing cache key %r failed.', key)
+        else:
+            self.completed += 1
+
+    def shutdown(self, wait=True):
+        """Stop accepting refreshes and stop the workers.
+
+        Calling it again does nothing.
+
+        :param wait: finish the refreshes already queued and wait for the
+         workers to exit.  Otherwise queued refreshes are dropped.
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            workers, self._workers = self._workers, []
+
+        if not wait:
+            while True:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                job_id, _region, _key, _creator, mutex = job
+                mutex.release()
+                with self._lock:
+                    self._pending.discard(job_id)
+
+        for _worker in workers:
+            self._queue.put(_STOP)
+        if wait:
+            for worker in workers:
+                worker.join()
@@ -0,0 +1,255 @@
+"""Value serialization for the Redis backends.
+
+Every stored value starts with a format tag byte, so values written with
+one of the built-in serializers can still be read after switching to
+another one, and the serializer of a deployment can be migrated online
+(upgrade the readers first, then switch the writers).  Pickles carry
+their own tag: they always start with the ``PROTO`` opcode (``0x80``),
+which also keeps values written before serializers became configurable
+readable.  Values written with a custom serializer, however, can only be
+read where that serializer is configured; elsewhere reading them raises
+:class:`ValueError`.
+
+The ``serializer`` argument of the backends accepts ``'pickle'``
+(default), ``'json'``, ``'msgpack'``, the dotted path of a
+:class:`.Serializer` subclass, or an instance of one.
+
+Values may additionally be compressed, see :mod:`.compression`.
+"""
+import json
+import time
+
+from dogpile.cache.api import CachedValue
+import six
+from six.moves import cPickle as pickle
+
+from dogpile_cachetool import compression
+
+
+_COMPRESSED_FLAG = 0x40
+_CUSTOM_TAGS = (0x10, 0x3f)
+
+
+if six.PY2:
+    _cpu_time = time.clock
+
+    def _after_tag(data):
+        return data[1:]
+else:
+    _cpu_time = time.process_time
+
+    def _after_tag(data):
+        return memoryview(data)[1:]
+
+
+class Serializer(object):
+    """Base class for serializers.
+
+    ``tag`` identifies the format and must be unique among the serializers
+    in use; values up to ``0x0f`` are reserved for the built-in ones and
+    values from ``0x40`` up mark compressed data, so custom serializers
+    use ``0x10`` to ``0x3f``.  ``loads()`` may be given a ``memoryview``.
+    """
+
+    tag = None
+
+    #: whether ``dumps()`` output already starts with ``tag``
+    self_tagged = False
+
+    def dumps(self, value):
+        raise NotImplementedError()
+
+    def loads(self, data):
+        raise NotImplementedError()
+
+
+class PickleSerializer(Serializer):
+    tag = 0x80
+    self_tagged = True
+
+    def dumps(self, value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    if six.PY2:
+        def loads(self, data):
+            return pickle.loads(bytes(data))
+    else:
+        def loads(self, data):
+            return pickle.loads(data)
+
+
+def _to_tree(value):
+    # CachedValue is a tuple subclass, which JSON and msgpack would
+    # silently turn into a plain list.
+    if isinstance(value, CachedValue):
+        return [1, value.payload, value.metadata]
+    return [0, value]
+
+
+def _from_tree(tree):
+    if tree[0] == 1:
+        return CachedValue(tree[1], tree[2])
+    return tree[1]
+
+
+class JSONSerializer(Serializer):
+    """JSON serializer.
+
+    Only suitable for JSON compatible payloads: tuples come back as
+    lists and non-string dictionary keys as strings.
+    """
+
+    tag = 0x01
+
+    def dumps(self, value):
+        return json.dumps(_to_tree(value),
+                          separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data):
+        return _from_tree(json.loads(bytes(data).decode('utf-8')))
+
+
+class MsgpackSerializer(Serializer):
+    """`msgpack <https://pypi.python.org/pypi/msgpack>`_ serializer.
+
+    Decodes directly from the buffer.  Same payload restrictions as
+    :class:`.JSONSerializer`.
+    """
+
+    tag = 0x02
+
+    def __init__(self):
+        import msgpack
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+
+    def dumps(self, value):
+        return self._packb(_to_tree(value), use_bin_type=True)
+
+    def loads(self, data):
+        return _from_tree(self._unpackb(data, raw=False))
+
+
+_BUILTIN_SERIALIZERS = {
+    'pickle': PickleSerializer,
+    'json': JSONSerializer,
+    'msgpack': MsgpackSerializer,
+}
+
+
+def get_serializer(spec=None):
+    """Return a :class:`.Serializer` instance from a name, path or instance.
+    """
+    if spec is None:
+        spec = 'pickle'
+    if isinstance(spec, Serializer):
+        return spec
+    serializer_cls = _BUILTIN_SERIALIZERS.get(spec)
+    if serializer_cls is None:
+        from dogpile_cachetool.core import import_class
+        serializer_cls = import_class(spec)
+    return serializer_cls()
+
+
+class ValueCodec(object):
+    """Turn values into tagged byte strings and back.
+
+    Values are always written with the configured serializer; reading
+    picks the serializer from the tag byte.  Serializers other than the
+    configured one are created lazily (so e.g. msgpack need not be
+    installed unless it is used).
+
+    :param compressor: a :mod:`.compression` name or instance.  When
+     given, serialized values of at least ``compress_threshold`` bytes
+     are compressed if that makes them smaller.  Compressed values are
+     always readable, whether or not compression is configured.
+
+    ``size_hook``, when set, is called with the size of every byte
+    string produced by :meth:`dumps` or given to :meth:`loads`.
+    """
+
+    size_hook = None
+
+    def __init__(self, serializer=None, compressor=None,
+                 compress_threshold=1024):
+        self.serializer = get_serializer(serializer)
+        self._tag = six.int2byte(self.serializer.tag)
+        self._serializers = {self.serializer.tag: self.serializer}
+
+        self.compressor = compression.get_compressor(compressor)
+        self.compress_threshold = compress_threshold
+        self._compressors = {}
+        if self.compressor is not None:
+            self._compressors[self.compressor.id] = self.compressor
+            self._compressed_tag = six.int2byte(
+                _COMPRESSED_FLAG | self.compressor.id)
+        self.compression_stats = compression.CompressionStats()
+
+    def _serializer_for(self, tag):
+        serializer = self._serializers.get(tag)
+        if serializer is None:
+            for serializer_cls in _BUILTIN_SERIALIZERS.values():
+                if serializer_cls.tag == tag:
+                    serializer = self._serializers[tag] = serializer_cls()
+                    break
+            else:
+                if _CUSTOM_TAGS[0] <= tag <= _CUSTOM_TAGS[1]:
+                    raise ValueError(
+                        'Value written with the custom serializer 0x%02x, '
+                        'which is not the configured one (%s)'
+                        % (tag, type(self.serializer).__name__))
+                raise ValueError('Unknown serialization format: 0x%02x' % tag)
+        return serializer
+
+    def _compressor_for(self, compressor_id):
+        compressor = self._compressors.get(compressor_id)
+        if compressor is None:
+            compressor = self._compressors[compressor_id] = \
+                compression.compressor_for_id(compressor_id)
+        return compressor
+
+    def dumps(self, value):
+        data = self.serializer.dumps(value)
+        if not self.serializer.self_tagged:
+            data = self._tag + data
+        if self.compressor is not None:
+            data = self._compress(data)
+        if self.size_hook is not None:
+            self.size_hook(len(data))
+        return data
+
+    def _compress(self, data):
+        stats = self.compression_stats
+        if len(data) < self.compress_threshold:
+            stats.skipped += 1
+            return data
+
+        start = _cpu_time()
+        compressed = self.compressor.compress(data)
+        stats.compress_time += _cpu_time() - start
+        if len(compressed) + 1 >= len(data):
+            stats.skipped += 1
+            return data
+
+        stats.compressed += 1
+        stats.bytes_in += len(data)
+        stats.bytes_out += len(compressed) + 1
+        return self._compressed_tag + compressed
+
+    def loads(self, data):
+        if self.size_hook is not None:
+            self.size_hook(len(data))
+        tag = six.indexbytes(data, 0)
+        if tag & 0xc0 == _COMPRESSED_FLAG:
+            compressor = self._compressor_for(tag & ~_COMPRESSED_FLAG)
+            start = _cpu_time()
+            data = compressor.decompress(_after_tag(data))
+            stats = self.compression_stats
+            stats.decompress_time += _cpu_time() - start
+            stats.decompressed += 1
+            tag = six.indexbytes(data, 0)
+
+        serializer = self._serializer_for(tag)
+        if serializer.self_tagged:
+            return serializer.loads(data)
+        return serializer.loads(_after_tag(data))
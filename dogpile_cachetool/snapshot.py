@@ -0,0 +1,202 @@
+"""Dump and restore the contents of a cache region.
+
+A snapshot is a compact, length-prefixed file of already serialized
+values, so warming a cold region after a deploy does not need to go
+through the value creators again::
+
+    from dogpile_cachetool import snapshot
+
+    # on a warm host
+    snapshot.dump(region, '/var/cache/app/users.snap')
+
+    # at process start
+    snapshot.restore(region, '/var/cache/app/users.snap')
+
+Dumping requires a backend providing ``dump_serialized()`` (both Redis
+backends do).  Restoring into such a backend writes the raw values back
+in pipelined batches, keeping the remaining TTL of every key; any other
+backend (e.g. ``dogpile.cache.memory``) is preloaded by decoding the
+values straight out of the memory-mapped file.
+"""
+import mmap
+import re
+import struct
+import time
+
+import six
+
+from dogpile_cachetool import serializers
+from dogpile_cachetool.utils import chunked
+from dogpile_cachetool.utils import get_actual_backend
+
+
+MAGIC = b'DPCTSNAP'
+VERSION = 1
+
+# magic, version, creation time
+_HEADER = struct.Struct('>8sBd')
+# key length, value length, remaining TTL in milliseconds (-1 for none)
+_RECORD = struct.Struct('>IIq')
+
+
+class SnapshotError(Exception):
+    """The snapshot file is malformed or of an unsupported version."""
+
+
+class SnapshotWriter(object):
+    """Write snapshot records to a binary file object."""
+
+    def __init__(self, fileobj, created_at=None):
+        self.fileobj = fileobj
+        self.created_at = time.time() if created_at is None else created_at
+        self.count = 0
+        fileobj.write(_HEADER.pack(MAGIC, VERSION, self.created_at))
+
+    def write(self, key, data, ttl_ms=None):
+        if isinstance(key, six.text_type):
+            key = key.encode('utf-8')
+        self.fileobj.write(_RECORD.pack(
+            len(key), len(data), -1 if ttl_ms is None else int(ttl_ms)))
+        self.fileobj.write(key)
+        self.fileobj.write(data)
+        self.count += 1
+
+
+class SnapshotReader(object):
+    """Iterate over the records of a snapshot file without loading it.
+
+    The file is memory-mapped; iterating yields ``(key, data, ttl_ms)``
+    where ``data`` is a view into the mapping (a copy on Python 2) and
+    ``ttl_ms`` is the TTL left *now*, taking the age of the snapshot into
+    account.  Records which have expired since the dump are skipped.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError('Empty snapshot file: %s' % path)
+
+        if len(self._map) < _HEADER.size:
+            self.close()
+            raise SnapshotError('Truncated snapshot header: %s' % path)
+        magic, version, self.created_at = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise SnapshotError('Not a supported snapshot file: %s' % path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # views handed out are still alive, the mapping goes away
+                # together with them
+                pass
+            self._map = None
+        self._file.close()
+
+    def __iter__(self):
+        buf = self._map
+        view = buf if six.PY2 else memoryview(buf)
+        elapsed_ms = int((time.time() - self.created_at) * 1000)
+        offset = _HEADER.size
+        end = len(buf)
+        while offset < end:
+            if offset + _RECORD.size > end:
+                raise SnapshotError('Truncated snapshot record')
+            klen, vlen, ttl_ms = _RECORD.unpack_from(buf, offset)
+            offset += _RECORD.size
+            if offset + klen + vlen > end:
+                raise SnapshotError('Truncated snapshot record')
+            key = buf[offset:offset + klen]
+            offset += klen
+            data = view[offset:offset + vlen]
+            offset += vlen
+
+            if ttl_ms >= 0:
+                ttl_ms -= elapsed_ms
+                if ttl_ms <= 0:
+                    continue
+            else:
+                ttl_ms = None
+            yield key, data, ttl_ms
+
+
+def _region_prefix(region):
+    # Key manglers from create_key_mangler() prefix every key with the
+    # region name; the mangled empty key is exactly that prefix.
+    if region.key_mangler is None:
+        return b''
+    prefix = region.key_mangler(b'')
+    if isinstance(prefix, six.text_type):
+        prefix = prefix.encode('utf-8')
+    return prefix
+
+
+def _glob_escape(prefix):
+    return re.sub(br'([\\*?\[\]])', br'\\\1', prefix)
+
+
+def dump(region, path, prefix=None, batch_size=1000):
+    """Write every key of the region's namespace to a snapshot file.
+
+    :param prefix: key prefix to dump, defaults to the prefix added by the
+     region's key mangler (see :func:`.create_key_mangler`).
+
+    Returns the number of records written.
+    """
+    backend = get_actual_backend(region.backend)
+    if not hasattr(backend, 'dump_serialized'):
+        raise TypeError('Backend %r does not support dumping' % backend)
+
+    if prefix is None:
+        prefix = _region_prefix(region)
+    elif isinstance(prefix, six.text_type):
+        prefix = prefix.encode('utf-8')
+    match = _glob_escape(prefix) + b'*'
+
+    with open(path, 'wb') as f:
+        writer = SnapshotWriter(f)
+        for key, data, ttl_ms in backend.dump_serialized(
+                match=match, batch_size=batch_size):
+            writer.write(key, data, ttl_ms)
+    return writer.count
+
+
+def restore(region, path, batch_size=1000, loads=None):
+    """Load a snapshot file into the region's backend.
+
+    :param loads: used to decode values when the backend cannot store
+     serialized values as they are; defaults to decoding them the way the
+     Redis backends encoded them (see :mod:`.serializers`).
+
+    Returns the number of records restored.
+    """
+    backend = get_actual_backend(region.backend)
+    raw = hasattr(backend, 'restore_serialized')
+    if loads is None:
+        loads = serializers.ValueCodec().loads
+
+    count = 0
+    with SnapshotReader(path) as reader:
+        for batch in chunked(reader, batch_size):
+            if raw:
+                backend.restore_serialized(
+                    [(key, bytes(data), ttl_ms)
+                     for key, data, ttl_ms in batch])
+            else:
+                region.backend.set_multi(dict(
+                    (key, loads(data)) for key, data, _ttl_ms in batch))
+            count += len(batch)
+            del batch
+    return count
@@ -2,6 +2,8 @@ import collections
 import itertools
 import os
 import random
+import shutil
+import tempfile
 import time
 import unittest2
 from binascii import hexlify
@@ -12,6 +14,8 @@ from dogpile.cache import CacheRegion
 from dogpile.cache.api import NO_VALUE
 from dogpile.cache.region import _backend_loader
 
+from dogpile_cachetool import snapshot
+
 
 class _GenericBackendFixture(object):
     @classmethod
@@ -308,3 +312,77 @@ class _GenericBackendTest(_GenericBackendFixture, unittest2.TestCase):
 
         with self.assertRaisesRegexp(Exception, r'boom'):
             reg.get_or_create(self._random_backend_key, boom)
+
+
+class _GenericMutexTest(_GenericBackendFixture, unittest2.TestCase):
+
+    def test_mutex(self):
+        backend = self._backend()
+        mutex = backend.get_mutex('foo')
+
+        self.assertTrue(mutex.acquire())
+        self.assertFalse(mutex.acquire(False))
+        mutex.release()
+        self.assertTrue(mutex.acquire())
+        mutex.release()
+
+    def test_mutex_threaded(self):
+        backend = self._backend()
+        canary = []
+
+        def f():
+            for x in range(5):
+                mutex = backend.get_mutex('foo')
+                mutex.acquire()
+                for y in range(5):
+                    ack = lock.acquire(False)
+                    canary.append(ack)
+                    time.sleep(.002)
+                    if ack:
+                        lock.release()
+                mutex.release()
+                time.sleep(.02)
+
+        lock = Lock()
+        threads = [Thread(target=f) for i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertNotIn(False, canary)
+
+    def test_mutex_reentrant_across_keys(self):
+        backend = self._backend()
+        for x in range(3):
+            m1 = backend.get_mutex('foo')
+            m2 = backend.get_mutex('bar')
+            try:
+                m1.acquire()
+                self.assertTrue(m2.acquire(False))
+                self.assertFalse(m2.acquire(False))
+                m2.release()
+            finally:
+                m1.release()
+
+
+class _GenericSnapshotTest(object):
+
+    def test_snapshot_dump_restore(self):
+        reg = self._region()
+        prefix = 'snap:%s.' % hexlify(os.urandom(4)).decode('ascii')
+        reg.key_mangler = lambda key: (prefix + key).encode('utf-8')
+        values = dict(('key%d' % i, 'value%d' % i) for i in range(20))
+        reg.set_multi(values)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'region.snap')
+            self.assertEqual(snapshot.dump(reg, path, batch_size=7), 20)
+            reg.delete_multi(list(values))
+            self.assertEqual(reg.get('key3'), NO_VALUE)
+            self.assertEqual(snapshot.restore(reg, path), 20)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(reg.get_multi(sorted(values)),
+                         [values[k] for k in sorted(values)])
+        reg.delete_multi(list(values))
@@ -0,0 +1,308 @@
+import asyncio
+import unittest2
+
+from dogpile.cache import exception
+
+from dogpile_cachetool import aio
+from dogpile_cachetool import core as cache
+from dogpile_cachetool.aio import _ketama
+from dogpile_cachetool.aio import backends
+
+
+NO_VALUE = cache.NO_VALUE
+
+
+class FakeAsyncRedis(object):
+    """In-process stand-in for the ``redis.asyncio`` clients."""
+
+    def __init__(self, data=None):
+        self.data = {} if data is None else data
+        self.calls = []
+
+    async def get(self, key):
+        self.calls.append('get')
+        await asyncio.sleep(0)
+        return self.data.get(key)
+
+    async def mget(self, keys):
+        self.calls.append('mget')
+        await asyncio.sleep(0)
+        return [self.data.get(key) for key in keys]
+
+    mget_nonatomic = mget
+
+    async def set(self, key, value, ex=None):
+        self.calls.append('set')
+        await asyncio.sleep(0)
+        self.data[key] = value
+
+    async def mset_nonatomic(self, mapping):
+        self.calls.append('mset')
+        await asyncio.sleep(0)
+        self.data.update(mapping)
+
+    async def delete(self, *keys):
+        self.calls.append('delete')
+        await asyncio.sleep(0)
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakeAsyncPipeline(self)
+
+    async def close(self):
+        pass
+
+
+class FakeAsyncPipeline(object):
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, key, value, ex=None):
+        self.commands.append((key, value))
+        return self
+
+    async def execute(self):
+        self.client.calls.append('pipeline')
+        await asyncio.sleep(0)
+        for key, value in self.commands:
+            self.client.data[key] = value
+        return [True] * len(self.commands)
+
+
+class _AsyncTestCase(unittest2.TestCase):
+
+    def setUp(self):
+        super(_AsyncTestCase, self).setUp()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        super(_AsyncTestCase, self).tearDown()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+
+class AsyncRegionTest(_AsyncTestCase):
+
+    def setUp(self):
+        super(AsyncRegionTest, self).setUp()
+        self.cache_dict = {}
+        self.region = self._region()
+        self.calls = 0
+
+    def _region(self, **conf):
+        region = aio.create_region(name='test')
+        conf.setdefault('backend', 'dogpile_cachetool.aio.memory')
+        conf.setdefault('arguments', {'cache_dict': self.cache_dict})
+        return aio.configure_cache_region(region, conf)
+
+    async def _creator(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return 'value%d' % self.calls
+
+    def test_get_or_create(self):
+        value = self.run_async(self.region.get_or_create('key', self._creator))
+        self.assertEqual(value, 'value1')
+        value = self.run_async(self.region.get_or_create('key', self._creator))
+        self.assertEqual(value, 'value1')
+        self.assertEqual(self.run_async(self.region.get('key')), 'value1')
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_get_or_create_shares_creator(self):
+        async def run():
+            return await asyncio.gather(*[
+                self.region.get_or_create('key', self._creator)
+                for _ in range(10)])
+
+        self.assertEqual(self.run_async(run()), ['value1'] * 10)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.region._creating, {})
+
+    def test_uncached_value_is_shared_too(self):
+        async def run():
+            return await asyncio.gather(*[
+                self.region.get_or_create('key', self._creator,
+                                          should_cache_fn=lambda v: False)
+                for _ in range(3)])
+
+        self.assertEqual(self.run_async(run()), ['value1'] * 3)
+        self.assertEqual(self.run_async(self.region.get('key')), NO_VALUE)
+
+    def test_creator_error_reaches_waiters(self):
+        async def creator():
+            await asyncio.sleep(0.01)
+            raise ValueError('boom')
+
+        async def run():
+            return await asyncio.gather(*[
+                self.region.get_or_create('key', creator)
+                for _ in range(3)], return_exceptions=True)
+
+        errors = self.run_async(run())
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+        self.assertEqual(self.region._creating, {})
+
+    def test_expired_value_served_while_regenerating(self):
+        region = self._region(expiration_time=1)
+        self.run_async(region.set('key', 'old'))
+        self.cache_dict[region.key_mangler('key')].metadata['ct'] -= 10
+
+        async def run():
+            return await asyncio.gather(*[
+                region.get_or_create('key', self._creator)
+                for _ in range(3)])
+
+        self.assertEqual(self.run_async(run()), ['value1', 'old', 'old'])
+
+    def test_get_or_create_multi(self):
+        async def creator(*keys):
+            self.calls += 1
+            return ['v%s' % key for key in keys]
+
+        self.run_async(self.region.set('b', 'cached'))
+        values = self.run_async(
+            self.region.get_or_create_multi(['a', 'b', 'c', 'a'], creator))
+        self.assertEqual(values, ['va', 'cached', 'vc', 'va'])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.run_async(self.region.get('c')), 'vc')
+        self.assertEqual(
+            self.run_async(self.region.get_or_create_multi([], creator)), [])
+
+    def test_cache_on_arguments(self):
+        @self.region.cache_on_arguments()
+        async def double(x):
+            self.calls += 1
+            return x * 2
+
+        self.assertEqual(self.run_async(double(2)), 4)
+        self.assertEqual(self.run_async(double(2)), 4)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.run_async(double.get(2)), 4)
+        self.run_async(double.invalidate(2))
+        self.assertEqual(self.run_async(double.get(2)), NO_VALUE)
+        self.run_async(double.set(5, 2))
+        self.assertEqual(self.run_async(double(2)), 5)
+
+    def test_invalidation_is_shared(self):
+        other = self._region()
+        self.run_async(self.region.set('key', 'value'))
+        self.run_async(other.invalidate())
+        self.assertEqual(self.run_async(self.region.get('key')), NO_VALUE)
+
+        # the synchronous region sees it as well
+        sync_region = cache.create_region(name='test')
+        cache.configure_cache_region(sync_region, {
+            'backend': 'dogpile.cache.memory',
+            'arguments': {'cache_dict': self.cache_dict},
+        })
+        self.assertTrue(sync_region._hard_invalidated)
+        sync_region.invalidate(hard=False)
+        invalidation = self.run_async(self.region.refresh_invalidation())
+        self.assertIsNone(invalidation['hard'])
+        self.assertEqual(invalidation['soft'],
+                         sync_region._soft_invalidated)
+
+    def test_hard_invalidation_forces_creation(self):
+        self.run_async(self.region.get_or_create('key', self._creator))
+        self.run_async(self.region.invalidate())
+        value = self.run_async(self.region.get_or_create('key', self._creator))
+        self.assertEqual(value, 'value2')
+
+    def test_soft_invalidation_requires_expiration_time(self):
+        self.run_async(self.region.invalidate(hard=False))
+        self.assertRaises(
+            exception.DogpileCacheException, self.run_async,
+            self.region.get_or_create('key', self._creator))
+
+    def test_invalidation_staleness(self):
+        region = self._region(invalidation_staleness=60)
+        other = self._region()
+        self.run_async(region.get_or_create('key', self._creator))
+        self.run_async(other.invalidate())
+        # still within the staleness window
+        self.assertEqual(self.run_async(region.get('key')), 'value1')
+        self.run_async(region.refresh_invalidation())
+        self.assertEqual(self.run_async(region.get('key')), NO_VALUE)
+
+
+class AsyncRedisBackendTest(_AsyncTestCase):
+
+    hosts = {
+        0: {'port': 6379},
+        1: {'port': 6479},
+        2: {'port': 6579},
+    }
+
+    def setUp(self):
+        super(AsyncRedisBackendTest, self).setUp()
+        self.clients = {}
+
+    def _client_factory(self, host_name, host_config):
+        client = self.clients[host_name] = FakeAsyncRedis()
+        return client
+
+    def _exercise(self, region):
+        async def creator(*keys):
+            return [key.upper() for key in keys]
+
+        keys = ['key%d' % i for i in range(20)]
+        values = self.run_async(region.get_or_create_multi(keys, creator))
+        self.assertEqual(values, [key.upper() for key in keys])
+        self.assertEqual(self.run_async(region.get_multi(keys)), values)
+        self.run_async(region.delete_multi(keys[:10]))
+        self.assertEqual(self.run_async(region.get('key0')), NO_VALUE)
+        self.assertEqual(self.run_async(region.get('key19')), 'KEY19')
+
+    def test_rc_backend(self):
+        region = aio.create_region(name='rc')
+        aio.configure_cache_region(region, {
+            'backend': 'dogpile_cachetool.aio.redis_rc',
+            'arguments': {
+                'hosts': self.hosts,
+                'client_factory': self._client_factory,
+                'redis_expiration_time': 60,
+                'serializer': 'json',
+            },
+        })
+        self._exercise(region)
+        self.assertEqual(sorted(self.clients), [0, 1, 2])
+        for client in self.clients.values():
+            self.assertTrue(client.data)
+            self.assertNotIn('get', client.calls)
+
+    def test_cluster_backend(self):
+        client = FakeAsyncRedis()
+        region = aio.create_region(name='cluster')
+        aio.configure_cache_region(region, {
+            'backend': 'dogpile_cachetool.aio.rediscluster',
+            'arguments': {'client': client, 'compression': 'zlib'},
+        })
+        self._exercise(region)
+        self.assertEqual(client.calls.count('mset'), 1)
+
+    def test_values_are_readable_by_sync_codec(self):
+        backend = backends.AsyncRedisClusterBackend(
+            {'client': FakeAsyncRedis()})
+        self.run_async(backend.set(b'k', 'v'))
+        data = backend.client.data[b'k']
+        self.assertEqual(backend.codec.loads(data), 'v')
+
+
+class KetamaTest(unittest2.TestCase):
+
+    def test_host_identity_matches_rc(self):
+        self.assertEqual(
+            _ketama.host_identity({'port': 6479}),
+            '<HostConfig db=0 host=localhost port=6479 '
+            'unix_socket_path=None>')
+
+    def test_keys_are_spread(self):
+        ring = _ketama.HashRing(AsyncRedisBackendTest.hosts)
+        nodes = set(ring.get_node(b'key%d' % i) for i in range(100))
+        self.assertEqual(nodes, set([0, 1, 2]))
+        self.assertEqual(ring.get_node(u'key1'), ring.get_node(b'key1'))
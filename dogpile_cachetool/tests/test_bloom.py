@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import time
+
+import unittest2
+
+from dogpile_cachetool import bloom
+
+
+class CountingBloomFilterTest(unittest2.TestCase):
+
+    def test_add_and_discard(self):
+        f = bloom.CountingBloomFilter(100)
+        f.add(b'a')
+        f.add(u'é')
+        self.assertIn(b'a', f)
+        self.assertIn(u'é', f)
+        self.assertNotIn(b'b', f)
+        f.discard(b'a')
+        f.discard(b'b')
+        self.assertNotIn(b'a', f)
+        self.assertIn(u'é', f)
+
+    def test_error_rate(self):
+        f = bloom.CountingBloomFilter(1000, error_rate=.01)
+        for i in range(1000):
+            f.add(('key %d' % i).encode('ascii'))
+        false_positives = sum(
+            ('other %d' % i).encode('ascii') in f for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_saturated_counters_stay(self):
+        f = bloom.CountingBloomFilter(10)
+        for _ in range(300):
+            f.add(b'a')
+        f.discard(b'a')
+        self.assertIn(b'a', f)
+
+
+class PresenceFilterTest(unittest2.TestCase):
+
+    def test_rebuild_forgets_unused_keys(self):
+        f = bloom.PresenceFilter(capacity=100)
+        f.add(b'a')
+        f.add(b'b')
+        f.rebuild()
+        self.assertIn(b'a', f)
+        f.add(b'a')
+        f.rebuild()
+        self.assertIn(b'a', f)
+        self.assertNotIn(b'b', f)
+
+    def test_periodic_rebuild(self):
+        f = bloom.PresenceFilter(capacity=100, rebuild_interval=60)
+        f.add(b'a')
+        f.rebuilt_at = time.time() - 61
+        self.assertIn(b'a', f)
+        self.assertIsNotNone(f.previous)
+        f.rebuilt_at = time.time() - 61
+        self.assertNotIn(b'a', f)
+
+    def test_discard(self):
+        f = bloom.PresenceFilter(capacity=100)
+        f.add(b'a')
+        f.rebuild()
+        f.add(b'a')
+        f.discard(b'a')
+        self.assertNotIn(b'a', f)
+
+    def test_clear(self):
+        f = bloom.PresenceFilter(capacity=100)
+        f.add(b'a')
+        f.clear()
+        self.assertNotIn(b'a', f)
+
+    def test_known_missing(self):
+        f = bloom.PresenceFilter(capacity=100)
+        self.assertFalse(f.known_missing(b'a'))
+        f.add_missing(b'a')
+        self.assertTrue(f.known_missing(b'a'))
+        f.add(b'a')
+        self.assertFalse(f.known_missing(b'a'))
+
+        f.add_missing(b'b')
+        f.rebuild()
+        self.assertTrue(f.known_missing(b'b'))
+        f.rebuild()
+        self.assertFalse(f.known_missing(b'b'))
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
 import copy
+import threading
+import time
 import unittest2
 
+from dogpile.cache import exception
 from dogpile.cache import proxy
+from dogpile.cache import register_backend
+from dogpile.cache.api import CachedValue
+from dogpile.cache.backends.memory import MemoryBackend
+from dogpile.cache.region import value_version
 
 from dogpile_cachetool import core as cache
 
@@ -102,3 +109,494 @@ class CacheRegionTest(unittest2.TestCase):
     def test_configure_non_region_object_raises_error(self):
         self.assertRaises(TypeError, cache.configure_cache_region,
                           "xxxxxxx", {})
+
+
+class CountingProxy(proxy.ProxyBackend):
+    def __init__(self):
+        super(CountingProxy, self).__init__()
+        self.reads = 0
+
+    def get(self, key):
+        self.reads += 1
+        return self.proxied.get(key)
+
+    def get_multi(self, keys):
+        self.reads += 1
+        return self.proxied.get_multi(keys)
+
+
+class InvalidationStalenessTest(unittest2.TestCase):
+    def setUp(self):
+        super(InvalidationStalenessTest, self).setUp()
+        self.cache_dict = {}
+        self.region = self._region(invalidation_staleness=60)
+        self.other = self._region()
+
+    def _region(self, **conf):
+        region = cache.create_region(name='shared')
+        conf.update({
+            'backend': 'dogpile.cache.memory',
+            'expiration_time': 60,
+            'arguments': {'cache_dict': self.cache_dict},
+        })
+        cache.configure_cache_region(region, conf)
+        region.wrap(CountingProxy)
+        return region
+
+    def test_reads_do_not_hit_backend_for_invalidation_state(self):
+        self.region.get_or_create('key', lambda: 'value')
+        self.region.refresh_invalidation()
+        reads = self.region.backend.reads
+        for _ in range(10):
+            self.assertEqual(
+                self.region.get_or_create('key', lambda: 'other'), 'value')
+        self.assertEqual(self.region.backend.reads, reads + 10)
+
+    def test_local_invalidation_is_visible_immediately(self):
+        self.region.get_or_create('key', lambda: 'value')
+        time.sleep(.01)
+        self.region.invalidate()
+        self.assertEqual(
+            self.region.get_or_create('key', lambda: 'new value'),
+            'new value')
+
+    def test_remote_invalidation_is_visible_after_refresh(self):
+        self.region.get_or_create('key', lambda: 'value')
+        self.region.refresh_invalidation()
+        time.sleep(.01)
+        self.other.invalidate()
+        self.assertEqual(self.other.get('key'), NO_VALUE)
+        self.assertEqual(self.region.get('key'), 'value')
+
+        self.region.refresh_invalidation()
+        self.assertEqual(self.region.get('key'), NO_VALUE)
+
+    def test_snapshot_is_not_refreshed_under_flights_lock(self):
+        self.region.get_or_create_multi(['a'], lambda *keys: list(keys))
+        self.region.invalidation_staleness = .01
+        time.sleep(.02)
+
+        backend = self.region.backend
+        get_multi = backend.get_multi
+        locked = []
+
+        def checked_get_multi(keys):
+            locked.append(self.region._flights_lock.locked())
+            return get_multi(keys)
+
+        backend.get_multi = checked_get_multi
+        self.assertEqual(
+            self.region.get_or_create_multi(['a'], lambda *keys: ['x']),
+            ['a'])
+        # the values, then the invalidation snapshot
+        self.assertEqual(locked, [False, False])
+
+    def test_staleness_is_bounded(self):
+        self.region.invalidation_staleness = .05
+        self.region.get_or_create('key', lambda: 'value')
+        time.sleep(.01)
+        self.other.invalidate()
+        time.sleep(.1)
+        self.assertEqual(self.region.get('key'), NO_VALUE)
+
+
+class GetOrCreateMultiTest(unittest2.TestCase):
+    def setUp(self):
+        super(GetOrCreateMultiTest, self).setUp()
+        self.region = cache.create_region()
+        cache.configure_cache_region(self.region, {
+            'backend': 'dogpile.cache.memory',
+            'expiration_time': 60,
+        })
+        self.region.wrap(CountingProxy)
+
+    def _creator(self, *keys):
+        return ['value %s' % k for k in keys]
+
+    def test_single_round_trip(self):
+        self.region.get_or_create_multi(['a', 'b', 'c'], self._creator)
+        reads = self.region.backend.reads
+        self.assertEqual(
+            self.region.get_or_create_multi(['c', 'a'], self._creator),
+            ['value c', 'value a'])
+        self.assertEqual(self.region.backend.reads, reads + 1)
+
+    def test_invalidation_is_honored(self):
+        self.region.get_or_create_multi(['a', 'b'], self._creator)
+        time.sleep(.01)
+        self.region.invalidate()
+        self.assertEqual(
+            self.region.get_or_create_multi(['a', 'b'],
+                                            lambda *keys: ['x'] * len(keys)),
+            ['x', 'x'])
+
+    def test_soft_invalidation_requires_expiration_time(self):
+        self.region.invalidate(hard=False)
+        self.assertRaises(exception.DogpileCacheException,
+                          self.region.get_or_create_multi,
+                          ['a'], self._creator, expiration_time=-1)
+
+
+class SingleFlightTest(unittest2.TestCase):
+    def setUp(self):
+        super(SingleFlightTest, self).setUp()
+        self.region = cache.create_region()
+        cache.configure_cache_region(self.region, {
+            'backend': 'dogpile.cache.memory',
+            'expiration_time': 60,
+        })
+        self.created = []
+        self.lock = threading.Lock()
+        self.creating = threading.Event()
+        self.proceed = threading.Event()
+
+    def _slow_creator(self, *keys):
+        with self.lock:
+            self.created.extend(keys)
+        self.creating.set()
+        self.proceed.wait(5)
+        return ['value %s' % k for k in keys]
+
+    def _run(self, keys, results, should_cache_fn=None):
+        results.append(self.region.get_or_create_multi(
+            keys, self._slow_creator, should_cache_fn=should_cache_fn))
+
+    def test_overlapping_key_sets_create_each_key_once(self):
+        first, second = [], []
+        t1 = threading.Thread(target=self._run, args=(['a', 'b', 'c'], first))
+        t1.start()
+        self.creating.wait(5)
+        t2 = threading.Thread(target=self._run, args=(['b', 'c', 'd'], second))
+        t2.start()
+        time.sleep(.05)
+        self.proceed.set()
+        t1.join(5)
+        t2.join(5)
+
+        self.assertEqual(sorted(self.created), ['a', 'b', 'c', 'd'])
+        self.assertEqual(first, [['value a', 'value b', 'value c']])
+        self.assertEqual(second, [['value b', 'value c', 'value d']])
+        self.assertEqual(self.region._flights, {})
+
+    def test_uncached_result_is_shared(self):
+        first, second = [], []
+        never = lambda value: False  # noqa
+        t1 = threading.Thread(target=self._run, args=(['a'], first, never))
+        t1.start()
+        self.creating.wait(5)
+        t2 = threading.Thread(target=self._run, args=(['a'], second, never))
+        t2.start()
+        time.sleep(.05)
+        self.proceed.set()
+        t1.join(5)
+        t2.join(5)
+
+        self.assertEqual(self.created, ['a'])
+        self.assertEqual(second, [['value a']])
+
+    def test_waiters_retry_after_failure(self):
+        calls = []
+
+        def failing_creator(*keys):
+            calls.append(keys)
+            self.creating.set()
+            self.proceed.wait(5)
+            raise ValueError(keys)
+
+        errors = []
+
+        def fail():
+            try:
+                self.region.get_or_create_multi(['a', 'b'], failing_creator)
+            except ValueError as e:
+                errors.append(e)
+
+        t1 = threading.Thread(target=fail)
+        t1.start()
+        self.creating.wait(5)
+        second = []
+        t2 = threading.Thread(target=self._run, args=(['b'], second))
+        t2.start()
+        time.sleep(.05)
+        self.proceed.set()
+        t1.join(5)
+        t2.join(5)
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(second, [['value b']])
+        self.assertEqual(self.region._flights, {})
+
+
+class EarlyRecomputeTest(unittest2.TestCase):
+    def setUp(self):
+        super(EarlyRecomputeTest, self).setUp()
+        self.region = cache.create_region()
+        cache.configure_cache_region(self.region, {
+            'backend': 'dogpile.cache.memory',
+            'expiration_time': 60,
+            'early_recompute_beta': 1.0,
+        })
+
+    def _store(self, key, payload, age, duration):
+        self.region.backend.set(self.region.key_mangler(key), CachedValue(
+            payload, {'ct': time.time() - age, 'v': value_version,
+                      'd': duration}))
+
+    def _stored(self, key):
+        return self.region.backend.get(self.region.key_mangler(key))
+
+    def test_creation_duration_is_recorded(self):
+        def creator():
+            time.sleep(.02)
+            return 'value'
+
+        self.region.get_or_create('key', creator)
+        self.assertGreaterEqual(self._stored('key').metadata['d'], .02)
+
+        self.region.get_or_create_multi(['a', 'b'], lambda *keys: [1, 2])
+        self.assertIn('d', self._stored('a').metadata)
+
+    def test_value_close_to_expiry_is_recomputed(self):
+        # with such a slow creator, recomputation is practically certain
+        self._store('key', 'old', age=59, duration=1e6)
+        self.assertEqual(self.region.get_or_create('key', lambda: 'new'),
+                         'new')
+
+        self._store('a', 'old', age=59, duration=1e6)
+        self.assertEqual(
+            self.region.get_or_create_multi(['a'], lambda *keys: ['new']),
+            ['new'])
+
+    def test_fresh_value_is_kept(self):
+        self._store('key', 'old', age=0, duration=1e-6)
+        self.assertEqual(self.region.get_or_create('key', lambda: 'new'),
+                         'old')
+
+    def test_disabled_by_default(self):
+        self.region.early_recompute_beta = None
+        self._store('key', 'old', age=59, duration=1e6)
+        self.assertEqual(self.region.get_or_create('key', lambda: 'new'),
+                         'old')
+
+    def test_memoization_decorator(self):
+        self.region.early_recompute_beta = None
+        calls = []
+
+        @cache.get_memoization_decorator(self.region, early_recompute_beta=1)
+        def fn(x):
+            calls.append(x)
+            return x
+
+        fn(1)
+        key = list(self.region.backend._cache)[0]
+        value = self.region.backend._cache[key]
+        value.metadata['ct'] -= 59
+        value.metadata['d'] = 1e6
+        fn(1)
+        self.assertEqual(calls, [1, 1])
+
+
+class StreamingMemoryBackend(MemoryBackend):
+    """Memory backend with ``iter_multi``, recording the keys it got."""
+
+    def __init__(self, arguments):
+        super(StreamingMemoryBackend, self).__init__(arguments)
+        self.requested = []
+
+    def iter_multi(self, keys, chunk_size):
+        for key in keys:
+            self.requested.append(key)
+            yield key, self.get(key)
+
+
+register_backend('dogpile_cachetool.tests.streaming_memory',
+                 'dogpile_cachetool.tests.test_cache',
+                 'StreamingMemoryBackend')
+
+
+class IterMultiTest(unittest2.TestCase):
+
+    def _region(self, backend='dogpile.cache.memory'):
+        region = cache.create_region()
+        cache.configure_cache_region(region, {
+            'backend': backend,
+            'expiration_time': 60,
+        })
+        return region
+
+    def _keys(self, n):
+        for i in range(n):
+            yield 'key%d' % i
+
+    def test_iter_multi(self):
+        region = self._region()
+        region.set_multi(dict((key, key.upper()) for key in self._keys(5)))
+        region.backend.get(region.key_mangler('key3')).metadata['ct'] -= 120
+
+        values = region.iter_multi(self._keys(7), chunk_size=2)
+        self.assertEqual(list(values), [
+            ('key0', 'KEY0'), ('key1', 'KEY1'), ('key2', 'KEY2'),
+            ('key3', NO_VALUE), ('key4', 'KEY4'), ('key5', NO_VALUE),
+            ('key6', NO_VALUE),
+        ])
+        self.assertEqual(
+            dict(region.iter_multi(['key3'], ignore_expiration=True)),
+            {'key3': 'KEY3'})
+
+    def test_invalidation(self):
+        region = self._region()
+        region.set('key0', 'value')
+        region.invalidate()
+        self.assertEqual(list(region.iter_multi(['key0'])),
+                         [('key0', NO_VALUE)])
+
+    def test_keys_are_consumed_lazily(self):
+        region = self._region('dogpile_cachetool.tests.streaming_memory')
+        region.set_multi(dict((key, key) for key in self._keys(10)))
+        values = region.iter_multi(self._keys(10), chunk_size=3)
+        self.assertEqual(next(values), ('key0', 'key0'))
+        self.assertEqual(len(region.backend.requested), 1)
+        self.assertEqual(len(list(values)), 9)
+
+
+class NegativeCacheTest(unittest2.TestCase):
+    def setUp(self):
+        super(NegativeCacheTest, self).setUp()
+        self.region = cache.create_region()
+        cache.configure_cache_region(self.region, {
+            'backend': 'dogpile.cache.memory',
+            'expiration_time': 60,
+            'negative_ttl': 10,
+            'presence_filter': {'capacity': 1000},
+        })
+        self.region.wrap(CountingProxy)
+        self.calls = []
+
+    def _lookup(self, key):
+        self.calls.append(key)
+        return None if key.startswith('missing') else 'value %s' % key
+
+    def _lookup_multi(self, *keys):
+        return [self._lookup(key) for key in keys]
+
+    def _age_tombstone(self, key, age):
+        backend_key = self.region.key_mangler(key)
+        value = self.region.backend.get(backend_key)
+        value.metadata['ct'] -= age
+        self.region.backend.set(backend_key, value)
+
+    def test_none_is_remembered(self):
+        for _ in range(3):
+            self.assertIsNone(self.region.get_or_create(
+                'missing', lambda: self._lookup('missing'),
+                should_cache_fn=cache.dont_cache_none))
+        self.assertEqual(self.calls, ['missing'])
+        self.assertIs(self.region.get('missing'), NO_VALUE)
+        self.assertEqual(self.region.get_multi(['missing']), [NO_VALUE])
+
+    def test_tombstone_expires(self):
+        memoized = cache.get_memoization_decorator(
+            self.region, should_cache_fn=cache.dont_cache_none)(self._lookup)
+        self.assertIsNone(memoized('missing'))
+        self.assertIsNone(memoized('missing'))
+        self.assertEqual(self.calls, ['missing'])
+
+        self.region.get_or_create('missing', lambda: None,
+                                  should_cache_fn=cache.dont_cache_none)
+        self._age_tombstone('missing', 11)
+        self.assertEqual(
+            self.region.get_or_create('missing', lambda: 'created',
+                                      should_cache_fn=cache.dont_cache_none),
+            'created')
+
+    def test_tombstone_expires_for_get(self):
+        self.region.get_or_create('missing', lambda: None,
+                                  should_cache_fn=cache.dont_cache_none)
+        self._age_tombstone('missing', 11)
+        self.assertIs(self.region.get('missing'), NO_VALUE)
+
+    def test_multi(self):
+        keys = ['a', 'missing1']
+        for _ in range(2):
+            self.assertEqual(
+                self.region.get_or_create_multi(
+                    keys, self._lookup_multi,
+                    should_cache_fn=cache.dont_cache_none),
+                ['value a', None])
+        self.assertEqual(self.calls, keys)
+
+        self._age_tombstone('missing1', 11)
+        self.region.get_or_create_multi(keys, self._lookup_multi,
+                                        should_cache_fn=cache.dont_cache_none)
+        self.assertEqual(self.calls, keys + ['missing1'])
+
+    def test_disabled_without_negative_ttl(self):
+        self.region.negative_ttl = None
+        for _ in range(2):
+            self.region.get_or_create(
+                'missing', lambda: self._lookup('missing'),
+                should_cache_fn=cache.dont_cache_none)
+        self.assertEqual(self.calls, ['missing', 'missing'])
+
+    def test_async_creation_stores_a_tombstone(self):
+        self.region._set_created('missing', None, .1)
+        self.assertIs(self.region.get('missing'), NO_VALUE)
+        self.assertIsNone(self.region.get_or_create(
+            'missing', lambda: self._lookup('missing'),
+            should_cache_fn=cache.dont_cache_none))
+        self.assertEqual(self.calls, [])
+
+    def test_known_missing_keys_skip_a_lookup(self):
+        self.region.negative_ttl = None
+        backend = self.region.backend
+        for expected_reads in (2, 1, 1):
+            reads = backend.reads
+            self.region.get_or_create('missing',
+                                      lambda: self._lookup('missing'),
+                                      should_cache_fn=cache.dont_cache_none)
+            self.assertEqual(backend.reads, reads + expected_reads)
+        self.assertEqual(self.calls, ['missing'] * 3)
+
+        # stored meanwhile: seen by the lookup made with the lock held
+        self.region.backend.proxied.set(self.region.key_mangler('missing'),
+                                        self.region._value('value'))
+        self.assertEqual(
+            self.region.get_or_create('missing',
+                                      lambda: self._lookup('missing')),
+            'value')
+        self.assertEqual(len(self.calls), 3)
+
+    def test_keys_stored_by_other_regions_are_used(self):
+        cache_dict = {}
+
+        def region():
+            region = cache.create_region()
+            cache.configure_cache_region(region, {
+                'backend': 'dogpile.cache.memory',
+                'expiration_time': 60,
+                'arguments': {'cache_dict': cache_dict},
+                'presence_filter': {'capacity': 1000},
+            })
+            return region
+
+        first, second = region(), region()
+        first.get_or_create('a', lambda: self._lookup('a'))
+        self.assertEqual(second.get_or_create('a', lambda: 'other'),
+                         'value a')
+        self.assertEqual(
+            region().get_or_create_multi(['a', 'b'], self._lookup_multi),
+            ['value a', 'value b'])
+        self.assertEqual(self.calls, ['a', 'b'])
+
+    def test_filter_follows_sets_and_deletes(self):
+        presence_filter = self.region.presence_filter
+        self.region.set('a', 1)
+        self.region.set_multi({'b': 2})
+        self.assertIn(self.region.key_mangler('a'), presence_filter)
+        self.assertIn(self.region.key_mangler('b'), presence_filter)
+        self.assertEqual(self.region.get_or_create('a', lambda: 'other'), 1)
+
+        self.region.delete('a')
+        self.region.delete_multi(['b'])
+        self.assertNotIn(self.region.key_mangler('a'), presence_filter)
+        self.assertNotIn(self.region.key_mangler('b'), presence_filter)
@@ -0,0 +1,57 @@
+import unittest2
+
+from dogpile.cache.api import CachedValue
+
+from dogpile_cachetool import compression
+from dogpile_cachetool import serializers
+
+
+class CompressionTest(unittest2.TestCase):
+
+    big = CachedValue([u'value %d' % (i % 10) for i in range(2000)],
+                      {'ct': 1234.5, 'v': 1})
+
+    def _codec(self, compressor, **kwargs):
+        try:
+            return serializers.ValueCodec(compressor=compressor, **kwargs)
+        except ImportError:
+            raise unittest2.SkipTest('%s is not installed' % compressor)
+
+    def _roundtrip(self, compressor):
+        codec = self._codec(compressor)
+        data = codec.dumps(self.big)
+        self.assertEqual(ord(data[:1]), 0x40 | codec.compressor.id)
+        self.assertEqual(codec.loads(data), self.big)
+        # readable without compression being configured
+        self.assertEqual(serializers.ValueCodec().loads(data), self.big)
+
+        stats = codec.compression_stats.as_dict()
+        self.assertEqual(stats['compressed'], 1)
+        self.assertEqual(stats['decompressed'], 1)
+        self.assertLess(stats['ratio'], 0.5)
+
+    def test_zlib(self):
+        self._roundtrip('zlib')
+
+    def test_lz4(self):
+        self._roundtrip('lz4')
+
+    def test_zstd(self):
+        self._roundtrip('zstd')
+
+    def test_small_values_are_not_compressed(self):
+        codec = self._codec('zlib', compress_threshold=64)
+        data = codec.dumps('small')
+        self.assertEqual(data, serializers.ValueCodec().dumps('small'))
+        self.assertEqual(codec.loads(data), 'small')
+        self.assertEqual(codec.compression_stats.skipped, 1)
+
+    def test_compresses_other_serializers(self):
+        codec = serializers.ValueCodec('json', compressor='zlib')
+        data = codec.dumps(self.big)
+        self.assertEqual(codec.loads(data), self.big)
+
+    def test_unknown_compression(self):
+        self.assertRaises(ValueError, compression.get_compressor, 'rar')
+        self.assertRaises(ValueError, serializers.ValueCodec().loads,
+                          b'\x7fxxx')
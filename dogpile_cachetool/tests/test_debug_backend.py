@@ -0,0 +1,70 @@
+import logging
+
+import unittest2
+
+from dogpile_cachetool import core as cache
+from dogpile_cachetool.backends.debug import _DebugProxy
+
+
+_LOGGER = 'dogpile_cachetool.backends.debug'
+
+
+class Unprintable(object):
+
+    def __repr__(self):
+        raise AssertionError('formatted')
+
+
+class DebugProxyTest(unittest2.TestCase):
+
+    def _region(self, debug):
+        region = cache.create_region()
+        cache.configure_cache_region(region, {
+            'backend': 'dogpile.cache.memory',
+            'debug': debug,
+        })
+        return region
+
+    def test_configure_with_arguments(self):
+        region = self._region({'sample_rate': .5, 'keys_only': True})
+        self.assertIsInstance(region.backend, _DebugProxy)
+        self.assertEqual(region.backend.sample_rate, .5)
+        self.assertTrue(region.backend.keys_only)
+
+    def test_values_are_truncated(self):
+        region = self._region({'max_repr': 20})
+        with self.assertLogs(_LOGGER, 'DEBUG') as logs:
+            region.set('key', 'x' * 1000)
+            region.set_multi({'a': list(range(1000))})
+        self.assertTrue(all(len(line) < 200 for line in logs.output))
+
+    def test_keys_only(self):
+        region = self._region({'keys_only': True})
+        with self.assertLogs(_LOGGER, 'DEBUG') as logs:
+            region.set('key', Unprintable())
+            region.get('key')
+            region.get_multi(['key', 'other'])
+        output = '\n'.join(logs.output)
+        self.assertIn("'key'\" Value: \"<hit>\"", output)
+        self.assertIn('<1 hits>', output)
+
+    def test_nothing_formatted_when_not_logging(self):
+        region = self._region(True)
+        logger = logging.getLogger(_LOGGER)
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            region.set('key', Unprintable())
+            region.get('key')
+        finally:
+            logger.setLevel(level)
+
+    def test_sampling(self):
+        region = self._region({'sample_rate': 0})
+        logger = logging.getLogger(_LOGGER)
+        logger.setLevel(logging.DEBUG)
+        try:
+            region.set('key', Unprintable())
+            region.get('key')
+        finally:
+            logger.setLevel(logging.NOTSET)
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 import itertools
+
+from dogpile.cache import util
 import unittest2
 
 from dogpile_cachetool import core as cache
@@ -52,3 +54,47 @@ class DecoratorTest(unittest2.TestCase):
         go = self._multi_fixture(namespace=u'unicode')
         self.assertEqual(go('a', u'中文'), ['1 a', u'1 中文'])
         self.assertEqual(go(u'b', u'中文'), [u'2 b', u'1 中文'])
+
+
+def _sample(a, b=2, c=3):
+    pass
+
+
+class _Sample(object):
+
+    def method(self, a, b=2):
+        pass
+
+
+class KeyGeneratorTest(unittest2.TestCase):
+
+    def test_keys_match_dogpile(self):
+        for namespace in (None, 'ns', b'bytes', u'中文'):
+            expected = util.function_key_generator(
+                cache._key_generate_to_str(namespace), _sample,
+                to_str=cache._key_generate_to_str)
+            generate = cache.function_key_generator(namespace, _sample)
+            for args in [(1,), ('a', u'中文'), (b'b', 1.5, None),
+                         (True, [1], object)]:
+                self.assertEqual(generate(*args), expected(*args))
+
+    def test_multi_keys_match_dogpile(self):
+        expected = util.function_multi_key_generator(
+            'None', _sample, to_str=cache._key_generate_to_str)
+        generate = cache.function_multi_key_generator(None, _sample)
+        args = (1, 'a', u'中文', b'b')
+        self.assertEqual(generate(*args), expected(*args))
+
+    def test_keyword_arguments(self):
+        generate = cache.function_key_generator('ns', _sample)
+        self.assertEqual(generate(1, b=5), generate(1, 5))
+        self.assertEqual(generate(a=1), generate(1))
+        self.assertEqual(generate(1, c=5), generate(1, 2, 5))
+        self.assertRaises(ValueError, generate, 1, d=5)
+        self.assertRaises(TypeError, generate, 1, a=5)
+        self.assertRaises(TypeError, generate, b=5)
+
+    def test_self_is_skipped(self):
+        generate = cache.function_key_generator('ns', _Sample.method)
+        self.assertEqual(generate(_Sample(), 1), generate(_Sample(), a=1))
+        self.assertTrue(generate(_Sample(), 1).endswith('|ns|1'))
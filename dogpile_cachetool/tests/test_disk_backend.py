@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+import time
+
+from dogpile.cache.api import NO_VALUE
+import unittest2
+
+import dogpile_cachetool
+from dogpile_cachetool.backends import disk
+from dogpile_cachetool.backends.disk import DiskBackend
+from . import _fixtures
+
+
+def setup_module(module):
+    dogpile_cachetool.register_backend()
+
+
+class DiskBackendTest(_fixtures._GenericBackendTest):
+
+    backend = 'dogpile_cachetool.disk'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tempdir = tempfile.mkdtemp()
+        cls.config_args = {'arguments': {'path': cls.tempdir}}
+        super(DiskBackendTest, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tempdir)
+        super(DiskBackendTest, cls).tearDownClass()
+
+    def setUp(self):
+        super(DiskBackendTest, self).setUp()
+        # the directory is locked by the backend using it
+        self.config_args = {
+            'arguments': {'path': tempfile.mkdtemp(dir=self.tempdir)},
+        }
+
+
+class DiskTest(unittest2.TestCase):
+
+    def setUp(self):
+        super(DiskTest, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def _disk(self, **arguments):
+        arguments.setdefault('path', self.path)
+        backend = DiskBackend(arguments)
+        self.addCleanup(backend.close)
+        return backend
+
+    def _log_size(self):
+        return os.path.getsize(os.path.join(self.path, disk._LOG_NAME))
+
+    def test_persistence(self):
+        backend = self._disk()
+        backend.set_multi({'a': 1, 'b': 2, 'c': 3})
+        backend.set('a', 4)
+        backend.delete('b')
+        backend.close()
+
+        backend = self._disk()
+        self.assertEqual(backend.get_multi(['a', 'b', 'c']), [4, NO_VALUE, 3])
+
+    def test_single_process(self):
+        self._disk()
+        self.assertRaises(ValueError, DiskBackend, {'path': self.path})
+
+    def test_incomplete_record_is_cut(self):
+        backend = self._disk()
+        backend.set('a', 1)
+        size = self._log_size()
+        backend.set('b', 'x' * 100)
+        backend.close()
+        with open(os.path.join(self.path, disk._LOG_NAME), 'r+b') as f:
+            f.truncate(size + 50)
+
+        backend = self._disk()
+        self.assertEqual(backend.get_multi(['a', 'b']), [1, NO_VALUE])
+        self.assertEqual(self._log_size(), size)
+        backend.set('c', 3)
+        self.assertEqual(backend.get('c'), 3)
+
+    def test_corrupt_record_is_cut(self):
+        backend = self._disk()
+        backend.set('a', 1)
+        size = self._log_size()
+        backend.set('b', 2)
+        backend.close()
+        with open(os.path.join(self.path, disk._LOG_NAME), 'r+b') as f:
+            f.seek(size + disk._RECORD.size)
+            f.write(b'?')
+
+        backend = self._disk()
+        self.assertEqual(backend.get_multi(['a', 'b']), [1, NO_VALUE])
+
+    def test_ttl(self):
+        backend = self._disk(ttl=60)
+        backend.bulk_set({'a': 1, 'b': 2}, ttl={'b': -1})
+        self.assertEqual(backend.get_multi(['a', 'b']), [1, NO_VALUE])
+        entry = backend._index[b'a']
+        self.assertAlmostEqual(entry[2], time.time() + 60, delta=5)
+
+    def test_bulk_set_nx(self):
+        backend = self._disk()
+        backend.set('a', 1)
+        self.assertEqual(backend.bulk_set({'a': 2, 'b': 3}, nx=True),
+                         {'a': False, 'b': True})
+        self.assertEqual(backend.get_multi(['a', 'b']), [1, 3])
+
+    def test_compact(self):
+        backend = self._disk()
+        for i in range(10):
+            backend.set_multi({'a': i, 'b': 'x' * 100})
+        backend.delete('b')
+        size = self._log_size()
+        view = backend._view(b'a')
+
+        backend.compact()
+        self.assertLess(self._log_size(), size)
+        self.assertEqual(backend.get('a'), 9)
+        # views taken before stay valid
+        self.assertEqual(backend.codec.loads(view), 9)
+        backend.set('c', 3)
+        backend.close()
+
+        backend = self._disk()
+        self.assertEqual(backend.get_multi(['a', 'b', 'c']), [9, NO_VALUE, 3])
+
+    def test_compaction_in_background(self):
+        backend = self._disk(compact_min_bytes=0)
+        for i in range(10):
+            backend.set('a', i)
+        backend._compactor.join()
+        self.assertLess(self._log_size(), backend._size + 200)
+        self.assertEqual(backend.get('a'), 9)
+
+    def test_writes_during_compaction_are_kept(self):
+        backend = self._disk()
+        backend.set_multi({'a': 1, 'b': 2})
+        original_pack = disk._pack
+        calls = []
+
+        def pack(*args):
+            # writes landing after the live entries started being copied
+            if not calls:
+                calls.append(args)
+                backend.set('a', 3)
+                backend.delete('b')
+                backend.set('c', 4)
+            return original_pack(*args)
+
+        disk._pack = pack
+        try:
+            backend.compact()
+        finally:
+            disk._pack = original_pack
+        self.assertEqual(backend.get_multi(['a', 'b', 'c']), [3, NO_VALUE, 4])
+        backend.close()
+
+        backend = self._disk()
+        self.assertEqual(backend.get_multi(['a', 'b', 'c']), [3, NO_VALUE, 4])
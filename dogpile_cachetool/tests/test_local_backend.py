@@ -0,0 +1,223 @@
+import time
+import unittest2
+
+from dogpile_cachetool import core as cache
+from dogpile_cachetool.backends import _tinylfu
+from dogpile_cachetool.backends import local
+
+
+NO_VALUE = cache.NO_VALUE
+
+
+class LRUStoreTest(unittest2.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        store = local._LRUStore(max_entries=2)
+        store.set('a', 1)
+        store.set('b', 2)
+        store.get('a')
+        store.set('c', 3)
+        self.assertEqual(store.get('a'), 1)
+        self.assertEqual(store.get('b'), NO_VALUE)
+        self.assertEqual(store.get('c'), 3)
+
+    def test_evicts_by_bytes(self):
+        store = local._LRUStore(max_bytes=10, sizeof=len)
+        store.set('a', 'xxxx')
+        store.set('b', 'yyyy')
+        store.set('c', 'zzzz')
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.total_bytes, 8)
+        self.assertEqual(store.get('a'), NO_VALUE)
+
+    def test_oversized_value_is_not_stored(self):
+        store = local._LRUStore(max_bytes=3, sizeof=len)
+        store.set('a', 'xx')
+        store.set('a', 'xxxx')
+        self.assertEqual(store.get('a'), NO_VALUE)
+        self.assertEqual(store.total_bytes, 0)
+
+    def test_ttl(self):
+        store = local._LRUStore(ttl=10)
+        now = time.time()
+        store.set('a', 1, now)
+        self.assertEqual(store.get('a', now + 5), 1)
+        self.assertEqual(store.get('a', now + 10), NO_VALUE)
+        self.assertEqual(len(store), 0)
+
+
+class LocalCacheProxyTest(unittest2.TestCase):
+
+    def setUp(self):
+        super(LocalCacheProxyTest, self).setUp()
+        self.region = cache.create_region()
+        cache.configure_cache_region(self.region, {
+            'backend': 'dogpile.cache.memory',
+            'expiration_time': 60,
+            'proxies': [{
+                'class': 'dogpile_cachetool.backends.local.LocalCacheProxy',
+                'arguments': {'ttl': 120, 'max_bytes': 1024 * 1024},
+            }],
+        })
+        self.proxy = self.region.backend
+        self.remote = self.proxy.proxied
+
+    def test_ttl_is_capped_by_expiration_time(self):
+        self.assertEqual(self.proxy.store.ttl, 60)
+
+    def test_ttl_is_required(self):
+        self.assertRaises(ValueError, local.LocalCacheProxy, {})
+        proxy = local.LocalCacheProxy({'expiration_time': 30})
+        self.assertEqual(proxy.store.ttl, 30)
+
+    def test_get_is_served_locally(self):
+        self.region.set('key', 'value')
+        self.remote.delete(self.region.key_mangler('key'))
+        self.assertEqual(self.region.get('key'), 'value')
+        self.assertEqual(self.proxy.stats()['hits'], 1)
+
+    def test_miss_populates_local_tier(self):
+        self.remote.set(b'key', self.region._value('value'))
+        self.assertEqual(self.proxy.get(b'key').payload, 'value')
+        self.assertEqual(self.proxy.get(b'key').payload, 'value')
+        self.assertEqual(self.proxy.stats()['misses'], 1)
+        self.assertEqual(self.proxy.stats()['hits'], 1)
+
+    def test_multi(self):
+        self.region.set_multi({'a': 1, 'b': 2})
+        self.proxy.store.clear()
+        self.region.set('c', 3)
+        values = self.proxy.get_multi([b'a', b'b', b'c', b'd'])
+        self.assertEqual([v.payload for v in values], [1, 2, 3, NO_VALUE])
+        stats = self.proxy.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 3)
+
+        self.region.delete_multi(['a', 'c'])
+        self.assertEqual(self.region.get_multi(['a', 'b', 'c']),
+                         [NO_VALUE, 2, NO_VALUE])
+
+
+class LocalBackendTest(unittest2.TestCase):
+
+    def test_bounded(self):
+        backend = local.LocalBackend({'max_entries': 2})
+        backend.set_multi({'a': 1, 'b': 2})
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertEqual(backend.get_multi(['a', 'b', 'c']), [1, NO_VALUE, 3])
+        backend.delete_multi(['a', 'c'])
+        self.assertEqual(backend.get_multi(['a', 'c']), [NO_VALUE, NO_VALUE])
+
+
+class CountMinSketchTest(unittest2.TestCase):
+
+    def test_estimate_and_aging(self):
+        sketch = _tinylfu._CountMinSketch(1024)
+        for _ in range(5):
+            sketch.increment('a')
+        sketch.increment('b')
+        self.assertEqual(sketch.estimate('a'), 5)
+        self.assertEqual(sketch.estimate('b'), 1)
+        self.assertEqual(sketch.estimate('c'), 0)
+
+        sketch._reset()
+        self.assertEqual(sketch.estimate('a'), 2)
+        self.assertEqual(sketch.estimate('b'), 0)
+
+    def test_counters_saturate(self):
+        sketch = _tinylfu._CountMinSketch(1024)
+        for _ in range(100):
+            sketch.increment('a')
+        self.assertEqual(sketch.estimate('a'), 15)
+
+
+class TinyLFUStoreTest(unittest2.TestCase):
+
+    def _store(self, **kwargs):
+        kwargs.setdefault('max_entries', 100)
+        kwargs.setdefault('window_ratio', .1)
+        return _tinylfu._TinyLFUStore(**kwargs)
+
+    def test_scan_does_not_flush_hot_keys(self):
+        store = self._store()
+        hot = ['hot%d' % i for i in range(50)]
+        for _ in range(5):
+            for key in hot:
+                if store.get(key) is NO_VALUE:
+                    store.set(key, key)
+        for i in range(1000):
+            key = 'scan%d' % i
+            if store.get(key) is NO_VALUE:
+                store.set(key, key)
+
+        # an LRU would keep none; the sketch may overrate a few scan keys
+        kept = sum(store.get(key) == key for key in hot)
+        self.assertGreaterEqual(kept, 45)
+        self.assertLessEqual(len(store), 100)
+        self.assertGreater(store.rejected, 900)
+        self.assertLess(store.admission_rate(), .1)
+
+    def test_admits_more_frequent_keys(self):
+        store = self._store(max_entries=10)
+        for i in range(10):
+            store.set(i, i)
+        for _ in range(5):
+            store.get('new')
+        store.set('new', 'value')
+        store.set('other', 'value')
+        self.assertEqual(store.get('new'), 'value')
+        self.assertEqual(len(store), 10)
+
+    def test_byte_weighted(self):
+        store = self._store(max_bytes=100, sizeof=len)
+        store.set('a', 'x' * 50)
+        store.set('b', 'x' * 40)
+        self.assertEqual(store.total_bytes, 90)
+        store.set('c', 'x' * 101)
+        self.assertIs(store.get('c'), NO_VALUE)
+        store.set('a', 'x' * 80)
+        self.assertLessEqual(store.total_bytes, 100)
+        self.assertEqual(store.get('a'), 'x' * 80)
+
+    def test_ttl_and_delete(self):
+        store = self._store(ttl=10)
+        store.set('a', 1, now=100)
+        store.set('b', 2, now=100)
+        self.assertEqual(store.get('a', now=105), 1)
+        self.assertIs(store.get('a', now=111), NO_VALUE)
+        store.delete('b')
+        self.assertIs(store.get('b'), NO_VALUE)
+        self.assertEqual(len(store), 0)
+
+    def test_requires_a_capacity(self):
+        self.assertRaises(ValueError, _tinylfu._TinyLFUStore)
+
+
+class TinyLFUPolicyTest(unittest2.TestCase):
+
+    def test_backend(self):
+        backend = local.LocalBackend({'policy': 'tinylfu', 'max_entries': 10})
+        backend.set_multi({'a': 1, 'b': 2})
+        self.assertEqual(backend.get_multi(['a', 'b', 'c']), [1, 2, NO_VALUE])
+        stats = backend.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['admission_rate'], 1.0)
+
+    def test_proxy(self):
+        region = cache.create_region()
+        cache.configure_cache_region(region, {
+            'backend': 'dogpile.cache.memory',
+            'proxies': [{
+                'class': 'dogpile_cachetool.backends.local.LocalCacheProxy',
+                'arguments': {'policy': 'tinylfu', 'max_entries': 100,
+                              'ttl': 60},
+            }],
+        })
+        region.set('a', 1)
+        self.assertEqual(region.get('a'), 1)
+        stats = region.backend.stats()
+        self.assertEqual((stats['hits'], stats['admitted']), (1, 0))
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, local.LocalBackend, {'policy': 'lfu'})
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import hashlib
+from hashlib import sha1
+
+import six
+import unittest2
+
+from dogpile_cachetool import core as cache
+from dogpile_cachetool import mangling
+
+
+def _legacy_mangle_key(key):
+    try:
+        key = key.encode('utf-8', errors='xmlcharrefreplace')
+    except (UnicodeError, AttributeError):
+        pass
+
+    if len(key) > 512:
+        hashed = sha1(key).hexdigest().encode('utf-8')
+        klen = 512 - len(hashed) - 1
+        key = key[:klen] + b'-' + hashed
+    return key
+
+
+def _legacy_prefixed(region_name, key):
+    if isinstance(key, six.text_type):
+        key = key.encode('utf-8', errors='xmlcharrefreplace')
+    return region_name.encode('utf-8') + b'.' + key
+
+
+KEYS = [
+    u'fake',
+    u'fäké1',
+    b'\xcf\x84o\xcf\x81\xce\xbdo\xcf\x82',
+    u'fake' * 256,
+    u'fäké' * 300,
+]
+
+
+requires_blake2b = unittest2.skipUnless(
+    hasattr(hashlib, 'blake2b'), 'blake2b is not available')
+
+
+class KeyManglerTest(unittest2.TestCase):
+
+    def test_default_mangler_is_compatible(self):
+        for key in KEYS:
+            self.assertEqual(cache._mangle_key(key), _legacy_mangle_key(key))
+
+    def test_create_key_mangler_is_compatible(self):
+        mangler = cache.create_key_mangler('users')
+        for key in KEYS:
+            self.assertEqual(mangler(key), _legacy_prefixed('users', key))
+        self.assertEqual(cache.create_key_mangler()(u'a'), b'_.a')
+
+    @requires_blake2b
+    def test_fast_hashes(self):
+        for digest_size, hex_size in ((None, 32), (8, 16)):
+            mangler = mangling.KeyMangler(hash='blake2b',
+                                          digest_size=digest_size)
+            key = mangler(u'x' * 1000)
+            self.assertEqual(len(key), 512)
+            self.assertEqual(len(key.rpartition(b'-')[2]), hex_size)
+            self.assertEqual(mangler(u'short'), b'short')
+
+    def test_unknown_hash(self):
+        self.assertRaises(KeyError, mangling.KeyMangler, hash='md4')
+        self.assertRaises(ValueError, mangling.KeyMangler, digest_size=8)
+
+    def test_memo_is_bounded(self):
+        mangler = mangling.KeyMangler(memo_size=2)
+        for key in (u'a', u'b', u'c'):
+            mangler(key)
+        self.assertEqual(len(mangler._memo), 1)
+        self.assertEqual(mangler(u'a'), b'a')
+
+    def test_non_string_keys(self):
+        mangler = mangling.KeyMangler(prefix='p')
+        self.assertEqual(mangler(42), b'p.42')
+        self.assertEqual(mangler(1), b'p.1')
+        self.assertEqual(mangler(True), b'p.True')
+        self.assertEqual(cache.create_key_mangler('users')(7), b'users.7')
+
+    def test_mangle_multi(self):
+        mangler = mangling.KeyMangler(prefix='p')
+        mangler(u'a')
+        self.assertEqual(mangler.mangle_multi(iter([u'a', u'b'])),
+                         [b'p.a', b'p.b'])
+        self.assertEqual(mangling.mangle_keys(None, (u'a',)), [u'a'])
+        self.assertEqual(mangling.mangle_keys(lambda k: k * 2, [u'a']),
+                         [u'aa'])
+
+    @requires_blake2b
+    def test_configure_cache_region(self):
+        region = cache.create_region()
+        cache.configure_cache_region(region, {
+            'backend': 'dogpile.cache.memory',
+            'key_mangler': {'hash': 'blake2b', 'max_key_size': 100},
+        })
+        region.set(u'x' * 200, 1)
+        self.assertEqual(region.get(u'x' * 200), 1)
+        [key] = region.backend._cache
+        self.assertEqual(len(key), 100)
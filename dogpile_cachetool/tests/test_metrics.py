@@ -0,0 +1,177 @@
+from dogpile.cache import register_backend
+from dogpile.cache.api import NO_VALUE
+from dogpile.cache.backends.memory import MemoryBackend
+import unittest2
+
+from dogpile_cachetool import core as cache
+from dogpile_cachetool import metrics
+from dogpile_cachetool import serializers
+from dogpile_cachetool.backends.metrics import MetricsProxy
+
+
+class SerializingMemoryBackend(MemoryBackend):
+    """Memory backend storing values serialized, like the Redis ones."""
+
+    def __init__(self, arguments):
+        super(SerializingMemoryBackend, self).__init__(arguments)
+        self.codec = serializers.ValueCodec()
+
+    def get(self, key):
+        data = self._cache.get(key)
+        if data is None:
+            return NO_VALUE
+        return self.codec.loads(data)
+
+    def set(self, key, value):
+        self._cache[key] = self.codec.dumps(value)
+
+
+register_backend('dogpile_cachetool.tests.serializing_memory',
+                 'dogpile_cachetool.tests.test_metrics',
+                 'SerializingMemoryBackend')
+
+
+class FakeSocket(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, address):
+        self.sent.append((data, address))
+
+
+class HistogramTest(unittest2.TestCase):
+
+    def test_observe(self):
+        histogram = metrics.Histogram([.1, 1])
+        for value in (.05, .1, .5, 2):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 2.65)
+
+    def test_quantile(self):
+        histogram = metrics.Histogram([.1, 1])
+        self.assertIsNone(histogram.quantile(.5))
+        for value in (.05, .05, .05, .5):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(.5), .1)
+        self.assertEqual(histogram.quantile(1), 1)
+        histogram.observe(5)
+        self.assertIsNone(histogram.quantile(1))
+
+
+class GetSinkTest(unittest2.TestCase):
+
+    def test_get_sink(self):
+        self.assertIsInstance(metrics.get_sink(), metrics.InMemorySink)
+        sink = metrics.InMemorySink()
+        self.assertIs(metrics.get_sink(sink), sink)
+        self.assertIsInstance(
+            metrics.get_sink('dogpile_cachetool.metrics.StatsdSink',
+                             {'port': 9125}),
+            metrics.StatsdSink)
+
+
+class StatsdSinkTest(unittest2.TestCase):
+
+    def test_record(self):
+        sink = metrics.StatsdSink(prefix='app')
+        sink._socket = FakeSocket()
+        sink.record('my region', 'get_multi', .002, keys=3, hits=2, misses=1)
+        [(data, address)] = sink._socket.sent
+        self.assertEqual(address, ('localhost', 8125))
+        self.assertEqual(data.decode('ascii').split('\n'), [
+            'app.my_region.get_multi.calls:1|c',
+            'app.my_region.get_multi.time:2.000|ms',
+            'app.my_region.get_multi.keys:3|c',
+            'app.my_region.get_multi.hits:2|c',
+            'app.my_region.get_multi.misses:1|c',
+        ])
+
+
+class MetricsProxyTest(unittest2.TestCase):
+
+    backend = 'dogpile.cache.memory'
+
+    def setUp(self):
+        super(MetricsProxyTest, self).setUp()
+        self.sink = metrics.InMemorySink()
+        self.region = cache.create_region(name='metrics')
+        cache.configure_cache_region(self.region, {
+            'backend': self.backend,
+            'expiration_time': 60,
+            'proxies': [{
+                'class': 'dogpile_cachetool.backends.metrics.MetricsProxy',
+                'arguments': {'sink': self.sink},
+            }],
+        })
+
+    def _stats(self, operation):
+        return self.sink.get('metrics', operation)
+
+    def test_hits_and_misses(self):
+        self.region.set('a', 1)
+        self.assertEqual(self.region.get('a'), 1)
+        self.assertIs(self.region.get('b'), NO_VALUE)
+
+        stats = self._stats('get')
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+        self.assertEqual(stats.hit_ratio, .5)
+        self.assertEqual(self._stats('set').calls, 1)
+
+    def test_invalidation_keys_are_not_counted(self):
+        self.region.set_multi({'a': 1})
+        self.region.get_or_create_multi(['a', 'b'], lambda *keys: keys)
+
+        stats = self._stats('get_multi')
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+        self.assertEqual(stats.keys, 4)
+
+    def test_creation_is_timed(self):
+        self.region.get_or_create('a', lambda: 1)
+        self.region.get_or_create_multi(['b', 'c'], lambda *keys: keys)
+
+        stats = self._stats('create')
+        self.assertEqual((stats.calls, stats.keys), (2, 3))
+
+    def test_delete(self):
+        self.region.delete('a')
+        self.region.delete_multi(['a', 'b'])
+        self.assertEqual(self._stats('delete').keys, 1)
+        self.assertEqual(self._stats('delete_multi').keys, 2)
+
+    def test_slow_operations_are_logged(self):
+        self.region.backend.slow_threshold = 0
+        with self.assertLogs('dogpile_cachetool.backends.metrics',
+                             'WARNING') as logs:
+            self.region.set('a', 1)
+        self.assertIn('Slow cache set on region metrics', logs.output[0])
+
+    def test_configure_without_sink(self):
+        region = cache.create_region()
+        cache.configure_cache_region(region, {
+            'backend': 'dogpile.cache.memory',
+            'proxies': [{
+                'class': 'dogpile_cachetool.backends.metrics.MetricsProxy',
+            }],
+        })
+        region.set('a', 1)
+        self.assertIsInstance(region.backend, MetricsProxy)
+        self.assertEqual(
+            region.backend.sink.get('default', 'set').calls, 1)
+
+
+class MetricsProxyBytesTest(unittest2.TestCase):
+
+    def test_serialized_sizes(self):
+        sink = metrics.InMemorySink()
+        region = cache.create_region(name='metrics')
+        region.configure('dogpile_cachetool.tests.serializing_memory')
+        region.wrap(MetricsProxy({'sink': sink, 'region_name': 'metrics'}))
+
+        region.set('a', 'x' * 100)
+        region.get('a')
+        written = sink.get('metrics', 'set').bytes
+        self.assertGreater(written, 100)
+        self.assertEqual(sink.get('metrics', 'get').bytes, written)
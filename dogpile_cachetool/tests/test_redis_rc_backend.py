@@ -1,20 +1,32 @@
+from multiprocessing.pool import ThreadPool
 import os
+import threading
 
-import unittest2
+from dogpile.cache.api import NO_VALUE
 from dogpile.cache.region import _backend_loader
+import unittest2
 
 import dogpile_cachetool
+from dogpile_cachetool import metrics
+from dogpile_cachetool.backends._redis import map_bounded
+from dogpile_cachetool.backends.metrics import MetricsProxy
+from dogpile_cachetool.backends.redis_rc import RedisRCBackend
+from dogpile_cachetool.utils import cached_property
+from dogpile_cachetool.utils import chunked
 from . import _fixtures
 
+try:
+    import rc  # noqa
+except ImportError:
+    rc = None
+
 REDIS_PORT = int(os.getenv('DOGPILE_REDIS_PORT', '6379'))
 
+requires_rc = unittest2.skipIf(
+    rc is None, "Skip because redis-py-cluster is not installed.")
+
 
 def setup_module(module):
-    try:
-        import rc  # noqa
-    except ImportError:
-        raise unittest2.SkipTest(
-            "Skip because redis-py-cluster is not installed.")
     dogpile_cachetool.register_backend()
 
 
@@ -29,7 +41,10 @@ class _TestRedisRCConn(object):
         client.delete("x")
 
 
-class RedisRCTest(_TestRedisRCConn, _fixtures._GenericBackendTest):
+@requires_rc
+class RedisRCTest(_TestRedisRCConn,
+                  _fixtures._GenericSnapshotTest,
+                  _fixtures._GenericBackendTest):
     backend = 'dogpile_cachetool.redis_rc'
     config_args = {
         "arguments": {
@@ -50,10 +65,215 @@ class RedisRCConnectionTest(unittest2.TestCase):
     def setUpClass(cls):
         cls.backend_cls = _backend_loader.load(cls.backend)
 
-    def test_distributed_lock_is_not_available_for_now(self):
+    def test_distributed_lock_is_accepted(self):
         arguments = {
             'hosts': {},
             'distributed_lock': True,
+            'lock_timeout': 5,
         }
-        with self.assertRaises(NotImplementedError):
-            self.backend_cls(arguments)
+        backend = self.backend_cls(arguments)
+        self.assertTrue(backend.distributed_lock)
+        self.assertEqual(backend.lock_timeout, 5)
+
+    def test_locks_expire_by_default(self):
+        backend = self.backend_cls({'hosts': {}, 'distributed_lock': True})
+        self.assertEqual(backend.lock_timeout, 30)
+
+
+@requires_rc
+class RedisRCDistributedMutexTest(_TestRedisRCConn,
+                                  _fixtures._GenericMutexTest):
+    backend = 'dogpile_cachetool.redis_rc'
+    config_args = {
+        "arguments": {
+            'hosts': RedisRCTest.config_args['arguments']['hosts'],
+            'distributed_lock': True,
+            'lock_timeout': 5,
+        },
+    }
+
+    def test_mutex_is_on_the_host_of_the_key(self):
+        backend = self._backend()
+        mutex = backend.get_mutex(b'foo')
+        router = backend.client.connection_pool.cluster.router
+        pool = backend.client.connection_pool.cluster.get_pool_of_host(
+            router.get_host_for_key(b'foo'))
+        self.assertIs(mutex.lock.redis.connection_pool, pool)
+        self.assertEqual(mutex.lock.name, b'_lockfoo')
+
+    def test_release_of_expired_lock_is_logged(self):
+        backend = self._backend()
+        mutex = backend.get_mutex(b'foo')
+        mutex.acquire()
+        mutex.lock.redis.delete(mutex.lock.name)
+        mutex.release()
+
+    def test_release_from_another_thread(self):
+        backend = self._backend()
+        mutex = backend.get_mutex(b'foo')
+        self.assertTrue(mutex.acquire())
+        errors = []
+
+        def release():
+            try:
+                mutex.release()
+            except Exception as e:
+                errors.append(e)
+
+        t = threading.Thread(target=release)
+        t.start()
+        t.join(5)
+        self.assertEqual(errors, [])
+        self.assertFalse(mutex.lock.redis.exists(mutex.lock.name))
+
+    def test_release_of_unlocked_lock_raises(self):
+        from redis.exceptions import LockError
+
+        mutex = self._backend().get_mutex(b'foo')
+        self.assertRaises(LockError, mutex.release)
+
+
+class FakeRCClient(object):
+    """Executes multi commands like rc's poller, against a dict."""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+        self.batches = []
+
+    def mget(self, keys):
+        self.batches.append(('mget', len(keys)))
+        return [self.data.get(key) for key in keys]
+
+    def mdelete(self, *keys):
+        self.batches.append(('mdelete', len(keys)))
+        for key in keys:
+            self.data.pop(key, None)
+
+    def _execute_multi_command_with_poller(self, command_name, commands):
+        self.batches.append((command_name, len(commands)))
+        results = {}
+        for command in commands:
+            self.commands.append(command)
+            key, value = command[1], command[2]
+            if 'NX' in command[3:] and key in self.data:
+                results[key] = None
+            else:
+                self.data[key] = value
+                results[key] = True
+        return results
+
+
+class FakeRCBackend(RedisRCBackend):
+
+    @cached_property
+    def client(self):
+        return FakeRCClient()
+
+
+class RedisRCBulkSetTest(unittest2.TestCase):
+
+    def test_bulk_set(self):
+        backend = FakeRCBackend({'hosts': {}, 'redis_expiration_time': 60})
+        backend.set_multi({b'a': 1})
+        stored = backend.bulk_set({b'a': 2, b'b': 2, b'c': 3},
+                                  ttl={b'c': 5}, nx=True)
+        self.assertEqual(stored, {b'a': False, b'b': True, b'c': True})
+        self.assertEqual(
+            sorted((c[1],) + c[3:] for c in backend.client.commands), [
+                (b'a', 'EX', 60),
+                (b'a', 'EX', 60, 'NX'),
+                (b'b', 'EX', 60, 'NX'),
+                (b'c', 'EX', 5, 'NX'),
+            ])
+
+    def test_no_expiration(self):
+        backend = FakeRCBackend({'hosts': {}})
+        self.assertEqual(backend.bulk_set({b'a': 1}), {b'a': True})
+        self.assertEqual(backend.bulk_set({b'a': 1}, ttl=10), {b'a': True})
+        self.assertEqual([c[3:] for c in backend.client.commands],
+                         [(), ('EX', 10)])
+
+
+class RedisRCBatchingTest(unittest2.TestCase):
+
+    def _backend(self, **arguments):
+        arguments.setdefault('hosts', {})
+        return FakeRCBackend(arguments)
+
+    def test_multi_operations_are_chunked(self):
+        backend = self._backend(max_batch_keys=10, batch_concurrency=3)
+        keys = [('key%d' % i).encode('ascii') for i in range(25)]
+        stored = backend.bulk_set(dict((key, key) for key in keys))
+        self.assertEqual(stored, dict((key, True) for key in keys))
+        self.assertEqual(backend.get_multi(keys + [b'missing']),
+                         keys + [NO_VALUE])
+        backend.delete_multi(keys)
+        self.assertEqual(backend.client.data, {})
+        self.assertEqual(sorted(backend.client.batches), [
+            ('SET', 5), ('SET', 10), ('SET', 10),
+            ('mdelete', 5), ('mdelete', 10), ('mdelete', 10),
+            ('mget', 6), ('mget', 10), ('mget', 10),
+        ])
+
+    def test_iter_multi(self):
+        backend = self._backend(batch_concurrency=2)
+        backend.set_multi({b'a': 1, b'c': 3})
+        values = backend.iter_multi(iter([b'a', b'b', b'c']), chunk_size=2)
+        self.assertEqual(next(values), (b'a', 1))
+        self.assertEqual(list(values), [(b'b', NO_VALUE), (b'c', 3)])
+        self.assertEqual(sorted(backend.client.batches)[-2:],
+                         [('mget', 1), ('mget', 2)])
+
+    def test_single_batch_is_not_sent_to_the_pool(self):
+        backend = self._backend(batch_concurrency=4)
+        backend.set_multi({b'a': 1, b'b': 2})
+        self.assertEqual(backend.get_multi([b'a', b'b']), [1, 2])
+        self.assertNotIn('_pool', backend.__dict__)
+
+    def test_bytes_are_counted_with_batches_in_flight(self):
+        sink = metrics.InMemorySink()
+        backend = self._backend(max_batch_keys=2, batch_concurrency=2)
+        proxy = MetricsProxy({'sink': sink}).wrap(backend)
+        keys = [('key%d' % i).encode('ascii') for i in range(5)]
+        proxy.set_multi(dict((key, key) for key in keys))
+        self.assertEqual(proxy.get_multi(keys), keys)
+        written = sink.get('default', 'set_multi').bytes
+        self.assertGreater(written, 0)
+        self.assertEqual(sink.get('default', 'get_multi').bytes, written)
+
+    def test_set_batches_are_bounded_in_bytes(self):
+        backend = self._backend(max_batch_bytes=300, batch_concurrency=1)
+        backend.set_multi(dict((i, 'x' * 100) for i in range(10)))
+        self.assertEqual(len(backend.client.data), 10)
+        self.assertTrue(all(size < 10 for _, size in backend.client.batches))
+
+
+class ChunkedTest(unittest2.TestCase):
+
+    def test_chunked(self):
+        self.assertEqual(list(chunked(iter(range(5)), 2)),
+                         [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked(range(5), 0)), [list(range(5))])
+        self.assertEqual(
+            list(chunked(['aaa', 'b', 'cc', 'dddd'], 10, max_bytes=4)),
+            [['aaa', 'b'], ['cc'], ['dddd']])
+
+    def test_map_bounded(self):
+        pool = ThreadPool(2)
+        try:
+            self.assertEqual(
+                list(map_bounded(lambda x: x * 2, range(10), lambda: pool,
+                                 2)),
+                [x * 2 for x in range(10)])
+        finally:
+            pool.close()
+
+    def test_map_bounded_single_item(self):
+        def no_pool():
+            raise AssertionError('the pool is not needed')
+
+        self.assertEqual(list(map_bounded(lambda x: x * 2, [1], no_pool, 2)),
+                         [2])
+        self.assertEqual(list(map_bounded(lambda x: x * 2, [], no_pool, 2)),
+                         [])
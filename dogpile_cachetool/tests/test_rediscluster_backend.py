@@ -1,15 +1,21 @@
+from dogpile.cache.api import NO_VALUE
 import unittest2
 
 import dogpile_cachetool
+from dogpile_cachetool import mangling
+from dogpile_cachetool.backends._redis import key_slot
+from dogpile_cachetool.backends.rediscluster import _NodeConnectionPool
+from dogpile_cachetool.backends.rediscluster import RedisClusterBackend
+from dogpile_cachetool.utils import cached_property
 from . import _fixtures
 
+try:
+    import rediscluster  # noqa
+except ImportError:
+    rediscluster = None
+
 
 def setup_module(module):
-    try:
-        import rediscluster  # noqa
-    except ImportError:
-        raise unittest2.SkipTest(
-            "Skip because redis-py-cluster is not installed.")
     dogpile_cachetool.register_backend()
 
 
@@ -24,7 +30,11 @@ class _TestRedisClusterConn(object):
         client.delete("x")
 
 
-class RedisClusterTest(_TestRedisClusterConn, _fixtures._GenericBackendTest):
+@unittest2.skipIf(rediscluster is None,
+                  "Skip because redis-py-cluster is not installed.")
+class RedisClusterTest(_TestRedisClusterConn,
+                       _fixtures._GenericSnapshotTest,
+                       _fixtures._GenericBackendTest):
     backend = 'dogpile_cachetool.rediscluster'
     config_args = {
         "arguments": {
@@ -32,3 +42,227 @@ class RedisClusterTest(_TestRedisClusterConn, _fixtures._GenericBackendTest):
             'port': 7000,
         },
     }
+
+
+class FakeMovedError(Exception):
+    pass
+
+
+class FakePipeline(object):
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return command
+
+    def execute(self, raise_on_error=True):
+        self.client.executed.append([name for name, _, _ in self.commands])
+        if self.client.fail is not None:
+            raise self.client.fail
+        results = []
+        for name, args, kwargs in self.commands:
+            if name == 'set' and args[0] in self.client.moved:
+                results.append(FakeMovedError(args[0]))
+            else:
+                results.append(getattr(self.client, name)(*args, **kwargs))
+        errors = [r for r in results if isinstance(r, Exception)]
+        if raise_on_error and errors:
+            raise errors[0]
+        return results
+
+
+class FakeRedis(object):
+    """A node of the fake cluster, sharing the data of the cluster."""
+
+    def __init__(self, data):
+        self.data = data
+        self.ttls = {}
+        self.executed = []
+        self.fail = None
+        # keys the node redirects
+        self.moved = set()
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def mget(self, keys):
+        assert len(set(key_slot(key) for key in keys)) == 1, 'CROSSSLOT'
+        return [self.data.get(key) for key in keys]
+
+    def mset(self, mapping):
+        assert len(set(key_slot(key) for key in mapping)) == 1, 'CROSSSLOT'
+        self.data.update(mapping)
+        return True
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        self.ttls[key] = ex
+        return True
+
+    def delete(self, *keys):
+        assert len(set(key_slot(key) for key in keys)) == 1, 'CROSSSLOT'
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class FakeNodes(object):
+
+    def __init__(self):
+        self.nodes = [
+            {'name': 'a:7000', 'host': 'a', 'port': 7000},
+            {'name': 'b:7000', 'host': 'b', 'port': 7000},
+        ]
+        self.slots = [[self.nodes[slot * 2 // 16384]]
+                      for slot in range(16384)]
+
+
+class FakeConnectionPool(object):
+
+    def __init__(self):
+        self.nodes = FakeNodes()
+
+
+class FakeRedisCluster(FakeRedis):
+
+    def __init__(self, data):
+        super(FakeRedisCluster, self).__init__(data)
+        self.connection_pool = FakeConnectionPool()
+
+
+class FakeConnectionPoolOfNodes(object):
+
+    def __init__(self):
+        self.released = []
+
+    def get_connection_by_node(self, node):
+        return ('connection', node['name'])
+
+    def release(self, connection):
+        self.released.append(connection)
+
+
+class FakeRedisClusterBackend(RedisClusterBackend):
+
+    _redirect_errors = (FakeMovedError,)
+
+    @cached_property
+    def _client(self):
+        return FakeRedisCluster({})
+
+    def _node_client(self, node):
+        client = self._node_clients.get(node['name'])
+        if client is None:
+            client = self._node_clients[node['name']] = \
+                FakeRedis(self.client.data)
+        return client
+
+
+class RedisClusterBatchingTest(unittest2.TestCase):
+
+    def setUp(self):
+        super(RedisClusterBatchingTest, self).setUp()
+        self.backend = FakeRedisClusterBackend({'parallel_nodes': 2})
+        self.keys = [('key%d' % i).encode('ascii') for i in range(50)]
+
+    def _executed(self):
+        return dict((name, client.executed)
+                    for name, client in self.backend._node_clients.items())
+
+    def test_multi_operations_are_batched_per_node(self):
+        self.backend.set_multi(dict((key, key) for key in self.keys))
+        self.assertEqual(self.backend.get_multi(self.keys), self.keys)
+
+        slots = set(key_slot(key) for key in self.keys)
+        executed = self._executed()
+        self.assertEqual(sorted(executed), ['a:7000', 'b:7000'])
+        self.assertEqual(
+            sum(len(pipelines[1]) for pipelines in executed.values()),
+            len(slots))
+        self.assertEqual(self.backend.client.executed, [])
+
+        self.backend.delete_multi(self.keys)
+        self.assertEqual(self.backend.client.data, {})
+
+    def test_expiration_time(self):
+        self.backend.redis_expiration_time = 60
+        self.backend.set_multi({b'a': 1, b'b': 2})
+        self.assertEqual(self.backend.get_multi([b'b', b'c', b'a']),
+                         [2, NO_VALUE, 1])
+        for pipelines in self._executed().values():
+            self.assertEqual(set(pipelines[0]), set(['set']))
+
+    def test_bulk_set(self):
+        self.backend.redis_expiration_time = 60
+        self.backend.set_multi({b'a': 1})
+        stored = self.backend.bulk_set(
+            {b'a': 2, b'b': 2, b'c': 3}, ttl={b'c': 5}, nx=True)
+        self.assertEqual(stored, {b'a': False, b'b': True, b'c': True})
+        self.assertEqual(self.backend.get_multi([b'a', b'b', b'c']),
+                         [1, 2, 3])
+        ttls = {}
+        for client in self.backend._node_clients.values():
+            ttls.update(client.ttls)
+        self.assertEqual(ttls, {b'a': 60, b'b': 60, b'c': 5})
+
+    def test_iter_multi(self):
+        self.backend.set_multi(dict((key, key) for key in self.keys))
+        values = self.backend.iter_multi(iter(self.keys), chunk_size=7)
+        self.assertEqual(list(values), [(key, key) for key in self.keys])
+
+    def test_node_failure_falls_back_to_cluster_client(self):
+        self.backend.set_multi(dict((key, key) for key in self.keys))
+        for client in self.backend._node_clients.values():
+            client.fail = FakeMovedError()
+        self.assertEqual(self.backend.get_multi(self.keys), self.keys)
+        self.assertEqual(len(self.backend.client.executed), 0)
+
+        self.backend.delete_multi(self.keys)
+        self.assertEqual(self.backend.client.data, {})
+        self.assertEqual(len(self.backend.client.executed), 2)
+
+    def test_other_errors_are_raised(self):
+        self.backend.set_multi(dict((key, key) for key in self.keys))
+        for client in self.backend._node_clients.values():
+            client.fail = ValueError('NOAUTH')
+        self.assertRaises(ValueError, self.backend.get_multi, self.keys)
+        self.assertEqual(self.backend.client.executed, [])
+
+    def test_nx_retries_only_redirected_keys(self):
+        self.backend.set_multi({b'a': 1, b'b': 2})
+        self.backend.delete_multi([b'a', b'b'])
+        for client in self.backend._node_clients.values():
+            client.moved.add(b'b')
+        stored = self.backend.bulk_set({b'a': 3, b'b': 4}, nx=True)
+        self.assertEqual(stored, {b'a': True, b'b': True})
+        self.assertEqual(self.backend.client.executed, [['set']])
+        self.assertEqual(self.backend.get_multi([b'a', b'b']), [3, 4])
+
+    def test_node_clients_use_the_cluster_pool(self):
+        cluster_pool = FakeConnectionPoolOfNodes()
+        node = {'name': 'a:7000', 'host': 'a', 'port': 7000}
+        pool = _NodeConnectionPool(cluster_pool, node)
+        connection = pool.get_connection('MULTI', None)
+        self.assertEqual(connection, ('connection', 'a:7000'))
+        pool.release(connection)
+        self.assertEqual(cluster_pool.released, [connection])
+        self.assertEqual(pool.released, [connection])
+
+    def test_hash_tags_share_a_slot(self):
+        mangler = mangling.KeyMangler(
+            prefix='users', hash_tag=lambda key: key.split(':')[0])
+        keys = [mangler(u'42:name'), mangler(u'42:email')]
+        self.assertEqual(keys[0], b'users.{42}42:name')
+        self.assertEqual(key_slot(keys[0]), key_slot(keys[1]))
+
+        self.backend.get_multi(keys)
+        [(name, executed)] = self._executed().items()
+        self.assertEqual(executed, [['mget']])
+
+        region_mangler = mangling.KeyMangler(prefix='users', hash_tag=True)
+        self.assertEqual(region_mangler(u'a'), b'{users}.a')
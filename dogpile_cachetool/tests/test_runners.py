@@ -0,0 +1,133 @@
+import threading
+import time
+import unittest2
+
+from dogpile_cachetool import core as cache
+from dogpile_cachetool import runners
+
+
+class FakeMutex(object):
+
+    def __init__(self):
+        self.released = threading.Event()
+
+    def release(self):
+        self.released.set()
+
+
+class ThreadPoolCreationRunnerTest(unittest2.TestCase):
+
+    def setUp(self):
+        super(ThreadPoolCreationRunnerTest, self).setUp()
+        self.region = cache.create_region()
+        cache.configure_cache_region(self.region, {
+            'backend': 'dogpile.cache.memory',
+            'expiration_time': 1,
+        })
+        self.proceed = threading.Event()
+        self.runner = runners.ThreadPoolCreationRunner(
+            max_workers=1, max_queue_size=1)
+
+    def tearDown(self):
+        self.proceed.set()
+        self.runner.shutdown()
+        super(ThreadPoolCreationRunnerTest, self).tearDown()
+
+    def _blocked_creator(self):
+        self.proceed.wait(5)
+        return 'new'
+
+    def test_stale_value_is_served_while_refreshing(self):
+        self.region.async_creation_runner = self.runner
+        self.region.set('key', 'old')
+        self.region.backend.get(
+            self.region.key_mangler('key')).metadata['ct'] -= 10
+
+        self.assertEqual(
+            self.region.get_or_create('key', self._blocked_creator), 'old')
+        self.proceed.set()
+        self.runner.shutdown()
+        self.assertEqual(self.region.get('key'), 'new')
+        self.assertIn('d', self.region.backend.get(
+            self.region.key_mangler('key')).metadata)
+        self.assertEqual(self.runner.completed, 1)
+
+    def test_refreshes_are_deduplicated(self):
+        first, second = FakeMutex(), FakeMutex()
+        self.runner(self.region, 'key', self._blocked_creator, first)
+        self.runner(self.region, 'key', self._blocked_creator, second)
+        self.assertTrue(second.released.is_set())
+        self.assertFalse(first.released.is_set())
+        self.proceed.set()
+        self.assertTrue(first.released.wait(5))
+
+    def test_full_queue_drops_refresh(self):
+        mutexes = [FakeMutex() for _ in range(3)]
+        for i, mutex in enumerate(mutexes):
+            self.runner(self.region, 'key%d' % i, self._blocked_creator,
+                        mutex)
+            # let the worker pick up the first job
+            time.sleep(.05)
+        self.assertTrue(mutexes[2].released.is_set())
+        self.assertEqual(self.runner.rejected, 1)
+        self.proceed.set()
+        self.runner.shutdown()
+        self.assertTrue(all(m.released.is_set() for m in mutexes))
+        self.assertEqual(self.region.get('key1'), 'new')
+
+    def test_failed_refresh_releases_lock(self):
+        def creator():
+            raise ValueError('boom')
+
+        mutex = FakeMutex()
+        self.runner(self.region, 'key', creator, mutex)
+        self.assertTrue(mutex.released.wait(5))
+        self.runner.shutdown()
+        self.assertEqual(self.runner.failed, 1)
+
+    def test_shutdown_without_wait_drops_queued_refreshes(self):
+        running, queued = FakeMutex(), FakeMutex()
+        self.runner(self.region, 'a', self._blocked_creator, running)
+        time.sleep(.05)
+        self.runner(self.region, 'b', self._blocked_creator, queued)
+        self.runner.shutdown(wait=False)
+        self.assertTrue(queued.released.is_set())
+
+        late = FakeMutex()
+        self.runner(self.region, 'c', self._blocked_creator, late)
+        self.assertTrue(late.released.is_set())
+
+    def test_shutdown_twice(self):
+        runner = runners.ThreadPoolCreationRunner(
+            max_workers=3, max_queue_size=1)
+        mutexes = [FakeMutex() for _ in range(4)]
+        for i, mutex in enumerate(mutexes):
+            runner(self.region, 'key%d' % i, self._blocked_creator, mutex)
+            # let the workers pick up the first jobs
+            time.sleep(.05)
+        self.assertEqual(runner.rejected, 0)
+        self.proceed.set()
+        runner.shutdown()
+        self.assertTrue(all(m.released.is_set() for m in mutexes))
+
+        done = threading.Event()
+
+        def shutdown():
+            runner.shutdown()
+            done.set()
+
+        thread = threading.Thread(target=shutdown)
+        thread.daemon = True
+        thread.start()
+        self.assertTrue(done.wait(5))
+        self.assertTrue(runner._queue.empty())
+
+    def test_configure_cache_region(self):
+        region = cache.create_region()
+        cache.configure_cache_region(region, {
+            'backend': 'dogpile.cache.memory',
+            'async_creation_runner': {'max_workers': 2},
+        })
+        self.assertIsInstance(region.async_creation_runner,
+                              runners.ThreadPoolCreationRunner)
+        self.assertEqual(region.async_creation_runner.max_workers, 2)
@@ -0,0 +1,72 @@
+import unittest2
+
+from dogpile.cache.api import CachedValue
+from six.moves import cPickle as pickle
+
+from dogpile_cachetool import serializers
+
+
+class _TaggedReprSerializer(serializers.Serializer):
+    tag = 0x10
+
+    def dumps(self, value):
+        return repr(value).encode('ascii')
+
+    def loads(self, data):
+        return bytes(data).decode('ascii')
+
+
+class ValueCodecTest(unittest2.TestCase):
+
+    value = CachedValue({'name': u'中文', 'ids': [1, 2, 3]},
+                        {'ct': 1234.5, 'v': 1})
+
+    def _roundtrip(self, serializer):
+        codec = serializers.ValueCodec(serializer)
+        data = codec.dumps(self.value)
+        self.assertIsInstance(data, bytes)
+        decoded = codec.loads(data)
+        self.assertIsInstance(decoded, CachedValue)
+        self.assertEqual(decoded, self.value)
+        self.assertEqual(codec.loads(memoryview(data)), self.value)
+        self.assertEqual(codec.loads(codec.dumps('plain')), 'plain')
+        return data
+
+    def test_pickle(self):
+        data = self._roundtrip('pickle')
+        # pickles are not wrapped, so older readers can still load them
+        self.assertEqual(pickle.loads(data), self.value)
+
+    def test_json(self):
+        data = self._roundtrip('json')
+        self.assertEqual(data[:1], b'\x01')
+
+    def test_msgpack(self):
+        try:
+            import msgpack  # noqa
+        except ImportError:
+            raise unittest2.SkipTest('msgpack is not installed')
+        data = self._roundtrip('msgpack')
+        self.assertEqual(data[:1], b'\x02')
+
+    def test_reads_other_formats(self):
+        codec = serializers.ValueCodec('json')
+        legacy = pickle.dumps(self.value, pickle.HIGHEST_PROTOCOL)
+        self.assertEqual(codec.loads(legacy), self.value)
+
+        json_data = codec.dumps(self.value)
+        self.assertEqual(serializers.ValueCodec().loads(json_data),
+                         self.value)
+
+    def test_custom_serializer_by_path(self):
+        codec = serializers.ValueCodec(
+            'dogpile_cachetool.tests.test_serializers._TaggedReprSerializer')
+        self.assertEqual(codec.dumps(42), b'\x1042')
+        self.assertEqual(codec.loads(b'\x1042'), '42')
+
+    def test_unknown_tag(self):
+        codec = serializers.ValueCodec()
+        self.assertRaises(ValueError, codec.loads, b'\x0fxxx')
+        # written with a custom serializer, configured elsewhere only
+        self.assertRaisesRegexp(ValueError, 'custom serializer 0x3f',
+                                codec.loads, b'\x3fxxx')
@@ -0,0 +1,151 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from dogpile.cache.api import NO_VALUE
+import unittest2
+
+import dogpile_cachetool
+from dogpile_cachetool.backends import shm
+from dogpile_cachetool.backends.shm import SharedMemoryBackend
+from . import _fixtures
+
+
+def setup_module(module):
+    dogpile_cachetool.register_backend()
+
+
+class _TempDirMixin(object):
+
+    def setUp(self):
+        super(_TempDirMixin, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+        super(_TempDirMixin, self).tearDown()
+
+    def _shm(self, **arguments):
+        arguments.setdefault('path', self.path)
+        backend = SharedMemoryBackend(arguments)
+        self.addCleanup(backend.close)
+        return backend
+
+
+class SharedMemoryBackendTest(_fixtures._GenericBackendTest):
+
+    backend = 'dogpile_cachetool.shm'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tempdir = tempfile.mkdtemp()
+        cls.config_args = {
+            'arguments': {'path': os.path.join(cls.tempdir, 'cache')},
+        }
+        super(SharedMemoryBackendTest, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tempdir)
+        super(SharedMemoryBackendTest, cls).tearDownClass()
+
+
+def _set_in_child(path, key, value):
+    SharedMemoryBackend({'path': path}).set(key, value)
+
+
+class SharedMemoryTest(_TempDirMixin, unittest2.TestCase):
+
+    def test_shared_between_instances(self):
+        first = self._shm()
+        second = self._shm()
+        first.set('a', 1)
+        self.assertEqual(second.get('a'), 1)
+        second.delete('a')
+        self.assertIs(first.get('a'), NO_VALUE)
+
+        # one descriptor and one set of locks per file in a process
+        self.assertEqual(first._fd, second._fd)
+        self.assertIs(first._locks, second._locks)
+        first.close()
+        second.set('b', 2)
+        self.assertEqual(second.get('b'), 2)
+
+    def test_slot_is_published_last(self):
+        backend = self._shm()
+        end_write = backend._end_write
+        slots = []
+
+        def check(offset, seq):
+            slots.append(shm._SLOT.unpack_from(backend._map, offset))
+            end_write(offset, seq)
+
+        backend._end_write = check
+        backend.set('a', 1)
+        seq, state, _, key_len, _, _ = slots[0]
+        # still odd, while the rest of the header is already written
+        self.assertEqual((seq % 2, state, key_len), (1, shm._USED, 1))
+        self.assertEqual(backend.get('a'), 1)
+
+    @unittest2.skipUnless(hasattr(os, 'fork'), 'requires fork')
+    def test_shared_between_processes(self):
+        backend = self._shm()
+        context = multiprocessing.get_context('fork') \
+            if hasattr(multiprocessing, 'get_context') else multiprocessing
+        process = context.Process(target=_set_in_child,
+                                  args=(self.path, 'a', [1, 2]))
+        process.start()
+        process.join()
+        self.assertEqual(backend.get('a'), [1, 2])
+
+    def test_overwrite_and_multi(self):
+        backend = self._shm()
+        backend.set_multi({'a': 1, 'b': 2})
+        backend.set('a', 3)
+        self.assertEqual(backend.get_multi(['a', 'b', 'c']), [3, 2, NO_VALUE])
+        backend.delete_multi(['a', 'b'])
+        self.assertEqual(backend.get_multi(['a', 'b']), [NO_VALUE, NO_VALUE])
+
+    def test_deleted_slots_are_reused(self):
+        backend = self._shm(slots=4, stripes=1)
+        for i in range(20):
+            backend.set('a%d' % i, i)
+            backend.delete('a%d' % i)
+        backend.set('b', 1)
+        backend.set('c', 2)
+        self.assertEqual(backend.get_multi(['b', 'c']), [1, 2])
+
+    def test_clock_eviction(self):
+        backend = self._shm(slots=4, stripes=1)
+        for key in 'abcd':
+            backend.set(key, key)
+        # referenced entries get a second chance
+        for key in 'abd':
+            backend.get(key)
+        backend.set('e', 'e')
+        self.assertIs(backend.get('c'), NO_VALUE)
+        self.assertEqual(backend.get_multi(['a', 'b', 'd', 'e']),
+                         ['a', 'b', 'd', 'e'])
+
+    def test_oversized_value(self):
+        backend = self._shm(slot_size=128)
+        backend.set('a', 1)
+        backend.set('a', 'x' * 200)
+        self.assertIs(backend.get('a'), NO_VALUE)
+        self.assertEqual(backend.oversized, 1)
+
+    def test_geometry_mismatch(self):
+        self._shm(slots=16, stripes=4)
+        self.assertRaises(ValueError, SharedMemoryBackend,
+                          {'path': self.path, 'slots': 32, 'stripes': 4})
+
+    def test_not_a_cache_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'something else')
+        self.assertRaises(ValueError, SharedMemoryBackend,
+                          {'path': self.path})
+
+    def test_path_is_required(self):
+        self.assertRaises(ValueError, SharedMemoryBackend, {})
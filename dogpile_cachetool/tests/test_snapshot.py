@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest2
+
+from six.moves import cPickle as pickle
+
+from dogpile_cachetool import core as cache
+from dogpile_cachetool import snapshot
+
+
+class SnapshotTest(unittest2.TestCase):
+
+    def setUp(self):
+        super(SnapshotTest, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'region.snap')
+        self.region = cache.create_region()
+        cache.configure_cache_region(self.region, {
+            'backend': 'dogpile.cache.memory',
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        super(SnapshotTest, self).tearDown()
+
+    def _write(self, records, created_at=None):
+        with open(self.path, 'wb') as f:
+            writer = snapshot.SnapshotWriter(f, created_at=created_at)
+            for key, value, ttl_ms in records:
+                writer.write(key, pickle.dumps(value, -1), ttl_ms)
+
+    def test_reader_roundtrip(self):
+        self._write([(b'a', 'x', None), (u'b', 'y', 60000)])
+        with snapshot.SnapshotReader(self.path) as reader:
+            records = [(key, pickle.loads(bytes(data)), ttl_ms)
+                       for key, data, ttl_ms in reader]
+        self.assertEqual([r[:2] for r in records], [(b'a', 'x'), (b'b', 'y')])
+        self.assertIsNone(records[0][2])
+        self.assertTrue(0 < records[1][2] <= 60000)
+
+    def test_reader_skips_expired_records(self):
+        self._write([(b'a', 'x', 1000), (b'b', 'y', 60000)],
+                    created_at=time.time() - 10)
+        with snapshot.SnapshotReader(self.path) as reader:
+            keys = [key for key, _data, _ttl_ms in reader]
+        self.assertEqual(keys, [b'b'])
+
+    def test_reader_rejects_garbage(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a snapshot file at all')
+        self.assertRaises(snapshot.SnapshotError,
+                          snapshot.SnapshotReader, self.path)
+
+    def test_restore_preloads_memory_region(self):
+        records = [
+            (self.region.key_mangler('key%d' % i),
+             self.region._value('value%d' % i), None)
+            for i in range(10)
+        ]
+        self._write(records)
+        self.assertEqual(snapshot.restore(self.region, self.path,
+                                          batch_size=3), 10)
+        self.assertEqual(self.region.get('key7'), 'value7')
+
+    def test_dump_requires_capable_backend(self):
+        self.assertRaises(TypeError, snapshot.dump, self.region, self.path)
+
+    def test_region_prefix(self):
+        self.region.key_mangler = cache.create_key_mangler('users')
+        self.assertEqual(snapshot._region_prefix(self.region), b'users.')
+        self.assertEqual(snapshot._glob_escape(b'a*b[1]'), b'a\\*b\\[1\\]')
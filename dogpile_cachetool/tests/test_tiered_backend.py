@@ -0,0 +1,175 @@
+import time
+
+from dogpile.cache import register_backend
+from dogpile.cache.api import NO_VALUE
+from dogpile.cache.backends.memory import MemoryBackend
+import unittest2
+
+import dogpile_cachetool
+from dogpile_cachetool import core as cache
+from dogpile_cachetool.backends.tiered import TieredBackend
+from . import _fixtures
+
+
+def setup_module(module):
+    dogpile_cachetool.register_backend()
+
+
+class RecordingMemoryBackend(MemoryBackend):
+    """Memory backend recording the keys it is asked for."""
+
+    def __init__(self, arguments):
+        super(RecordingMemoryBackend, self).__init__(arguments)
+        self.requests = []
+
+    def get_multi(self, keys):
+        self.requests.append(list(keys))
+        return super(RecordingMemoryBackend, self).get_multi(keys)
+
+
+register_backend('dogpile_cachetool.tests.recording_memory',
+                 'dogpile_cachetool.tests.test_tiered_backend',
+                 'RecordingMemoryBackend')
+
+
+class TieredBackendTest(_fixtures._GenericBackendTest):
+
+    backend = 'dogpile_cachetool.tiered'
+    config_args = {
+        'arguments': {
+            'tiers': [
+                {'backend': 'dogpile_cachetool.local'},
+                {'backend': 'dogpile.cache.memory'},
+            ],
+        },
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        dogpile_cachetool.register_backend()
+        super(TieredBackendTest, cls).setUpClass()
+
+
+class TieredTest(unittest2.TestCase):
+
+    def setUp(self):
+        super(TieredTest, self).setUp()
+        dogpile_cachetool.register_backend()
+
+    def _tiered(self, write_policy='through'):
+        backend = TieredBackend({
+            'tiers': [
+                {'backend': 'dogpile_cachetool.tests.recording_memory'},
+                {'backend': 'dogpile_cachetool.tests.recording_memory'},
+                {'backend': 'dogpile_cachetool.tests.recording_memory',
+                 'write_policy': write_policy},
+            ],
+            'flush_interval': .01,
+        })
+        return backend, [tier.backend for tier in backend.tiers]
+
+    def test_misses_are_batched_down_the_chain(self):
+        backend, (first, second, third) = self._tiered()
+        first.set('a', 1)
+        second.set('b', 2)
+        third.set('c', 3)
+
+        values = backend.get_multi(['a', 'b', 'c', 'd'])
+        self.assertEqual(values, [1, 2, 3, NO_VALUE])
+        self.assertEqual(first.requests, [['a', 'b', 'c', 'd']])
+        self.assertEqual(second.requests, [['b', 'c', 'd']])
+        self.assertEqual(third.requests, [['c', 'd']])
+        stats = backend.stats()
+        self.assertEqual([hits for _, hits in stats['hits']], [1, 1, 1])
+        self.assertEqual(stats['misses'], 1)
+
+    def test_hits_are_promoted(self):
+        backend, (first, second, third) = self._tiered()
+        third.set('a', 1)
+        second.set('b', 2)
+        backend.get_multi(['a', 'b'])
+        self.assertEqual(first.get_multi(['a', 'b']), [1, 2])
+        self.assertEqual(second.get('a'), 1)
+
+    def test_write_through_and_delete(self):
+        backend, tiers = self._tiered()
+        backend.set_multi({'a': 1, 'b': 2})
+        for tier in tiers:
+            self.assertEqual(tier.get_multi(['a', 'b']), [1, 2])
+        backend.delete_multi(['a'])
+        for tier in tiers:
+            self.assertIs(tier.get('a'), NO_VALUE)
+
+    def test_write_back(self):
+        backend, (first, second, third) = self._tiered('back')
+        backend.set('a', 1)
+        first.delete('a')
+        second.delete('a')
+        # served before being written
+        self.assertEqual(backend.get('a'), 1)
+
+        backend.set('b', 2)
+        backend.delete('b')
+        backend.flush()
+        self.assertEqual(third.get('a'), 1)
+        self.assertIs(third.get('b'), NO_VALUE)
+
+    def test_write_back_in_background(self):
+        backend, (first, second, third) = self._tiered('back')
+        backend.set('a', 1)
+        deadline = time.time() + 5
+        while third.get('a') is NO_VALUE and time.time() < deadline:
+            time.sleep(.01)
+        self.assertEqual(third.get('a'), 1)
+
+    def test_deleted_while_written_back(self):
+        backend, (first, second, third) = self._tiered('back')
+        backend.set('a', 1)
+        set_multi = third.set_multi
+
+        def delete_during_write(mapping):
+            set_multi(mapping)
+            backend.delete('a')
+
+        third.set_multi = delete_during_write
+        backend.flush()
+        self.assertIs(third.get('a'), NO_VALUE)
+        self.assertIs(backend.get('a'), NO_VALUE)
+
+    def test_failed_write_back_is_retried(self):
+        backend, (first, second, third) = self._tiered('back')
+        # only flush explicitly
+        backend.flush_interval = 60
+        backend.set_multi({'a': 1, 'b': 2})
+        set_multi = third.set_multi
+
+        def fail_once(mapping):
+            third.set_multi = set_multi
+            backend.set('b', 3)
+            raise ValueError('boom')
+
+        third.set_multi = fail_once
+        backend.flush()
+        self.assertIs(third.get('a'), NO_VALUE)
+        self.assertEqual(backend.tiers[2].pending, {'a': 1, 'b': 3})
+
+        backend.flush()
+        self.assertEqual(third.get_multi(['a', 'b']), [1, 3])
+        self.assertEqual(backend.tiers[2].pending, {})
+
+    def test_unknown_write_policy(self):
+        self.assertRaises(ValueError, TieredBackend, {'tiers': [
+            {'backend': 'dogpile.cache.memory', 'write_policy': 'around'}]})
+
+    def test_region(self):
+        region = cache.create_region()
+        cache.configure_cache_region(region, {
+            'backend': 'dogpile_cachetool.tiered',
+            'arguments': {'tiers': [
+                {'backend': 'dogpile_cachetool.local',
+                 'arguments': {'max_entries': 1}},
+                {'backend': 'dogpile.cache.memory'},
+            ]},
+        })
+        region.set_multi({'a': 1, 'b': 2})
+        self.assertEqual(region.get_multi(['a', 'b']), [1, 2])
@@ -42,3 +42,36 @@ class cached_property(object):
             value = self.func(obj)
             obj.__dict__[self.__name__] = value
         return value
+
+
+def get_actual_backend(backend):
+    """Return the concrete backend behind a chain of proxy backends."""
+    while getattr(backend, 'proxied', None) is not None:
+        backend = backend.proxied
+    return backend
+
+
+def chunked(items, max_items, max_bytes=None, sizeof=len):
+    """Split ``items`` into lists of at most ``max_items`` items and, when
+    ``max_bytes`` is given, at most ``max_bytes`` bytes as measured by
+    ``sizeof`` (a single larger item still makes a chunk).
+
+    ``items`` is consumed lazily.
+    """
+    chunk = []
+    size = 0
+    for item in items:
+        if max_bytes is not None:
+            item_size = sizeof(item)
+            if chunk and size + item_size > max_bytes:
+                yield chunk
+                chunk = []
+                size = 0
+            size += item_size
+        chunk.append(item)
+        if max_items and len(chunk) >= max_items:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
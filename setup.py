@@ -23,7 +23,7 @@ setuptools.setup(
     long_description=get_long_description(),
     license='Apache License 2.0',
     url='https://github.com/timonwong/dogpile-cachetool',
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=['benchmarks', 'benchmarks.*']),
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
@@ -43,6 +43,10 @@ setuptools.setup(
     extras_require={
         'rc': ['rc>=0.3.1'],
         'rediscluster': ['redis-py-cluster>1.3.6'],
+        'msgpack': ['msgpack>=0.5.2'],
+        'lz4': ['lz4'],
+        'zstd': ['zstandard'],
+        'asyncio': ['redis>=4.3'],
     },
     tests_require=[
         'unittest2',